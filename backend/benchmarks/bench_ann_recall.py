@@ -0,0 +1,89 @@
+"""Recall@k vs. latency of the approximate case-index tiers against the exact flat baseline.
+
+Usage (from the backend directory):
+    python benchmarks/bench_ann_recall.py --cases 100000 --queries 200 --k 10
+
+Vectors are synthetic (a Gaussian mixture, L2-normalized like sentence embeddings),
+so absolute recall differs from real data but the trade-off curves are comparable.
+"""
+import os
+import sys
+import time
+import argparse
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.vector_index import CaseIndex, IndexConfig
+
+
+def synthetic_vectors(n: int, centers: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.standard_normal((n, centers.shape[1])).astype('float32')
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def timed_search(index: CaseIndex, queries: np.ndarray, k: int):
+    """Search one query at a time (like the API does) and return case IDs and per-query latencies."""
+    found, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = index.search(query[None, :], k)[0]
+        latencies.append(time.perf_counter() - start)
+        found.append([case_id for case_id, _ in hits])
+    return found, np.array(latencies)
+
+
+def recall_at_k(found, truth) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def build(config: IndexConfig, case_ids, vectors) -> tuple:
+    start = time.perf_counter()
+    index = CaseIndex(vectors.shape[1], config=config)
+    index.upsert(case_ids, vectors)
+    index.wait_for_build(timeout=3600)
+    return index, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--refine", type=int, default=4, help="IVF-PQ exact re-ranking factor (1 = off)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((max(1, args.cases // 100), args.dim)).astype('float32')
+    vectors = synthetic_vectors(args.cases, centers, rng)
+    queries = synthetic_vectors(args.queries, centers, rng)
+    case_ids = [f"case_{i}" for i in range(args.cases)]
+
+    flat, flat_build = build(IndexConfig(kind="flat"), case_ids, vectors)
+    truth, flat_latency = timed_search(flat, queries, args.k)
+    print(f"cases={args.cases} dim={args.dim} queries={args.queries} k={args.k}")
+    print(f"{'index':>8} {'param':>14} {'build s':>8} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8}")
+
+    def report(name, param, build_seconds, found, latencies):
+        print(f"{name:>8} {param:>14} {build_seconds:>8.1f} {recall_at_k(found, truth):>9.3f} "
+              f"{np.percentile(latencies, 50) * 1000:>8.3f} {np.percentile(latencies, 99) * 1000:>8.3f}")
+
+    report("flat", "-", flat_build, truth, flat_latency)
+    for kind, values, attribute in (("hnsw", args.ef_search, "ef_search"), ("ivfpq", args.nprobe, "nprobe")):
+        config = IndexConfig(kind=kind, promote_at=1, refine=args.refine)
+        index, build_seconds = build(config, case_ids, vectors)
+        for value in values:
+            setattr(config, attribute, value)
+            found, latencies = timed_search(index, queries, args.k)
+            report(kind, f"{attribute}={value}", build_seconds, found, latencies)
+
+
+if __name__ == "__main__":
+    main()
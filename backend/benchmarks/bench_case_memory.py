@@ -0,0 +1,65 @@
+"""Memory used by stored case metadata: MedicalCase with embedding lists vs. CaseRecord.
+
+Usage (from the backend directory):
+    python benchmarks/bench_case_memory.py --cases 10000
+
+Measures heap growth with tracemalloc and reports it scaled to 100k cases. The
+vectors themselves (384 float32 = 1.5 KB per case) live in the FAISS index either way.
+"""
+import os
+import sys
+import argparse
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.symptom_models import MedicalCase
+from services.case_record import CaseRecord
+
+
+def case_text(i: int) -> str:
+    return (f"Conditions: hypertension, type 2 diabetes | Medications: metformin {i % 7 + 1}00mg | "
+            f"Allergies: penicillin | Surgeries: appendectomy | Notes: follow-up visit {i}")
+
+
+def measure(build, n: int) -> int:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    cases = [build(i) for i in range(n)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del cases
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    embeddings = rng.random((args.cases, args.dim), dtype=np.float32)
+
+    def legacy(i):
+        return MedicalCase(case_id=f"case_P{i:08d}", symptoms=case_text(i), diagnosis="", treatment="", outcome="",
+                           category="patient_history", embedding=embeddings[i].tolist(),
+                           metadata={"patient_id": f"P{i:08d}"})
+
+    def compact(i):
+        return CaseRecord(case_id=f"case_P{i:08d}", symptoms=case_text(i), category="patient_history",
+                          metadata={"patient_id": f"P{i:08d}"})
+
+    scale = 100000 / args.cases
+    legacy_bytes = measure(legacy, args.cases)
+    compact_bytes = measure(compact, args.cases)
+    print(f"{'storage':>26} {'bytes/case':>11} {'MB per 100k':>12}")
+    for name, size in (("MedicalCase + embedding", legacy_bytes), ("CaseRecord", compact_bytes)):
+        print(f"{name:>26} {size / args.cases:>11.0f} {size * scale / 2 ** 20:>12.1f}")
+    print(f"saved per 100k cases: {(legacy_bytes - compact_bytes) * scale / 2 ** 20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Latency, throughput and cosine agreement of ONNX embedding backends against the PyTorch model.
+
+Usage (from the backend directory, after `python export_onnx_model.py`):
+    python benchmarks/bench_embedding_backends.py
+    python benchmarks/bench_embedding_backends.py --onnx data/models/all-MiniLM-L6-v2/onnx/model_int8.onnx --threads 1 2 4
+
+Every ONNX model is compared with SentenceTransformer(<model>) on the same texts: per-text
+cosine similarity (vectors are used interchangeably in one index, so they must agree) and
+overlap of the top-5 neighbours when searching the texts with each other. Exits with status 1
+if any model's minimum cosine falls below --min-cosine.
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.embedding_service import load_onnx_encoder, load_sentence_transformer
+
+SYMPTOMS = [
+    "headache and fever", "chest pain radiating to left arm", "persistent dry cough for two weeks",
+    "itchy red rash on forearm", "shortness of breath when climbing stairs", "lower back pain after lifting",
+    "nausea and vomiting after meals", "dizziness when standing up", "sore throat and swollen glands",
+    "blurred vision and frequent urination", "joint pain and morning stiffness", "burning pain when urinating",
+]
+HISTORIES = [
+    "Conditions: type 2 diabetes (E11.9), hypertension | Medications: metformin 500 mg, lisinopril | "
+    "Allergies: penicillin | Surgeries: appendectomy | Notes: HbA1c 7.2% at last visit",
+    "Conditions: asthma | Medications: albuterol inhaler, fluticasone | Allergies: none | Surgeries: | "
+    "Notes: exercise-induced wheeze, peak flow 380 L/min",
+    "Conditions: hypothyroidism | Medications: levothyroxine 75 mcg | Allergies: sulfa drugs | Surgeries: | "
+    "Notes: TSH within range, fatigue improving",
+]
+
+
+def corpus(n: int):
+    texts = SYMPTOMS + HISTORIES
+    return [texts[i % len(texts)] + ("" if i < len(texts) else f" (visit {i})") for i in range(n)]
+
+
+def measure(encode, texts, batch_size: int):
+    """Per-batch latencies and overall texts/sec, after one warm-up batch."""
+    encode(texts[:batch_size])
+    latencies = []
+    start = time.perf_counter()
+    for offset in range(0, len(texts), batch_size):
+        batch_start = time.perf_counter()
+        encode(texts[offset:offset + batch_size])
+        latencies.append(time.perf_counter() - batch_start)
+    return np.array(latencies), len(texts) / (time.perf_counter() - start)
+
+
+def normalized(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype='float32')
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def top5_overlap(reference: np.ndarray, candidate: np.ndarray) -> float:
+    def neighbours(vectors):
+        scores = vectors @ vectors.T
+        np.fill_diagonal(scores, -np.inf)
+        return np.argsort(-scores, axis=1)[:, :5]
+    return float(np.mean([len(set(a) & set(b)) / 5 for a, b in zip(neighbours(reference), neighbours(candidate))]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--onnx", nargs="+", help="ONNX model files (default: model.onnx and model_int8.onnx under data/models/<model>/onnx)")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4], help="onnxruntime intra-op thread counts")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32])
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    args = parser.parse_args()
+
+    onnx_paths = args.onnx or [path for path in (
+        os.path.join("data", "models", args.model, "onnx", name) for name in ("model.onnx", "model_int8.onnx")
+    ) if os.path.exists(path)]
+    if not onnx_paths:
+        parser.error("no ONNX models found; run export_onnx_model.py or pass --onnx")
+
+    texts = corpus(args.texts)
+    reference = load_sentence_transformer(args.model)
+    reference_vectors = normalized(reference(texts))
+    print(f"texts={len(texts)} cpus={os.cpu_count()}")
+    print(f"{'backend':>28} {'threads':>7} {'batch':>5} {'p50 ms':>8} {'texts/s':>9}")
+
+    def report(name, threads, encode):
+        for batch_size in args.batch_sizes:
+            latencies, throughput = measure(encode, texts, batch_size)
+            print(f"{name:>28} {threads:>7} {batch_size:>5} {np.percentile(latencies, 50) * 1000:>8.2f} {throughput:>9.1f}")
+
+    report("torch", "-", reference)
+    failed = False
+    for path in onnx_paths:
+        name = os.path.basename(path)
+        for threads in args.threads:
+            report(name, threads, load_onnx_encoder(path, threads=threads))
+        vectors = normalized(load_onnx_encoder(path)(texts))
+        assert vectors.shape == reference_vectors.shape, f"{name} produces {vectors.shape[1]}-dim vectors"
+        cosines = np.sum(vectors * reference_vectors, axis=1)
+        print(f"  {name}: cosine vs torch mean {cosines.mean():.4f} min {cosines.min():.4f}, "
+              f"top-5 neighbour overlap {top5_overlap(reference_vectors, vectors):.3f}")
+        failed = failed or cosines.min() < args.min_cosine
+    if failed:
+        print(f"FAIL: an ONNX model disagrees with the reference (cosine < {args.min_cosine})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
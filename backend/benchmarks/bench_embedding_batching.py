@@ -0,0 +1,102 @@
+"""Compare embedding QPS with and without cross-request micro-batching.
+
+Usage (from the backend directory):
+    python benchmarks/bench_embedding_batching.py --requests 512 --concurrency 64
+    python benchmarks/bench_embedding_batching.py --simulate   # no model download, synthetic cost
+
+Unbatched mode encodes each request on its own (one model call per request, on a
+worker thread so concurrency still applies); batched mode goes through EmbeddingBatcher.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.embedding_service import EmbeddingBatcher, load_sentence_transformer
+
+QUERIES = [
+    "headache and fever", "chest pain radiating to left arm", "persistent dry cough for two weeks",
+    "itchy red rash on forearm", "shortness of breath when climbing stairs", "lower back pain after lifting",
+    "nausea and vomiting after meals", "dizziness when standing up", "sore throat and swollen glands",
+]
+
+
+def simulated_encoder(call_overhead_ms: float, per_text_ms: float):
+    """Stand-in with the cost shape of a transformer: fixed per-call overhead plus per-text work.
+
+    Calls are serialized, like a model whose forward pass already occupies every core.
+    """
+    busy = threading.Lock()
+
+    def encode(texts):
+        with busy:
+            time.sleep((call_overhead_ms + per_text_ms * len(texts)) / 1000)
+        return np.random.rand(len(texts), 384).astype('float32')
+    return encode
+
+
+async def run_unbatched(encode, texts, concurrency):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        async def one(text):
+            async with semaphore:
+                return await loop.run_in_executor(pool, encode, [text])
+        start = time.perf_counter()
+        await asyncio.gather(*(one(text) for text in texts))
+        return time.perf_counter() - start
+
+
+async def run_batched(batcher, texts, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(text):
+        async with semaphore:
+            return await batcher.embed(text)
+    start = time.perf_counter()
+    await asyncio.gather(*(one(text) for text in texts))
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--wait-ms", type=float, default=5.0)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--simulate", action="store_true", help="use a synthetic encoder instead of the model")
+    parser.add_argument("--call-overhead-ms", type=float, default=8.0)
+    parser.add_argument("--per-text-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    if args.simulate:
+        encode = simulated_encoder(args.call_overhead_ms, args.per_text_ms)
+    else:
+        encode = load_sentence_transformer(args.model)
+        encode(QUERIES)  # warm up
+    texts = [QUERIES[i % len(QUERIES)] + f" #{i}" for i in range(args.requests)]
+
+    unbatched = await run_unbatched(encode, texts, args.concurrency)
+    batcher = EmbeddingBatcher(encode, max_batch_size=args.batch_size, max_wait_ms=args.wait_ms)
+    batched = await run_batched(batcher, texts, args.concurrency)
+    stats = batcher.stats()
+    batcher.close()
+
+    print(f"requests={args.requests} concurrency={args.concurrency} batch_size={args.batch_size} wait_ms={args.wait_ms}")
+    print(f"{'mode':>10} {'seconds':>9} {'QPS':>9}")
+    print(f"{'unbatched':>10} {unbatched:>9.2f} {args.requests / unbatched:>9.1f}")
+    print(f"{'batched':>10} {batched:>9.2f} {args.requests / batched:>9.1f}")
+    print(f"avg batch size {stats['avg_batch_size']}, p50 {stats.get('latency_p50_ms')} ms, "
+          f"p99 {stats.get('latency_p99_ms')} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
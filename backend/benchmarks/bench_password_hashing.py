@@ -0,0 +1,44 @@
+"""Benchmark login throughput (bcrypt verify) at different hashing pool sizes.
+
+Usage (from the backend directory):
+    python benchmarks/bench_password_hashing.py --rounds 12 --logins 64 --workers 1 2 4 8
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.password_hasher import PasswordHasher
+
+
+async def run_logins(hasher: PasswordHasher, password: str, hashed: str, logins: int) -> float:
+    start = time.perf_counter()
+    results = await asyncio.gather(*(hasher.verify(password, hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    assert all(valid for valid, _ in results)
+    return elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt work factor")
+    parser.add_argument("--logins", type=int, default=64, help="concurrent logins per pool size")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="pool sizes to test")
+    args = parser.parse_args()
+
+    password = "correct horse battery staple"
+    print(f"bcrypt rounds={args.rounds}, logins={args.logins}, cpus={os.cpu_count()}")
+    print(f"{'workers':>8} {'seconds':>9} {'logins/sec':>11}")
+    for workers in args.workers:
+        hasher = PasswordHasher(rounds=args.rounds, max_workers=workers)
+        hashed = await hasher.hash(password)
+        elapsed = await run_logins(hasher, password, hashed, args.logins)
+        hasher.shutdown()
+        print(f"{workers:>8} {elapsed:>9.2f} {args.logins / elapsed:>11.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
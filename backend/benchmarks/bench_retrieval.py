@@ -0,0 +1,332 @@
+"""Retrieval benchmark suite: embedding throughput, index build, search latency, memory and recall@k.
+
+Usage (from the backend directory):
+    python benchmarks/bench_retrieval.py --output results.json
+    python benchmarks/bench_retrieval.py --scales 1000 10000 100000 1000000 --indexes flat hnsw ivfpq
+    python benchmarks/bench_retrieval.py --encoder model --scales 1000 10000   # the real embedding model
+    python benchmarks/bench_retrieval.py --baseline last-release.json          # exit 1 on regressions
+
+For each scale, synthetic patient histories (in the `_history_to_text` layout) are
+embedded and then indexed with every index type through CaseIndex. Search latency is
+measured one query at a time, like the API issues them, and recall@k is computed
+against exact (flat) search. Each scale also loads MedicalMemoryService and times
+`search_similar_cases` in each retrieval mode, up to --service-max-cases.
+
+The default `synthetic` encoder (hashed token vectors) is fast enough for 1M cases and
+gives the corpus realistic overlap structure. `model` uses the configured embedding
+backend (EMBED_BACKEND) and reports its real throughput. Everything is seeded, so runs
+on the same machine are comparable. Results are written as JSON.
+"""
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.case_record import CaseRecord
+from services.vector_index import ANN_KINDS, CaseIndex, IndexConfig
+
+CONDITIONS = [
+    "hypertension (I10)", "type 2 diabetes (E11.9)", "asthma (J45.909)", "hypothyroidism (E03.9)",
+    "hyperlipidemia (E78.5)", "chronic kidney disease (N18.3)", "atrial fibrillation (I48.91)", "migraine (G43.909)",
+    "osteoarthritis (M19.90)", "COPD (J44.9)", "major depressive disorder (F32.9)", "GERD (K21.9)",
+    "anemia (D64.9)", "psoriasis (L40.0)", "gout (M10.9)", "heart failure (I50.9)",
+]
+MEDICATIONS = [
+    "metformin", "lisinopril", "atorvastatin", "levothyroxine", "albuterol", "amlodipine", "omeprazole",
+    "sertraline", "warfarin", "apixaban", "furosemide", "insulin glargine", "prednisone", "allopurinol",
+    "sumatriptan", "tiotropium", "methotrexate", "losartan", "metoprolol", "ferrous sulfate",
+]
+DOSES = ["5 mg", "10 mg", "20 mg", "25 mcg", "50 mg", "100 mg", "500 mg", "1000 mg"]
+ALLERGIES = ["penicillin", "sulfa drugs", "latex", "peanuts", "shellfish", "aspirin", "codeine"]
+SURGERIES = ["appendectomy", "cholecystectomy", "knee replacement", "CABG", "tonsillectomy", "hernia repair"]
+NOTES = [
+    "HbA1c {value}% at last visit", "BP {value}/90 mmHg", "eGFR {value} mL/min", "TSH {value} mIU/L",
+    "peak flow {value} L/min", "INR {value}", "LDL {value} mg/dL", "reports fatigue and shortness of breath",
+    "intermittent chest pain on exertion", "itchy rash on forearms", "morning joint stiffness",
+]
+
+
+def synthetic_history(rng: np.random.Generator) -> str:
+    """One patient history in the layout of MedicalMemoryService._history_to_text."""
+    def pick(items, low, high):
+        return [items[i] for i in rng.choice(len(items), size=rng.integers(low, high + 1), replace=False)]
+    medications = [f"{name} {DOSES[rng.integers(len(DOSES))]}" for name in pick(MEDICATIONS, 1, 4)]
+    notes = "; ".join(note.format(value=rng.integers(5, 200)) for note in pick(NOTES, 1, 3))
+    return " | ".join([
+        f"Conditions: {', '.join(pick(CONDITIONS, 1, 3))}",
+        f"Medications: {', '.join(medications)}",
+        f"Allergies: {', '.join(pick(ALLERGIES, 0, 2))}",
+        f"Surgeries: {', '.join(pick(SURGERIES, 0, 1))}",
+        f"Notes: {notes}",
+    ])
+
+
+def synthetic_query(rng: np.random.Generator) -> str:
+    """A short symptom-style query mentioning a condition and a medication."""
+    condition = CONDITIONS[rng.integers(len(CONDITIONS))].split(" (")[0]
+    return f"{condition} on {MEDICATIONS[rng.integers(len(MEDICATIONS))]}, {NOTES[rng.integers(7, len(NOTES))]}"
+
+
+class SyntheticEncoder:
+    """Deterministic stand-in for the embedding model: sum of hashed token vectors plus per-text noise.
+
+    Texts sharing tokens get similar vectors, so the corpus has the overlap structure
+    real histories have; the noise keeps near-duplicate histories from tying exactly.
+    """
+
+    def __init__(self, dim: int = 384, noise: float = 0.3):
+        self.dim = dim
+        self.noise = noise
+        self._tokens = {}
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        vector = self._tokens.get(token)
+        if vector is None:
+            vector = np.random.default_rng(zlib.crc32(token.encode())).standard_normal(self.dim).astype('float32')
+            self._tokens[token] = vector
+        return vector
+
+    def __call__(self, texts):
+        vectors = np.empty((len(texts), self.dim), dtype='float32')
+        for row, text in enumerate(texts):
+            tokens = re.findall(r"[a-z0-9.]+", text.lower())
+            vector = np.sum([self._token_vector(token) for token in tokens], axis=0) if tokens else 0.0
+            noise = np.random.default_rng(zlib.crc32(text.encode())).standard_normal(self.dim).astype('float32')
+            vectors[row] = vector / max(1.0, np.sqrt(len(tokens))) + self.noise * noise
+        return vectors
+
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux), falling back to the peak RSS elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentiles_ms(latencies) -> dict:
+    latencies = np.asarray(latencies)
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+        "qps": round(len(latencies) / float(latencies.sum()), 1) if latencies.sum() else 0.0,
+    }
+
+
+def embed_corpus(encode, texts, batch_size: int):
+    start = time.perf_counter()
+    vectors = np.vstack([np.asarray(encode(texts[i:i + batch_size]), dtype='float32')
+                         for i in range(0, len(texts), batch_size)])
+    seconds = time.perf_counter() - start
+    return vectors, {"texts": len(texts), "seconds": round(seconds, 3),
+                     "texts_per_second": round(len(texts) / seconds, 1) if seconds else 0.0}
+
+
+def timed_searches(index: CaseIndex, queries: np.ndarray, k: int):
+    found, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = index.search(query[None, :], k)[0]
+        latencies.append(time.perf_counter() - start)
+        found.append([case_id for case_id, _ in hits])
+    return found, latencies
+
+
+def recall_at_k(found, truth) -> float:
+    return round(float(np.mean([len(set(f) & set(t)) / max(1, len(t)) for f, t in zip(found, truth)])), 4)
+
+
+def bench_index(kind: str, case_ids, vectors, queries, k: int, truth=None) -> tuple:
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    index = CaseIndex(vectors.shape[1], config=IndexConfig(kind=kind, promote_at=1))
+    index.upsert(case_ids, vectors)
+    index.wait_for_build(timeout=24 * 3600)
+    build_seconds = time.perf_counter() - start
+    found, latencies = timed_searches(index, queries, k)
+    index_bytes = faiss.serialize_index(index.index).nbytes
+    if index._ann is not None:
+        index_bytes += faiss.serialize_index(index._ann.index).nbytes
+    result = {
+        "configured": kind,
+        "type": index.stats()["type"],
+        "build_seconds": round(build_seconds, 3),
+        "index_bytes": int(index_bytes),
+        "rss_delta_bytes": rss_bytes() - rss_before,
+        "search": percentiles_ms(latencies),
+        "recall_at_k": recall_at_k(found, truth) if truth is not None else 1.0,
+    }
+    return result, found
+
+
+def bench_service(encode, texts, vectors, query_texts, k: int) -> dict:
+    """End-to-end search_similar_cases per retrieval mode (result and embedding caches off, flat index).
+
+    Every mode but "lexical" embeds each query, so with the embedding cache on, the
+    first vector mode would pay for the model and later ones would not.
+    """
+    from services.memory_service import MedicalMemoryService, SEARCH_MODES
+
+    os.environ.update(EMBED_CACHE_DIR="", EMBED_CACHE_SIZE="0", SEARCH_CACHE_SIZE="0", MEMORY_INDEX_TYPE="flat",
+                      MEMORY_ROLE="writer")
+    with tempfile.TemporaryDirectory() as data_dir:
+        rss_before = rss_bytes()
+        start = time.perf_counter()
+        memory = MedicalMemoryService(data_dir=data_dir, snapshot_interval=24 * 3600, encode=encode)
+        records = [CaseRecord(f"case_B{i:07d}", text, category="patient_history", metadata={"patient_id": f"B{i:07d}"})
+                   for i, text in enumerate(texts)]
+        for offset in range(0, len(records), 10000):
+            memory.add_cases(records[offset:offset + 10000], vectors[offset:offset + 10000])
+        result = {"load_seconds": round(time.perf_counter() - start, 3), "rss_delta_bytes": rss_bytes() - rss_before,
+                  "modes": {}}
+        for mode in SEARCH_MODES:
+            latencies = []
+            for query in query_texts:
+                query_start = time.perf_counter()
+                asyncio.run(memory.search_similar_cases(query, top_k=k, min_score=-1.0, mode=mode))
+                latencies.append(time.perf_counter() - query_start)
+            result["modes"][mode] = percentiles_ms(latencies)
+        memory.close()
+    return result
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "faiss": getattr(faiss, "__version__", "unknown"),
+        "numpy": np.__version__,
+    }
+
+
+def compare(report: dict, baseline: dict, max_slowdown: float, max_recall_drop: float) -> list:
+    """Regressions of this report against a baseline report (matched by scale and index type).
+
+    Runs are matched on the index type they report, not the one configured: an
+    approximate build that failed runs flat and must not be compared with (or, in
+    a baseline, stand in for) the approximate numbers.
+    """
+    previous = {(scale["cases"], index["type"]): index for scale in baseline["results"] for index in scale["indexes"]
+                if index.get("configured", index["type"]) == index["type"]}
+    regressions = []
+    for scale in report["results"]:
+        for index in scale["indexes"]:
+            configured = index.get("configured", index["type"])
+            if configured != index["type"]:
+                regressions.append(f"{configured}@{scale['cases']}: ran as {index['type']}")
+                continue
+            before = previous.get((scale["cases"], index["type"]))
+            if before is None:
+                continue
+            label = f"{index['type']}@{scale['cases']}"
+            if index["search"]["p99_ms"] > max_slowdown * before["search"]["p99_ms"]:
+                regressions.append(f"{label}: p99 {before['search']['p99_ms']} -> {index['search']['p99_ms']} ms")
+            if index["recall_at_k"] < before["recall_at_k"] - max_recall_drop:
+                regressions.append(f"{label}: recall@k {before['recall_at_k']} -> {index['recall_at_k']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="corpus sizes (add 1000000 for the 1M tier; needs several GB of RAM)")
+    parser.add_argument("--indexes", nargs="+", choices=ANN_KINDS, default=list(ANN_KINDS))
+    parser.add_argument("--encoder", choices=["synthetic", "model"], default="synthetic")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=256, help="texts per embedding call")
+    parser.add_argument("--service-max-cases", type=int, default=100000,
+                        help="largest scale at which MedicalMemoryService is benchmarked end to end (0 = never)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="earlier JSON report; exit 1 if search p99 or recall regressed")
+    parser.add_argument("--max-slowdown", type=float, default=1.5, help="allowed p99 ratio vs. the baseline")
+    parser.add_argument("--max-recall-drop", type=float, default=0.02)
+    args = parser.parse_args()
+
+    if args.encoder == "model":
+        from services.embedding_service import encoder_name, load_encoder
+        encode, encoder_label = load_encoder(), encoder_name()
+    else:
+        encode, encoder_label = SyntheticEncoder(), "synthetic"
+
+    report = {
+        "suite": "retrieval",
+        "format_version": 1,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "config": {"encoder": encoder_label, "k": args.k, "queries": args.queries, "batch_size": args.batch_size,
+                   "seed": args.seed, "index_defaults": vars(IndexConfig())},
+        "results": [],
+    }
+    for n in args.scales:
+        rng = np.random.default_rng(args.seed)
+        texts = [synthetic_history(rng) for _ in range(n)]
+        query_texts = [synthetic_query(rng) for _ in range(args.queries)]
+        case_ids = [f"case_B{i:07d}" for i in range(n)]
+        vectors, embedding = embed_corpus(encode, texts, args.batch_size)
+        queries = np.asarray(encode(query_texts), dtype='float32')
+        print(f"[{n} cases] embedded at {embedding['texts_per_second']} texts/s", file=sys.stderr)
+
+        scale = {"cases": n, "embedding": embedding, "indexes": []}
+        truth = None
+        for kind in sorted(args.indexes, key=lambda kind: kind != "flat"):  # flat first: it is the ground truth
+            result, found = bench_index(kind, case_ids, vectors, queries, args.k, truth)
+            if kind == "flat":
+                truth = found
+            elif truth is None:
+                exact = CaseIndex(vectors.shape[1])
+                exact.upsert(case_ids, vectors)
+                truth = timed_searches(exact, queries, args.k)[0]
+                result["recall_at_k"] = recall_at_k(found, truth)
+            scale["indexes"].append(result)
+            print(f"[{n} cases] {result['type']:>6}: build {result['build_seconds']}s, "
+                  f"p50 {result['search']['p50_ms']} ms, p99 {result['search']['p99_ms']} ms, "
+                  f"recall@{args.k} {result['recall_at_k']}, {result['index_bytes'] / 2 ** 20:.1f} MB", file=sys.stderr)
+        if 0 < n <= args.service_max_cases:
+            scale["service"] = bench_service(encode, texts, vectors, query_texts, args.k)
+            modes = ", ".join(f"{mode} p50 {stats['p50_ms']} ms" for mode, stats in scale["service"]["modes"].items())
+            print(f"[{n} cases] search_similar_cases: {modes}", file=sys.stderr)
+        report["results"].append(scale)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_slowdown, args.max_recall_drop)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
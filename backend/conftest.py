@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Shared fixtures for tests that run the medical memory service.
+"""
+
+import zlib
+
+import numpy as np
+import pytest
+
+from services.memory_service import MedicalMemoryService
+
+
+def _fake_encode(texts):
+    """Deterministic stand-in for the embedding model: one seeded random vector per text."""
+    return np.vstack([np.random.default_rng(zlib.crc32(text.encode())).standard_normal(384).astype(np.float32)
+                      for text in texts])
+
+
+@pytest.fixture
+def fake_encode():
+    return _fake_encode
+
+
+@pytest.fixture
+def open_memory(tmp_path, monkeypatch):
+    """Opens services on one data directory (like separate processes) and closes them after the test."""
+    monkeypatch.setenv("EMBED_CACHE_DIR", "")
+    services = []
+
+    def open_memory(encode=_fake_encode):
+        service = MedicalMemoryService(data_dir=str(tmp_path / "memory"), snapshot_interval=3600, encode=encode)
+        services.append(service)
+        return service
+    yield open_memory
+    for service in reversed(services):
+        service.close()
+
+
+@pytest.fixture
+def memory(open_memory):
+    return open_memory()
@@ -0,0 +1,46 @@
+"""Fetch the ONNX export of the embedding model and quantize it to int8 for EMBED_BACKEND=onnx.
+
+Usage (from the backend directory):
+    python export_onnx_model.py                    # data/models/all-MiniLM-L6-v2/onnx/model.onnx + model_int8.onnx
+    python export_onnx_model.py --no-quantize
+
+The sentence-transformers repositories on the Hugging Face Hub ship an ONNX export of
+each model next to its tokenizer; it is downloaded as-is and quantized with onnxruntime's
+dynamic (weight-only int8, activations quantized at run time) quantization. Check the
+result against the PyTorch model with benchmarks/bench_embedding_backends.py before use.
+"""
+import os
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--output", help="model directory (default: data/models/<model>)")
+    parser.add_argument("--no-quantize", action="store_true", help="only download the float32 ONNX model")
+    args = parser.parse_args()
+
+    from huggingface_hub import snapshot_download
+
+    output = args.output or os.path.join("data", "models", args.model)
+    snapshot_download(
+        repo_id=f"sentence-transformers/{args.model}",
+        allow_patterns=["onnx/model.onnx", "tokenizer.json", "tokenizer_config.json", "config.json"],
+        local_dir=output,
+    )
+    model_path = os.path.join(output, "onnx", "model.onnx")
+    print(f"Downloaded {model_path}")
+    if args.no_quantize:
+        return
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized_path = os.path.join(output, "onnx", "model_int8.onnx")
+    quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8, per_channel=True)
+    size_mb = os.path.getsize(model_path) / 2 ** 20, os.path.getsize(quantized_path) / 2 ** 20
+    print(f"Quantized to {quantized_path} ({size_mb[0]:.1f} MB -> {size_mb[1]:.1f} MB)")
+    print(f"Use it with EMBED_BACKEND=onnx EMBED_ONNX_MODEL={quantized_path}")
+
+
+if __name__ == "__main__":
+    main()
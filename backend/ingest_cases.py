@@ -0,0 +1,57 @@
+"""Bulk-load de-identified reference cases (MedicalCase records) into the case memory.
+
+Usage (from the backend directory, with the API stopped so only one process writes the snapshot):
+    python ingest_cases.py cases.jsonl
+    python ingest_cases.py cases.csv --batch-size 512 --workers 2
+    python ingest_cases.py cases.jsonl --restart   # ignore saved progress and start from the first record
+
+Each JSONL line (or CSV row) needs `case_id` and `symptoms`; `diagnosis`, `treatment`,
+`outcome`, `category`, `metadata` (a JSON object) and `created_at` are optional, and any
+other CSV columns (e.g. `patient_id`) are kept as metadata. An interrupted run picks up
+after its last checkpoint when started again with the same file.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+
+from services.case_ingest import CaseIngester
+from services.memory_service import MedicalMemoryService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="JSONL or CSV file of cases")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="input format (default: from the file extension)")
+    parser.add_argument("--data-dir", default=os.path.join("data", "memory"), help="memory snapshot directory")
+    parser.add_argument("--batch-size", type=int, default=256, help="cases per embedding call")
+    parser.add_argument("--workers", type=int, default=2, help="concurrent embedding calls")
+    parser.add_argument("--checkpoint-every", type=int, default=50000, help="cases between snapshots")
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress for this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if not os.path.exists(args.path):
+        parser.error(f"{args.path} does not exist")
+
+    # Snapshots are written at ingest checkpoints, not on the service's timer
+    memory_service = MedicalMemoryService(data_dir=args.data_dir, snapshot_interval=24 * 3600)
+    if memory_service.role != "writer":
+        memory_service.close()
+        parser.error(f"another process (the API?) is the memory writer for {args.data_dir}; stop it first")
+    ingester = CaseIngester(memory_service, batch_size=args.batch_size, workers=args.workers,
+                            checkpoint_every=args.checkpoint_every)
+    try:
+        result = ingester.run(args.path, file_format=args.format, resume=not args.restart)
+    except KeyboardInterrupt:
+        print("Interrupted; progress saved, run the same command again to resume", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        memory_service.close()
+    print(json.dumps(result, indent=2))
+    print(f"Ingested {result['ingested']} cases in {result['seconds']}s ({result['cases_per_second']} cases/sec)")
+
+
+if __name__ == "__main__":
+    main()
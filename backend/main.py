@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
@@ -16,7 +16,7 @@ except ImportError:
 
 # Import our modules
 from models.symptom_models import SymptomRequest, DiagnosisResponse, PatientHistory, SeverityLevel, MedicalCase
-from models.user_models import UserRegistration, UserLogin, UserProfile, UserDashboard
+from models.user_models import UserRegistration, UserLogin, UserProfile, UserSession, UserDashboard
 from services.symptom_checker import SymptomCheckerService
 from services.memory_service import MedicalMemoryService
 from services.image_service import ImageAnalysisService
@@ -51,7 +51,13 @@ image_service = ImageAnalysisService()
 speech_service = SpeechToTextService()
 pdf_service = PDFProcessingService()
 ocr_service = OCRService()
-user_service = UserService()
+user_service = UserService(memory_service=memory_service)
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    """Flush buffered state to disk before the process exits."""
+    user_service.close()
+    memory_service.close()
 
 # Dependency to get current user (placeholder for now)
 async def get_current_user(patient_id: str = Form(...)):
@@ -61,6 +67,27 @@ async def get_current_user(patient_id: str = Form(...)):
         raise HTTPException(status_code=401, detail="Invalid patient ID")
     return user
 
+def _session_token(authorization: Optional[str], x_session_token: Optional[str]) -> Optional[str]:
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:].strip()
+    return x_session_token
+
+async def get_session_patient_id(
+    authorization: Optional[str] = Header(None),
+    x_session_token: Optional[str] = Header(None)
+) -> Optional[str]:
+    """Patient ID of the request's session token (in memory, or one store lookup on a cache miss).
+    
+    Returns None when no token is sent, so endpoints can fall back to the patient ID lookup.
+    """
+    token = _session_token(authorization, x_session_token)
+    if not token:
+        return None
+    patient_id = await user_service.validate_session(token)
+    if not patient_id:
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    return patient_id
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -70,6 +97,14 @@ async def root():
         "version": "1.0.0"
     }
 
+@app.get("/api/stats")
+async def get_service_stats():
+    """Cache and performance counters for monitoring."""
+    return {
+        "user_cache": user_service.cache_stats(),
+        "memory": memory_service.stats()
+    }
+
 @app.post("/analyze-symptoms", response_model=DiagnosisResponse)
 async def analyze_symptoms(request: SymptomRequest):
     """
@@ -310,42 +345,64 @@ async def get_symptom_categories():
     ]
     return {"categories": categories}
 
-@app.post("/search-cases", response_model=List[MedicalCase])
-async def search_similar_cases(query: str, top_k: int = 3):
+@app.post("/search-cases", response_model=List[MedicalCase], response_model_exclude_none=True)
+async def search_similar_cases(query: str, top_k: int = 3, min_score: Optional[float] = None,
+                               include_embeddings: bool = False, patient_id: Optional[str] = None,
+                               category: Optional[str] = None, mode: Optional[str] = None):
     """
-    Search for similar medical cases using FAISS vector search.
+    Search for similar medical cases by embedding similarity, BM25 keywords, or both.
+    mode is vector, lexical or hybrid (default MEMORY_SEARCH_MODE).
+    Vector hits with a cosine similarity below min_score are left out (hybrid mode still keeps keyword matches);
+    embeddings are only returned on request.
+    patient_id and category restrict results to matching cases.
     """
     try:
-        results = await memory_service.search_similar_cases(query, top_k=top_k)
+        results = await memory_service.search_similar_cases(
+            query, top_k=top_k, min_score=min_score, include_embeddings=include_embeddings,
+            patient_id=patient_id, category=category, mode=mode
+        )
         return results
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error searching similar cases: {str(e)}")
 
 # User Authentication Endpoints
-@app.post("/api/auth/register", response_model=UserProfile)
+@app.post("/api/auth/register", response_model=UserSession)
 async def register_user(user_data: UserRegistration):
     """Register a new user with auto-generated patient ID."""
     try:
         user_profile = await user_service.register_user(user_data)
-        return user_profile
+        return await user_service.start_session(user_profile)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Registration error: {e}")
         raise HTTPException(status_code=500, detail="Registration failed")
 
-@app.post("/api/auth/login", response_model=UserProfile)
+@app.post("/api/auth/login", response_model=UserSession)
 async def login_user(login_data: UserLogin):
-    """Authenticate user and return profile."""
+    """Authenticate user and return profile with a session token."""
     try:
         user_profile = await user_service.login_user(login_data)
-        return user_profile
+        return await user_service.start_session(user_profile)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Login error: {e}")
         raise HTTPException(status_code=500, detail="Login failed")
 
+@app.post("/api/auth/logout")
+async def logout_user(
+    authorization: Optional[str] = Header(None),
+    x_session_token: Optional[str] = Header(None)
+):
+    """Revoke the request's session token."""
+    token = _session_token(authorization, x_session_token)
+    if not token or not await user_service.end_session(token):
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    return {"message": "Logged out"}
+
 @app.get("/api/user/profile/{patient_id}", response_model=UserProfile)
 async def get_user_profile(patient_id: str):
     """Get user profile by patient ID."""
@@ -386,25 +443,47 @@ async def get_dashboard_data(patient_id: str):
         raise HTTPException(status_code=500, detail="Failed to retrieve dashboard data")
 
 @app.get("/api/documents/{patient_id}")
-async def get_user_documents(patient_id: str, limit: int = 10):
-    """Get user's uploaded documents."""
+async def get_user_documents(patient_id: str, limit: int = 10, after: Optional[str] = None, include_body: bool = False):
+    """Get user's uploaded documents, newest first.
+
+    Pass the returned `next_cursor` as `after` to fetch the next page. Extracted data
+    and full text are omitted unless `include_body` is true.
+    """
     try:
-        documents = await user_service.get_user_documents(patient_id, limit)
-        return {"documents": [doc.dict() for doc in documents]}
+        documents = await user_service.get_user_documents(patient_id, limit, after=after, include_body=include_body)
+        next_cursor = user_service.document_cursor(documents[-1]) if documents and len(documents) == limit else None
+        return {"documents": [doc.dict() for doc in documents], "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Document retrieval error: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve documents")
 
+@app.get("/api/documents/{patient_id}/{document_id}")
+async def get_user_document(patient_id: str, document_id: str):
+    """Get a single document including its extracted data and full text."""
+    try:
+        document = await user_service.get_user_document(patient_id, document_id)
+        return document.dict()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Document retrieval error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve document")
+
 # Enhanced Upload Endpoint with User Integration
 @app.post("/api/upload/{patient_id}")
 async def upload_patient_history_with_user(
     patient_id: str,
     file: UploadFile = File(...),
-    patient_id_form: str = Form(...)
+    patient_id_form: str = Form(...),
+    session_patient_id: Optional[str] = Depends(get_session_patient_id)
 ):
     """Upload patient history (PDF or image) with user integration."""
     if patient_id != patient_id_form:
         raise HTTPException(status_code=400, detail="Patient ID mismatch")
+    if session_patient_id and session_patient_id != patient_id:
+        raise HTTPException(status_code=403, detail="Session does not belong to this patient")
     
     try:
         # Validate file type
@@ -465,14 +544,20 @@ async def upload_patient_history_with_user(
 @app.post("/api/check-symptoms")
 async def check_symptoms(
     request: SymptomRequest,
-    patient_id: str = Form(...)
+    patient_id: str = Form(...),
+    session_patient_id: Optional[str] = Depends(get_session_patient_id)
 ):
     """Check symptoms with user context."""
     try:
-        # Get user profile for context
-        user_profile = await user_service.get_user_profile(patient_id)
-        if not user_profile:
-            raise HTTPException(status_code=404, detail="User not found")
+        if session_patient_id:
+            # A valid session already proves the user exists
+            if session_patient_id != patient_id:
+                raise HTTPException(status_code=403, detail="Session does not belong to this patient")
+        else:
+            # Get user profile for context
+            user_profile = await user_service.get_user_profile(patient_id)
+            if not user_profile:
+                raise HTTPException(status_code=404, detail="User not found")
         
         # Process symptoms with user context
         response = await symptom_checker.analyze_symptoms(
@@ -498,10 +583,11 @@ async def check_symptoms(
 @app.post("/api/upload")
 async def upload_patient_history_legacy(
     file: UploadFile = File(...),
-    patient_id: str = Form(...)
+    patient_id: str = Form(...),
+    session_patient_id: Optional[str] = Depends(get_session_patient_id)
 ):
     """Legacy upload endpoint for backward compatibility."""
-    return await upload_patient_history_with_user(patient_id, file, patient_id)
+    return await upload_patient_history_with_user(patient_id, file, patient_id, session_patient_id)
 
 # Speech-to-Symptoms Endpoint with User Authentication
 @app.post("/api/speech-to-symptoms")
@@ -67,4 +67,6 @@ class MedicalCase(BaseModel):
     category: str = Field(..., description="Medical category")
     embedding: Optional[List[float]] = Field(None, description="Vector embedding for similarity search")
     metadata: Dict[str, Any] = Field(default={}, description="Additional metadata")
+    similarity_score: Optional[float] = Field(None, description="Cosine similarity to the search query")
+    retrieval_score: Optional[float] = Field(None, description="BM25 (lexical) or fused rank (hybrid) search score")
     created_at: datetime = Field(default_factory=datetime.now) 
\ No newline at end of file
@@ -32,6 +32,11 @@ class UserProfile(BaseModel):
     created_at: datetime = Field(default_factory=datetime.now, description="Account creation date")
     last_login: Optional[datetime] = Field(None, description="Last login timestamp")
 
+class UserSession(UserProfile):
+    """Model for a user profile returned on login/registration, with a session token"""
+    session_token: str = Field(..., description="Bearer token for authenticated requests")
+    session_expires_at: datetime = Field(..., description="Session expiry timestamp")
+
 class UserDocument(BaseModel):
     """Model for user uploaded documents"""
     document_id: str = Field(..., description="Unique document identifier")
@@ -42,6 +47,7 @@ class UserDocument(BaseModel):
     file_size: int = Field(..., description="File size in bytes")
     extracted_data: dict = Field(default={}, description="Extracted medical data")
     full_text: str = Field(default="", description="Full extracted text")
+    body_ref: Optional[str] = Field(None, description="Content-addressed reference to the stored extracted data and text")
     confidence_score: float = Field(default=0.0, description="Extraction confidence")
 
 class UserDashboard(BaseModel):
@@ -0,0 +1,107 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+from typing import Optional
+import logging
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+_SAFE_NAMESPACE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+# File extension per compression codec; reads probe all of them so the codec can change over time
+_EXTENSIONS = {
+    "zstd": ".json.zst",
+    "gzip": ".json.gz",
+    "none": ".json",
+}
+
+
+class BlobStore:
+    """Content-addressed storage for document bodies (extracted data and full text).
+
+    Blobs are keyed by the SHA-256 of their canonical JSON, so identical uploads
+    share one file. Blobs are scoped to a namespace (the patient ID), which keeps
+    deletion safe: a blob is only shared between documents of the same patient.
+    """
+
+    def __init__(self, root: str = "data/blobs", compression: str = "gzip"):
+        self.root = root
+        if compression == "zstd" and zstandard is None:
+            logger.warning("zstandard is not installed; falling back to gzip blob compression")
+            compression = "gzip"
+        if compression not in _EXTENSIONS:
+            raise ValueError(f"Unsupported blob compression: {compression}")
+        self.compression = compression
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def _digest(ref: str) -> str:
+        algorithm, _, digest = ref.partition(':')
+        if algorithm != "sha256" or not re.fullmatch(r'[0-9a-f]{64}', digest):
+            raise ValueError(f"Invalid blob reference: {ref!r}")
+        return digest
+
+    def _base_path(self, namespace: str, digest: str) -> str:
+        if not _SAFE_NAMESPACE.match(namespace):
+            raise ValueError(f"Invalid blob namespace: {namespace!r}")
+        return os.path.join(self.root, namespace, digest[:2], digest)
+
+    def _find(self, namespace: str, digest: str) -> Optional[str]:
+        base = self._base_path(namespace, digest)
+        for extension in _EXTENSIONS.values():
+            if os.path.exists(base + extension):
+                return base + extension
+        return None
+
+    def _compress(self, payload: bytes) -> bytes:
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(level=3).compress(payload)
+        if self.compression == "gzip":
+            return gzip.compress(payload, compresslevel=6)
+        return payload
+
+    @staticmethod
+    def _decompress(path: str, data: bytes) -> bytes:
+        if path.endswith(_EXTENSIONS["zstd"]):
+            if zstandard is None:
+                raise RuntimeError(f"zstandard is required to read {path}")
+            return zstandard.ZstdDecompressor().decompress(data)
+        if path.endswith(_EXTENSIONS["gzip"]):
+            return gzip.decompress(data)
+        return data
+
+    def put(self, namespace: str, body: dict) -> str:
+        """Store a body and return its reference ("sha256:<hex>"). Existing blobs are reused."""
+        payload = json.dumps(body, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+        digest = hashlib.sha256(payload).hexdigest()
+        if self._find(namespace, digest):
+            return f"sha256:{digest}"
+
+        path = self._base_path(namespace, digest) + _EXTENSIONS[self.compression]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self._compress(payload))
+        os.replace(tmp_path, path)
+        return f"sha256:{digest}"
+
+    def get(self, namespace: str, ref: str) -> Optional[dict]:
+        """Load a body by reference, or None if the blob is missing."""
+        path = self._find(namespace, self._digest(ref))
+        if not path:
+            logger.warning(f"Blob {ref} not found for {namespace}")
+            return None
+        with open(path, 'rb') as f:
+            return json.loads(self._decompress(path, f.read()))
+
+    def delete(self, namespace: str, ref: str) -> None:
+        path = self._find(namespace, self._digest(ref))
+        if path:
+            os.remove(path)
@@ -0,0 +1,182 @@
+import os
+import csv
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from services.case_record import CaseRecord
+from services.embedding_service import EncodeFn
+
+logger = logging.getLogger(__name__)
+
+CASE_FIELDS = ("case_id", "symptoms", "diagnosis", "treatment", "outcome", "category", "metadata", "created_at")
+
+
+def parse_case(data: Dict[str, Any]) -> Optional[CaseRecord]:
+    """CaseRecord from a MedicalCase-shaped dict, or None if it has no case_id or symptoms.
+
+    Only case_id and symptoms are required; other text fields default to "". Keys
+    that aren't MedicalCase fields (e.g. a CSV `patient_id` column) go into metadata.
+    """
+    if not data.get("case_id") or not data.get("symptoms"):
+        return None
+    metadata = data.get("metadata") or {}
+    if isinstance(metadata, str):
+        metadata = json.loads(metadata)
+    extra = {key: value for key, value in data.items() if key not in CASE_FIELDS and value not in (None, "")}
+    case = {key: data[key] for key in CASE_FIELDS if data.get(key) not in (None, "")}
+    case["case_id"] = str(case["case_id"])
+    case["metadata"] = {**extra, **metadata}
+    return CaseRecord.from_dict(case)
+
+
+def read_cases(path: str, file_format: Optional[str] = None, skip: int = 0) -> Iterator[Optional[CaseRecord]]:
+    """Stream cases from a JSONL or CSV file, one item per record (None for invalid records).
+
+    The first `skip` records are passed over without being parsed as cases.
+    """
+    file_format = file_format or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if file_format == "csv":
+            rows = csv.DictReader(f)
+            records = (row for position, row in enumerate(rows) if position >= skip)
+        else:
+            lines = (line for line in f if line.strip())
+            records = (line for position, line in enumerate(lines) if position >= skip)
+        for record in records:
+            try:
+                yield parse_case(record if isinstance(record, dict) else json.loads(record))
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Skipping invalid case record: {e}")
+                yield None
+
+
+class CaseIngester:
+    """Bulk-loads reference cases into a MedicalMemoryService.
+
+    Records are streamed from disk in chunks of `batch_size`. A pool of `workers`
+    threads embeds chunks while at most 2 * workers chunks are in flight, and
+    embedded chunks are added to the index in input order, so memory stays bounded
+    however large the file is. Every `checkpoint_every` cases the memory snapshot
+    is written and the number of consumed records is saved to a progress file; an
+    interrupted run resumes after the last checkpoint (re-adding a case just
+    replaces its vector).
+    """
+
+    def __init__(self, memory_service, encode: Optional[EncodeFn] = None, batch_size: int = 256,
+                 workers: int = 2, checkpoint_every: int = 50000):
+        self.memory = memory_service
+        self.encode = encode or memory_service.embedder.encode
+        self.batch_size = batch_size
+        self.workers = workers
+        self.checkpoint_every = checkpoint_every
+        self._progress: Dict[str, Any] = {}
+        self._progress_path: Optional[str] = None
+        self._since_checkpoint = 0
+
+    def progress_path(self, path: str) -> str:
+        name = os.path.basename(path)
+        return os.path.join(self.memory.snapshots.directory, f"ingest-{name}.progress.json")
+
+    def load_progress(self, path: str) -> Dict[str, Any]:
+        """Saved progress for `path`, or an empty start if there is none (or it is for another file)."""
+        start = {"source": os.path.abspath(path), "records": 0, "ingested": 0, "invalid": 0}
+        try:
+            with open(self.progress_path(path), 'r') as f:
+                progress = json.load(f)
+        except (OSError, ValueError):
+            return start
+        return {**start, **progress} if progress.get("source") == start["source"] else start
+
+    def checkpoint(self) -> None:
+        """Snapshot the memory, then record how far the input has been consumed."""
+        if self._progress_path is None:
+            return
+        self.memory.save_snapshot()
+        tmp_path = f"{self._progress_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._progress, f)
+        os.replace(tmp_path, self._progress_path)
+        self._since_checkpoint = 0
+
+    def _chunks(self, records: Iterator[Optional[CaseRecord]]) -> Iterator[Tuple[List[CaseRecord], int, int]]:
+        """(valid cases, records consumed, invalid records) per chunk of up to batch_size records."""
+        chunk, consumed, invalid = [], 0, 0
+        for record in records:
+            consumed += 1
+            if record is None:
+                invalid += 1
+            else:
+                chunk.append(record)
+            if consumed == self.batch_size:
+                yield chunk, consumed, invalid
+                chunk, consumed, invalid = [], 0, 0
+        if consumed:
+            yield chunk, consumed, invalid
+
+    def _embed(self, records: List[CaseRecord]) -> np.ndarray:
+        if not records:
+            return np.zeros((0, self.memory.faiss_dim), dtype='float32')
+        return np.asarray(self.encode([record.symptoms for record in records]), dtype='float32')
+
+    def _commit(self, chunk: Tuple[List[CaseRecord], int, int], vectors: np.ndarray):
+        records, consumed, invalid = chunk
+        if records:
+            self.memory.add_cases(records, vectors)
+        self._progress["records"] += consumed
+        self._progress["ingested"] += len(records)
+        self._progress["invalid"] += invalid
+        self._since_checkpoint += len(records)
+        if self._since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def run(self, path: str, file_format: Optional[str] = None, resume: bool = True,
+            report_every: float = 10.0) -> Dict[str, Any]:
+        """Ingest a file and return counts and throughput for this run."""
+        self._progress_path = self.progress_path(path)
+        self._progress = self.load_progress(path)
+        if not resume:
+            self._progress.update(records=0, ingested=0, invalid=0)
+        skipped = self._progress["records"]
+        if skipped:
+            logger.info(f"Resuming {path} after {skipped} records ({self._progress['ingested']} cases ingested)")
+        start_ingested = self._progress["ingested"]
+        start = last_report = time.perf_counter()
+
+        pending: deque = deque()
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="case-ingest")
+        try:
+            for chunk in self._chunks(read_cases(path, file_format, skip=skipped)):
+                pending.append((chunk, pool.submit(self._embed, chunk[0])))
+                if len(pending) >= 2 * self.workers:
+                    chunk, future = pending.popleft()
+                    self._commit(chunk, future.result())
+                now = time.perf_counter()
+                if now - last_report >= report_every:
+                    ingested = self._progress["ingested"] - start_ingested
+                    logger.info(f"Ingested {ingested} cases ({ingested / (now - start):.1f} cases/sec)")
+                    last_report = now
+            while pending:
+                chunk, future = pending.popleft()
+                self._commit(chunk, future.result())
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            # Keep whatever was added before an interruption or error
+            self.checkpoint()
+
+        elapsed = time.perf_counter() - start
+        ingested = self._progress["ingested"] - start_ingested
+        return {
+            "ingested": ingested,
+            "invalid": self._progress["invalid"],
+            "total_ingested": self._progress["ingested"],
+            "resumed_after": skipped,
+            "seconds": round(elapsed, 2),
+            "cases_per_second": round(ingested / elapsed, 1) if elapsed else 0.0,
+            "index": self.memory.case_index.stats(),
+        }
@@ -0,0 +1,76 @@
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from models.symptom_models import MedicalCase
+
+
+class CaseRecord:
+    """Compact in-memory form of a MedicalCase.
+
+    Uses __slots__ (no per-instance dict), interns the repeated short strings
+    and never holds the embedding, which lives only in the vector index. A full
+    MedicalCase is built only for the cases a search actually returns.
+    """
+
+    __slots__ = ("case_id", "symptoms", "diagnosis", "treatment", "outcome", "category", "metadata", "created_at")
+
+    def __init__(self, case_id: str, symptoms: str, diagnosis: str = "", treatment: str = "", outcome: str = "",
+                 category: str = "", metadata: Optional[Dict[str, Any]] = None, created_at: Optional[datetime] = None):
+        self.case_id = case_id
+        self.symptoms = symptoms
+        self.diagnosis = sys.intern(diagnosis)
+        self.treatment = sys.intern(treatment)
+        self.outcome = sys.intern(outcome)
+        self.category = sys.intern(category)
+        self.metadata = metadata or None
+        self.created_at = created_at or datetime.now()
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CaseRecord":
+        """Build from a MedicalCase-shaped dict (extra keys such as `embedding` are ignored)."""
+        created_at = data.get("created_at")
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        return cls(
+            case_id=data["case_id"],
+            symptoms=data.get("symptoms", ""),
+            diagnosis=data.get("diagnosis", ""),
+            treatment=data.get("treatment", ""),
+            outcome=data.get("outcome", ""),
+            category=data.get("category", ""),
+            metadata=data.get("metadata"),
+            created_at=created_at,
+        )
+
+    def filter_attributes(self) -> Dict[str, Optional[str]]:
+        """Attributes the vector index can filter searches on."""
+        return {"patient_id": (self.metadata or {}).get("patient_id"), "category": self.category}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "case_id": self.case_id,
+            "symptoms": self.symptoms,
+            "diagnosis": self.diagnosis,
+            "treatment": self.treatment,
+            "outcome": self.outcome,
+            "category": self.category,
+            "metadata": self.metadata or {},
+            "created_at": self.created_at.isoformat(),
+        }
+
+    def to_model(self, similarity_score: Optional[float] = None, embedding: Optional[List[float]] = None,
+                 retrieval_score: Optional[float] = None) -> MedicalCase:
+        return MedicalCase(
+            case_id=self.case_id,
+            symptoms=self.symptoms,
+            diagnosis=self.diagnosis,
+            treatment=self.treatment,
+            outcome=self.outcome,
+            category=self.category,
+            embedding=embedding,
+            metadata=dict(self.metadata or {}),
+            similarity_score=similarity_score,
+            retrieval_score=retrieval_score,
+            created_at=self.created_at,
+        )
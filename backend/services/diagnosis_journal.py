@@ -0,0 +1,191 @@
+import os
+import json
+import shutil
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def journal_path_for(snapshot_path: str) -> str:
+    """Return the NDJSON journal path that accompanies a diagnoses snapshot file."""
+    base, _ = os.path.splitext(snapshot_path)
+    return base + ".ndjson"
+
+
+class DiagnosisJournal:
+    """Append-only diagnosis log with in-memory per-patient ring buffers.
+
+    Each saved diagnosis is appended as one NDJSON line instead of rewriting the
+    snapshot file. Reads are served from the ring buffers. A background thread
+    periodically compacts the journal back into the snapshot (the legacy
+    `diagnoses.json` format: patient_id -> entries, most recent first).
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: Optional[str] = None, keep: int = 10,
+                 compact_interval: float = 300.0, compact_threshold: int = 1000):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or journal_path_for(snapshot_path)
+        self._compacting_path = self.journal_path + ".compacting"
+        self.keep = keep
+        self.compact_interval = compact_interval
+        self.compact_threshold = compact_threshold
+
+        self._buffers: Dict[str, Deque[dict]] = {}  # oldest -> newest
+        self._pending = 0  # journal entries not yet folded into the snapshot
+        self._reads = 0
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+
+        self._load()
+        self._journal = open(self.journal_path, 'a')
+        if self._pending:
+            # Fold entries left over from the previous run before accepting new ones
+            self.compact()
+
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._compactor = threading.Thread(target=self._compaction_loop, name="diagnosis-compactor", daemon=True)
+        self._compactor.start()
+
+    def _buffer(self, patient_id: str, keep: int) -> Deque[dict]:
+        buffer = self._buffers.get(patient_id)
+        if buffer is None or buffer.maxlen != keep:
+            buffer = deque(buffer or (), maxlen=keep)
+            self._buffers[patient_id] = buffer
+        return buffer
+
+    def _load(self):
+        """Rebuild the ring buffers from the snapshot and replay any journal entries."""
+        self._buffers, self._pending = _replay(
+            self.snapshot_path, [self._compacting_path, self.journal_path], self.keep
+        )
+
+    def append(self, patient_id: str, entry: dict, keep: Optional[int] = None) -> None:
+        """Append a diagnosis to the journal and the patient's ring buffer."""
+        line = json.dumps({"patient_id": patient_id, "entry": entry}, default=str)
+        # Buffer the serialized form so reads match what a replay from disk would return
+        entry = json.loads(line)['entry']
+        with self._lock:
+            self._journal.write(line + "\n")
+            self._journal.flush()
+            self._buffer(patient_id, keep or self.keep).append(entry)
+            self._pending += 1
+            if self._pending >= self.compact_threshold:
+                self._wake.set()
+
+    def recent(self, patient_id: str, limit: int) -> List[dict]:
+        """Return the patient's diagnoses, most recent first."""
+        with self._lock:
+            self._reads += 1
+            buffer = self._buffers.get(patient_id)
+            if not buffer:
+                return []
+            return list(reversed(buffer))[:limit]
+
+    def patients(self) -> List[str]:
+        """IDs of the patients with at least one diagnosis."""
+        with self._lock:
+            return [patient_id for patient_id, buffer in self._buffers.items() if buffer]
+
+    def stats(self) -> Dict[str, int]:
+        """Reads are always served from memory, so every read counts as a hit."""
+        return {"hits": self._reads, "misses": 0, "pending_journal_entries": self._pending}
+
+    def compact(self) -> None:
+        """Fold the journal into the snapshot file and start a fresh journal."""
+        with self._compact_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                self._journal.close()
+                if os.path.exists(self._compacting_path):
+                    # A previous compaction failed; keep its entries alongside the new ones
+                    with open(self._compacting_path, 'a') as dst, open(self.journal_path, 'r') as src:
+                        shutil.copyfileobj(src, dst)
+                    os.remove(self.journal_path)
+                else:
+                    os.replace(self.journal_path, self._compacting_path)
+                self._journal = open(self.journal_path, 'a')
+                snapshot = {pid: list(reversed(buffer)) for pid, buffer in self._buffers.items()}
+                self._pending = 0
+
+            # The expensive serialization runs outside the lock so appends are never blocked
+            tmp_path = self.snapshot_path + ".tmp"
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(snapshot, f, indent=2, default=str)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.snapshot_path)
+                os.remove(self._compacting_path)
+            except Exception as e:
+                # The .compacting journal is kept and retried on the next pass or start
+                logger.error(f"Error compacting diagnoses journal: {e}")
+                with self._lock:
+                    self._pending = max(self._pending, 1)
+                return
+            logger.info(f"Compacted diagnoses journal into {self.snapshot_path}")
+
+    def _compaction_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.compact_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.compact()
+
+    def close(self) -> None:
+        """Stop background compaction, fold the journal and close it."""
+        self._stop.set()
+        self._wake.set()
+        self._compactor.join()
+        self.compact()
+        with self._lock:
+            self._journal.close()
+
+
+def _replay(snapshot_path: str, journal_paths: List[str], keep: int) -> Tuple[Dict[str, Deque[dict]], int]:
+    """Load a snapshot into ring buffers and replay journal files on top of it.
+
+    Returns the buffers and the number of journal entries applied.
+    """
+    buffers: Dict[str, Deque[dict]] = {}
+    if os.path.exists(snapshot_path):
+        try:
+            with open(snapshot_path, 'r') as f:
+                snapshot = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading diagnoses snapshot {snapshot_path}: {e}")
+            snapshot = {}
+        for patient_id, entries in snapshot.items():
+            buffers[patient_id] = deque(reversed(entries[:keep]), maxlen=keep)
+
+    replayed = 0
+    for path in journal_paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping torn journal line in {path}")
+                    continue
+                buffer = buffers.setdefault(record['patient_id'], deque(maxlen=keep))
+                diagnosis_id = record['entry'].get('diagnosis_id')
+                # Entries may already be in the snapshot if compaction died after writing it
+                if any(e.get('diagnosis_id') == diagnosis_id for e in buffer):
+                    continue
+                buffer.append(record['entry'])
+                replayed += 1
+    return buffers, replayed
+
+
+def load_diagnoses(snapshot_path: str, keep: int = 10) -> Dict[str, List[dict]]:
+    """Read diagnoses (snapshot plus journal) without opening the journal for writing."""
+    journal_path = journal_path_for(snapshot_path)
+    buffers, _ = _replay(snapshot_path, [journal_path + ".compacting", journal_path], keep)
+    return {pid: list(reversed(buffer)) for pid, buffer in buffers.items()}
@@ -0,0 +1,209 @@
+import os
+import re
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Case- and whitespace-insensitive form used for cache keys."""
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+def embedding_cache_key(text: str, model_name: str) -> str:
+    payload = f"{model_name}\0{normalize_text(text)}".encode('utf-8')
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+class _DiskTier:
+    """Fixed-capacity ring of vectors in a memory-mapped float32 file.
+
+    `<name>.f32` holds the vectors; `<name>.keys` is an append-only log of
+    "<slot> <key> <crc32>" lines replayed on open (later lines win). The CRC of
+    the vector bytes guards against a key line that survived a crash while its
+    vector page did not.
+    """
+
+    def __init__(self, directory: str, name: str, dim: int, capacity: int):
+        os.makedirs(directory, exist_ok=True)
+        self.dim = dim
+        self.capacity = capacity
+        self.vectors_path = os.path.join(directory, f"{name}.f32")
+        self.keys_path = os.path.join(directory, f"{name}.keys")
+        mode = 'r+' if os.path.exists(self.vectors_path) else 'w+'
+        self.vectors = np.memmap(self.vectors_path, dtype='float32', mode=mode, shape=(capacity, dim))
+
+        self.slots: Dict[str, tuple] = {}  # key -> (slot, crc)
+        self._slot_keys: Dict[int, str] = {}
+        self._next_slot = 0
+        self._log_lines = 0
+        self._replay()
+        self._log = open(self.keys_path, 'a')
+
+    def _assign(self, slot: int, key: str, crc: int):
+        previous = self._slot_keys.get(slot)
+        if previous is not None:
+            self.slots.pop(previous, None)
+        self.slots[key] = (slot, crc)
+        self._slot_keys[slot] = key
+
+    def _replay(self):
+        if not os.path.exists(self.keys_path):
+            return
+        with open(self.keys_path, 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) != 3:
+                    continue  # torn last line
+                slot, key, crc = int(parts[0]), parts[1], int(parts[2])
+                if slot < self.capacity:
+                    self._assign(slot, key, crc)
+                    self._next_slot = (slot + 1) % self.capacity
+                self._log_lines += 1
+
+    @staticmethod
+    def _crc(vector: np.ndarray) -> int:
+        return zlib.crc32(np.ascontiguousarray(vector, dtype='float32').tobytes())
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        entry = self.slots.get(key)
+        if entry is None:
+            return None
+        vector = np.array(self.vectors[entry[0]])
+        return vector if self._crc(vector) == entry[1] else None
+
+    def put(self, key: str, vector: np.ndarray):
+        if key in self.slots:
+            return
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % self.capacity
+        self.vectors[slot] = vector
+        crc = self._crc(vector)
+        self._assign(slot, key, crc)
+        self._log.write(f"{slot} {key} {crc}\n")
+        self._log_lines += 1
+        if self._log_lines > 2 * self.capacity:
+            self._compact_log()
+
+    def _compact_log(self):
+        """Rewrite the key log with only live entries."""
+        self._log.close()
+        tmp_path = self.keys_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            # Oldest slot first, so replay ends with the same next slot
+            order = sorted(self._slot_keys, key=lambda slot: (slot - self._next_slot) % self.capacity)
+            for slot in order:
+                key = self._slot_keys[slot]
+                f.write(f"{slot} {key} {self.slots[key][1]}\n")
+        os.replace(tmp_path, self.keys_path)
+        self._log_lines = len(self._slot_keys)
+        self._log = open(self.keys_path, 'a')
+
+    def flush(self):
+        self.vectors.flush()
+        self._log.flush()
+
+    def close(self):
+        self.flush()
+        self._log.close()
+
+
+class EmbeddingCache:
+    """Embedding cache keyed by a hash of the normalized text and the model name.
+
+    A bounded in-memory LRU sits in front of an optional on-disk tier (see
+    _DiskTier), so repeated queries and re-uploaded histories skip the model
+    entirely, also across restarts.
+    """
+
+    def __init__(self, model_name: str, dim: int, max_entries: int = 10000,
+                 disk_dir: Optional[str] = None, disk_capacity: int = 100000):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self.disk: Optional[_DiskTier] = None
+        if disk_dir:
+            name = re.sub(r'[^A-Za-z0-9_.-]', '_', model_name) + f"-{dim}"
+            try:
+                self.disk = _DiskTier(disk_dir, name, dim, disk_capacity)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Embedding disk cache unavailable ({e}); using memory only")
+
+    @classmethod
+    def from_env(cls, model_name: str, dim: int, disk: bool = True) -> "EmbeddingCache":
+        """Configured cache; `disk=False` skips the disk tier (it has a single writer process)."""
+        return cls(
+            model_name, dim,
+            max_entries=int(os.getenv("EMBED_CACHE_SIZE", "10000")),
+            disk_dir=(os.getenv("EMBED_CACHE_DIR", os.path.join("data", "embedding_cache")) or None) if disk else None,
+            disk_capacity=int(os.getenv("EMBED_CACHE_DISK_SIZE", "100000")),
+        )
+
+    def key(self, text: str) -> str:
+        return embedding_cache_key(text, self.model_name)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self.key(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self._memory_hits += 1
+                return vector
+            vector = self.disk.get(key) if self.disk else None
+            if vector is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._remember(key, vector)
+            return vector
+
+    def put(self, text: str, vector: np.ndarray) -> None:
+        key = self.key(text)
+        vector = np.asarray(vector, dtype='float32')
+        with self._lock:
+            self._remember(key, vector)
+            if self.disk:
+                self.disk.put(key, vector)
+
+    def _remember(self, key: str, vector: np.ndarray):
+        vector.setflags(write=False)  # callers share the cached array
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self._memory_hits + self._disk_hits + self._misses
+            return {
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round((self._memory_hits + self._disk_hits) / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._entries),
+                "disk_entries": len(self.disk.slots) if self.disk else 0
+            }
+
+    def flush(self) -> None:
+        with self._lock:
+            if self.disk:
+                self.disk.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self.disk:
+                self.disk.close()
+                self.disk = None
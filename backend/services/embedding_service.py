@@ -0,0 +1,204 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EncodeFn = Callable[[List[str]], np.ndarray]
+
+
+def load_sentence_transformer(model_name: str = 'all-MiniLM-L6-v2') -> EncodeFn:
+    """Load a SentenceTransformer model and return its batch encode function."""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name)
+
+    def encode(texts: List[str]) -> np.ndarray:
+        return model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+
+    return encode
+
+
+def mean_pool(hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """Mask-aware mean of token embeddings, L2-normalized (matches all-MiniLM-L6-v2's pooling + Normalize)."""
+    mask = attention_mask[..., None].astype('float32')
+    pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    return (pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)).astype('float32')
+
+
+def load_onnx_encoder(model_path: str, threads: int = 0, max_length: int = 256) -> EncodeFn:
+    """Load an exported (optionally int8-quantized) ONNX transformer and return its batch encode function.
+
+    `tokenizer.json` is looked up next to the model file and in its parent directory (the
+    layout of the sentence-transformers repositories, which keep models under `onnx/`).
+    `threads` sets onnxruntime's intra-op thread count (0 = one per core).
+    """
+    import onnxruntime
+    from tokenizers import Tokenizer
+
+    model_dir = os.path.dirname(os.path.abspath(model_path))
+    candidates = [os.path.join(model_dir, "tokenizer.json"), os.path.join(os.path.dirname(model_dir), "tokenizer.json")]
+    tokenizer_path = next((path for path in candidates if os.path.exists(path)), None)
+    if tokenizer_path is None:
+        raise FileNotFoundError(f"No tokenizer.json next to {model_path}")
+    tokenizer = Tokenizer.from_file(tokenizer_path)
+    tokenizer.enable_truncation(max_length=max_length)
+    tokenizer.enable_padding()
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+    input_names = {model_input.name for model_input in session.get_inputs()}
+
+    def encode(texts: List[str]) -> np.ndarray:
+        encodings = tokenizer.encode_batch(texts)
+        feed = {
+            "input_ids": np.array([e.ids for e in encodings], dtype='int64'),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype='int64'),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype='int64'),
+        }
+        hidden = session.run(None, {name: value for name, value in feed.items() if name in input_names})[0]
+        return mean_pool(hidden, feed["attention_mask"])
+
+    return encode
+
+
+def onnx_model_path(model_name: str = 'all-MiniLM-L6-v2') -> str:
+    return os.getenv("EMBED_ONNX_MODEL", os.path.join("data", "models", model_name, "onnx", "model_int8.onnx"))
+
+
+def load_encoder(model_name: str = 'all-MiniLM-L6-v2') -> EncodeFn:
+    """Encode function for the configured EMBED_BACKEND: "torch" (SentenceTransformer) or "onnx"."""
+    backend = os.getenv("EMBED_BACKEND", "torch").lower()
+    if backend == "onnx":
+        model_path = onnx_model_path(model_name)
+        logger.info(f"Using ONNX embedding model {model_path}")
+        return load_onnx_encoder(model_path, threads=int(os.getenv("EMBED_ONNX_THREADS", "0")))
+    if backend != "torch":
+        raise ValueError(f"Unknown EMBED_BACKEND {backend!r}; expected torch or onnx")
+    return load_sentence_transformer(model_name)
+
+
+def encoder_name(model_name: str = 'all-MiniLM-L6-v2') -> str:
+    """Model identity for embedding cache keys; ONNX variants produce slightly different vectors."""
+    if os.getenv("EMBED_BACKEND", "torch").lower() == "onnx":
+        return f"{model_name}:onnx:{os.path.splitext(os.path.basename(onnx_model_path(model_name)))[0]}"
+    return model_name
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embedding requests into batched model calls.
+
+    Callers enqueue texts and get a future. A single worker thread takes the
+    first waiting request, collects more for up to `max_wait_ms` (or until
+    `max_batch_size` texts), encodes them in one forward pass and resolves
+    each caller's future with its rows. The event loop never runs the model.
+    """
+
+    def __init__(self, encode: EncodeFn, max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 name: str = "embedding-batcher"):
+        self.encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._latencies: deque = deque(maxlen=1000)
+        self._requests = 0
+        self._texts = 0
+        self._batches = 0
+        self._encode_seconds = 0.0
+        self._stats_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, texts: List[str]) -> "Future[np.ndarray]":
+        """Queue texts for embedding; the future resolves to a (len(texts), dim) array."""
+        future: "Future[np.ndarray]" = Future()
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype='float32'))
+            return future
+        self._queue.put((list(texts), future, time.perf_counter()))
+        return future
+
+    async def embed_many(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(texts))
+
+    async def embed(self, text: str) -> np.ndarray:
+        return (await self.embed_many([text]))[0]
+
+    def _collect(self, first) -> list:
+        """Gather requests for one batch, waiting at most max_wait after the first."""
+        requests = [first]
+        size = len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # keep the stop signal for the run loop
+                break
+            requests.append(item)
+            size += len(item[0])
+        return requests
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            requests = self._collect(first)
+            texts = [text for request_texts, _, _ in requests for text in request_texts]
+            start = time.perf_counter()
+            try:
+                vectors = np.asarray(self.encode(texts), dtype='float32')
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(texts)} failed: {e}")
+                for _, future, _ in requests:
+                    future.set_exception(e)
+                continue
+            done = time.perf_counter()
+
+            offset = 0
+            for request_texts, future, enqueued in requests:
+                future.set_result(vectors[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+            with self._stats_lock:
+                self._batches += 1
+                self._requests += len(requests)
+                self._texts += len(texts)
+                self._encode_seconds += done - start
+                self._latencies.extend(done - enqueued for _, _, enqueued in requests)
+
+    def stats(self) -> Dict[str, float]:
+        """Throughput and latency counters (latency percentiles over the last 1000 requests)."""
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "requests": self._requests,
+                "texts": self._texts,
+                "batches": self._batches,
+                "avg_batch_size": round(self._texts / self._batches, 2) if self._batches else 0.0,
+                "texts_per_encode_second": round(self._texts / self._encode_seconds, 1) if self._encode_seconds else 0.0,
+                "queue_depth": self._queue.qsize(),
+            }
+        if latencies:
+            stats["latency_p50_ms"] = round(latencies[len(latencies) // 2] * 1000, 2)
+            stats["latency_p99_ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2)
+        return stats
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Finish queued requests and stop the worker."""
+        self._queue.put(None)
+        self._worker.join(timeout)
@@ -0,0 +1,40 @@
+import asyncio
+import functools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedIOExecutor:
+    """Runs blocking file/database calls on a dedicated thread pool.
+
+    At most `max_pending` calls may be queued or running at once; further callers
+    wait asynchronously for a slot, so a slow disk applies backpressure instead of
+    growing an unbounded backlog or blocking the event loop.
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 64, name: str = "io"):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        # asyncio primitives are bound to one event loop, so keep a semaphore per loop
+        self._slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+    def _semaphore(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        semaphore = self._slots.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_pending)
+            self._slots[loop] = semaphore
+        return semaphore
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` on the I/O pool and await its result."""
+        loop = asyncio.get_running_loop()
+        async with self._semaphore(loop):
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,113 @@
+import re
+import math
+import heapq
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Words, numbers and codes; internal dots, hyphens and slashes are kept so that
+# ICD codes (E11.9), lab names (HbA1c) and doses (5/325) stay single tokens
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[./-][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class LexicalIndex:
+    """Incremental BM25 inverted index over case text.
+
+    Postings map each term to {case_id: term frequency}; adding a case that is
+    already indexed replaces its text. Scoring only touches the postings of the
+    query terms, so exact clinical tokens (drug names, ICD codes, lab names) that
+    embeddings blur are matched directly. `stopwords` are dropped from both case
+    text and queries (e.g. template labels that every case contains).
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, stopwords: Iterable[str] = ()):
+        self.k1 = k1
+        self.b = b
+        self.stopwords = frozenset(stopwords)
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def __contains__(self, case_id: str) -> bool:
+        return case_id in self._lengths
+
+    def _terms(self, text: str) -> List[str]:
+        return [token for token in tokenize(text) if token not in self.stopwords]
+
+    def add(self, case_id: str, text: str) -> None:
+        tokens = self._terms(text)
+        counts = Counter(tokens)
+        with self._lock:
+            self.remove(case_id)
+            for term, count in counts.items():
+                self._postings.setdefault(term, {})[case_id] = count
+            self._doc_terms[case_id] = tuple(counts)
+            self._lengths[case_id] = len(tokens)
+            self._total_length += len(tokens)
+
+    def remove(self, case_id: str) -> bool:
+        with self._lock:
+            if case_id not in self._lengths:
+                return False
+            for term in self._doc_terms.pop(case_id):
+                postings = self._postings[term]
+                del postings[case_id]
+                if not postings:
+                    del self._postings[term]
+            self._total_length -= self._lengths.pop(case_id)
+            return True
+
+    def search(self, query: str, k: int,
+               accept: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """Top-k (case_id, BM25 score) pairs for cases sharing a term with the query.
+
+        `accept`, if given, is checked per candidate case while scoring.
+        """
+        terms = set(self._terms(query))
+        with self._lock:
+            n = len(self._lengths)
+            if not n or not terms:
+                return []
+            average_length = self._total_length / n or 1.0
+            scores: Dict[str, float] = {}
+            rejected = set()
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for case_id, tf in postings.items():
+                    if case_id in rejected:
+                        continue
+                    if accept is not None and case_id not in scores and not accept(case_id):
+                        rejected.add(case_id)
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[case_id] / average_length)
+                    scores[case_id] = scores.get(case_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "documents": len(self._lengths),
+                "terms": len(self._postings),
+                "avg_document_length": round(self._total_length / len(self._lengths), 1) if self._lengths else 0.0
+            }
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked ID lists: each ID scores sum(1 / (k + rank)), best first."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, case_id in enumerate(ranking, start=1):
+            scores[case_id] = scores.get(case_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
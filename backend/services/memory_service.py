@@ -1,37 +1,449 @@
-import faiss
-from sentence_transformers import SentenceTransformer
+import os
+import time
+import asyncio
+import threading
+from collections import deque
 import numpy as np
-from typing import Any, Dict, Optional, List
+from typing import Any, Dict, Optional, List, Tuple
 from models.symptom_models import PatientHistory, ImageAnalysisResult, MedicalCase
+from services.memory_snapshot import MemorySnapshotStore
+from services.memory_sync import WriteInbox, acquire_role
+from services.case_record import CaseRecord
+from services.vector_index import CaseIndex, IndexConfig
+from services.embedding_service import EmbeddingBatcher, EncodeFn, encoder_name, load_encoder
+from services.embedding_cache import EmbeddingCache, normalize_text
+from services.search_cache import SearchResultCache
+from services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from services.text_chunker import ChunkingConfig
 import logging
 
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+# Field labels _history_to_text writes into every case; not indexed for BM25, where they would match any case
+HISTORY_LABELS = ("conditions", "medications", "allergies", "surgeries", "notes")
+
 class MedicalMemoryService:
     """Service for storing and retrieving patient medical memory (history, images, etc.) with FAISS vector search."""
 
-    def __init__(self):
+    def __init__(self, data_dir: str = os.path.join("data", "memory"), snapshot_interval: Optional[float] = None,
+                 encode: Optional[EncodeFn] = None):
         # In-memory storage for patient histories and image analyses
         self._patient_histories: Dict[str, PatientHistory] = {}
         self._image_analyses: Dict[str, list] = {}
-        self._medical_cases: Dict[str, MedicalCase] = {}
+        # Compact case metadata; the vectors live only in the index
+        self._medical_cases: Dict[str, CaseRecord] = {}
+        self.logger = logging.getLogger("services.memory_service")
+
+        # With several worker processes, the one holding the writer lock owns all index mutations
+        # and publishes them as small deltas plus periodic snapshots; the others are readers that
+        # map the latest snapshot read-only, replay deltas on top of it and hand their writes to
+        # the writer's inbox
+        self.snapshots = MemorySnapshotStore(data_dir)
+        self.role, self._writer_lock = acquire_role(data_dir, os.getenv("MEMORY_ROLE", "auto").lower())
+        self.inbox = WriteInbox(data_dir)
+        self._generation = 0
+        self._delta_sequence = 0
+        # Writer: cases and histories changed since the last published delta or snapshot
+        self._unpublished_cases: set = set()
+        self._unpublished_histories: set = set()
+        self.delta_max_cases = int(os.getenv("MEMORY_DELTA_MAX_CASES", "1000"))
+        self._publish_lock = threading.RLock()
+        # Reader: cases from deltas (in a small heap index) and the snapshot cases they supersede
+        self._overlay: Optional[CaseIndex] = None
+        self._masked: set = set()
+        # Writer: the approximate tier in the latest snapshot and its generation, linked while unchanged
+        self._saved_ann: Tuple[Any, int] = (None, 0)
 
         # FAISS index and embedding model
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Concurrent requests are coalesced into batched forward passes off the event loop
+        self.embedding_model_name = 'all-MiniLM-L6-v2'
+        self.embedder = EmbeddingBatcher(
+            encode or load_encoder(self.embedding_model_name),
+            max_batch_size=int(os.getenv("EMBED_BATCH_SIZE", "32")),
+            max_wait_ms=float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+        )
         self.faiss_dim = 384  # Dimension for 'all-MiniLM-L6-v2'
-        self.faiss_index = faiss.IndexFlatL2(self.faiss_dim)
-        self.case_id_to_index: Dict[int, str] = {}  # Map FAISS index to case_id
-        self._faiss_next_idx = 0
-        self.logger = logging.getLogger("services.memory_service")
+        # Repeated queries and re-uploaded histories skip the model entirely
+        self.embedding_cache = EmbeddingCache.from_env(encoder_name(self.embedding_model_name), self.faiss_dim,
+                                                       disk=self.role == "writer")
+        # Keyed by stable case IDs, so re-uploads replace a case's vector instead of duplicating it,
+        # and promoted from exact search to HNSW/IVF-PQ when configured and large enough
+        self.index_config = IndexConfig.from_env()
+        self.case_index = CaseIndex(self.faiss_dim, config=self.index_config)
+        # Long histories and document text are indexed as overlapping chunks of the same case
+        self.chunking = ChunkingConfig.from_env()
+        # Cases below this cosine similarity are not returned unless a caller overrides it
+        self.min_score = float(os.getenv("MEMORY_MIN_SIMILARITY", "0.3"))
+        # BM25 over case text catches exact clinical tokens; fused with the vector ranking in hybrid mode
+        self.lexical_index = LexicalIndex(stopwords=HISTORY_LABELS)
+        self.search_mode = os.getenv("MEMORY_SEARCH_MODE", "hybrid").lower()
+        self._search_latencies = {mode: deque(maxlen=1000) for mode in SEARCH_MODES}
+        self._search_counts = dict.fromkeys(SEARCH_MODES, 0)
+        self.search_cache = SearchResultCache.from_env()
+
+        # Snapshots of the index and case metadata survive restarts
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._load_snapshot()
+
+        if snapshot_interval is None:
+            snapshot_interval = float(os.getenv("MEMORY_SNAPSHOT_INTERVAL", "60"))
+        self.snapshot_interval = snapshot_interval
+        self.sync_interval = float(os.getenv("MEMORY_SYNC_INTERVAL", "2"))
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._sync_loop, name="memory-sync", daemon=True)]
+        if self.role == "writer":
+            self._threads.append(threading.Thread(target=self._snapshot_loop, name="memory-snapshot", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        self.logger.info(f"Memory service running as {self.role} (pid {os.getpid()})")
+
+    def _read_snapshot(self) -> Optional[tuple]:
+        """(generation, index, case records, lexical index, histories) from the latest snapshot, or None.
+
+        Readers never write to the index, so they memory-map its vectors and its
+        approximate tier (built by the writer) and share the pages with the other
+        processes; the writer reads its copy onto the heap. The BM25 index and the
+        filter tags are rebuilt from the case metadata on every load, in each process.
+        """
+        mmap = self.role == "reader" and os.getenv("MEMORY_INDEX_MMAP", "1") != "0"
+        snapshot = self.snapshots.load(mmap=mmap)
+        if snapshot is None:
+            return None
+        index, metadata = snapshot
+        if index.d != self.faiss_dim or index.ntotal != metadata.get("ntotal"):
+            self.logger.error("Memory snapshot does not match the embedding model; starting empty")
+            return None
+        ann = self.snapshots.load_ann(metadata["generation"], mmap=mmap) if metadata.get("ann") else None
+        try:
+            case_index = CaseIndex.from_snapshot(self.faiss_dim, index, metadata, config=self.index_config,
+                                                 read_only=mmap, ann=ann)
+        except ValueError as e:
+            self.logger.error(f"Cannot load memory snapshot: {e}; starting empty")
+            return None
+        # Embeddings are not duplicated in the metadata file; the vectors live in the index
+        cases = {case_id: CaseRecord.from_dict(case) for case_id, case in metadata["cases"].items()}
+        lexical_index = LexicalIndex(stopwords=HISTORY_LABELS)
+        for case_id, record in cases.items():
+            case_index.tag(case_id, record.filter_attributes())
+            lexical_index.add(case_id, record.symptoms)
+        histories = {
+            patient_id: PatientHistory(**history) for patient_id, history in metadata["patient_histories"].items()
+        }
+        return metadata.get("generation", 0), case_index, cases, lexical_index, histories
+
+    def _load_snapshot(self) -> bool:
+        """Swap in the latest snapshot (built outside the lock, so searches continue meanwhile) and replay its deltas."""
+        state = self._read_snapshot()
+        if state is not None:
+            generation, case_index, cases, lexical_index, histories = state
+            with self._lock:
+                # Keep the epoch increasing so results cached against the old index go stale
+                case_index.epoch += self._index_epoch() + 1
+                self.case_index, self._medical_cases, self.lexical_index = case_index, cases, lexical_index
+                self._patient_histories = histories
+                self._generation = generation
+                self._delta_sequence = 0
+                self._overlay, self._masked = None, set()
+                ann = case_index.ann_snapshot()
+                self._saved_ann = (ann[0] if ann else None, generation)
+        return self._apply_deltas() or state is not None
+
+    def _apply_deltas(self) -> bool:
+        """Replay the deltas published on top of the loaded generation since the last one applied."""
+        try:
+            deltas = self.snapshots.load_deltas(self._generation, after=self._delta_sequence)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Could not read memory deltas of generation {self._generation}: {e}")
+            return False
+        for sequence, delta in deltas:
+            with self._lock:
+                self._apply_delta(delta)
+                self._delta_sequence = sequence
+        return bool(deltas)
+
+    def _apply_delta(self, delta: Dict[str, Any]) -> None:
+        """Apply one published delta; call with the lock held."""
+        for case_id, case in delta["cases"].items():
+            if case is None:
+                self._medical_cases.pop(case_id, None)
+                self.lexical_index.remove(case_id)
+                self._index_remove(case_id)
+                continue
+            record = CaseRecord.from_dict(case["record"])
+            self._medical_cases[case_id] = record
+            self.lexical_index.add(case_id, record.symptoms)
+            self._index_upsert(case_id, np.asarray(case["vectors"], dtype='float32'), record.filter_attributes())
+        for patient_id, history in delta["patient_histories"].items():
+            if history is None:
+                self._patient_histories.pop(patient_id, None)
+            else:
+                self._patient_histories[patient_id] = PatientHistory(**history)
+        # A writer replaying deltas after a restart folds them into its next snapshot
+        self._dirty = self._dirty or self.role == "writer"
+
+    def _index_upsert(self, case_id: str, vectors: np.ndarray, attributes: Dict[str, Optional[str]]) -> None:
+        """Index a case's chunk vectors; a read-only snapshot gets them through the overlay instead."""
+        if not self.case_index.read_only:
+            self.case_index.upsert([case_id] * len(vectors), vectors, attributes=[attributes] * len(vectors))
+            return
+        if self._overlay is None:
+            self._overlay = CaseIndex(self.faiss_dim)
+        self._overlay.upsert([case_id] * len(vectors), vectors, attributes=[attributes] * len(vectors))
+        self._mask(case_id)
+
+    def _index_remove(self, case_id: str) -> None:
+        if not self.case_index.read_only:
+            self.case_index.remove([case_id])
+            return
+        if self._overlay is not None:
+            self._overlay.remove([case_id])
+        self._mask(case_id)
+
+    def _mask(self, case_id: str) -> None:
+        """Hide a snapshot case's vectors from search (its current version, if any, is in the overlay)."""
+        if case_id in self.case_index:
+            self._masked.add(case_id)
+        self.case_index.epoch += 1
+
+    def _index_epoch(self) -> int:
+        return self.case_index.epoch + (self._overlay.epoch if self._overlay is not None else 0)
+
+    def _index_of(self, case_id: str) -> Optional[CaseIndex]:
+        """The index holding a case's current vectors: the reader's overlay or the snapshot."""
+        if self._overlay is not None and case_id in self._overlay:
+            return self._overlay
+        return None if case_id in self._masked else self.case_index
+
+    def _search_index(self, query_vec: np.ndarray, k: int, filters: Dict[str, str]) -> List[Tuple[str, float]]:
+        """Top-k (case_id, cosine similarity) over the snapshot and, in readers, the overlay."""
+        queries = np.array([query_vec]).astype('float32')
+        hits = self.case_index.search(queries, k + len(self._masked), filters=filters)[0]
+        if self._masked:
+            hits = [hit for hit in hits if hit[0] not in self._masked]
+        if self._overlay is not None and len(self._overlay):
+            hits = sorted(hits + self._overlay.search(queries, k, filters=filters)[0], key=lambda hit: -hit[1])
+        return hits[:k]
+
+    def reload(self) -> bool:
+        """Reader: load the writer's latest snapshot if its generation changed, else replay new deltas."""
+        if self.snapshots.current_generation() != self._generation:
+            return self._load_snapshot()
+        return self._apply_deltas()
+
+    def apply_inbox(self) -> int:
+        """Writer: apply writes forwarded by reader processes (published with the next delta, see publish)."""
+        applied = 0
+        for path, operation in self.inbox.pending():
+            try:
+                if operation["op"] == "store_patient_history":
+                    asyncio.run(self.store_patient_history(operation["patient_id"], operation["medical_data"]))
+                elif operation["op"] == "remove_patient_history":
+                    asyncio.run(self.remove_patient_history(operation["patient_id"]))
+                else:
+                    raise ValueError(f"unknown operation {operation['op']!r}")
+            except Exception as e:
+                self.logger.error(f"Failed to apply forwarded memory write {os.path.basename(path)}: {e}")
+                self.inbox.set_aside(path)
+                continue
+            self.inbox.done(path)
+            applied += 1
+        return applied
+
+    def publish(self) -> bool:
+        """Writer: publish the changes since the last delta or snapshot as a delta for the readers.
+
+        Runs every MEMORY_SYNC_INTERVAL for forwarded and own writes alike. Batches of
+        more than MEMORY_DELTA_MAX_CASES cases (e.g. a bulk load) wait for the next
+        snapshot instead.
+        """
+        with self._publish_lock:
+            with self._lock:
+                cases, histories = self._unpublished_cases, self._unpublished_histories
+                if (not cases and not histories) or len(cases) > self.delta_max_cases:
+                    return False
+                delta = {
+                    "cases": {case_id: self._case_delta(case_id) for case_id in cases},
+                    "patient_histories": {patient_id: self._history_delta(patient_id) for patient_id in histories},
+                }
+                self._unpublished_cases, self._unpublished_histories = set(), set()
+            sequence = self._delta_sequence + 1
+            try:
+                self.snapshots.save_delta(self._generation, sequence, delta)
+            except Exception as e:
+                self.logger.error(f"Error writing memory delta: {e}")
+                with self._lock:
+                    self._unpublished_cases |= cases
+                    self._unpublished_histories |= histories
+                return False
+            self._delta_sequence = sequence
+        return True
+
+    def _case_delta(self, case_id: str) -> Optional[Dict[str, Any]]:
+        """A case's record and chunk vectors for a delta, or None if it was removed; call with the lock held."""
+        record = self._medical_cases.get(case_id)
+        vectors = self.case_index.vectors(case_id)
+        if record is None or vectors is None:
+            return None
+        return {"record": record.to_dict(), "vectors": vectors.tolist()}
+
+    def _history_delta(self, patient_id: str) -> Optional[Dict[str, Any]]:
+        history = self._patient_histories.get(patient_id)
+        return history.dict() if history is not None else None
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.sync_interval):
+            try:
+                if self.role == "writer":
+                    self.apply_inbox()
+                    self.publish()
+                else:
+                    self.reload()
+            except Exception as e:
+                self.logger.error(f"Memory sync failed: {e}")
+
+    def _require_writer(self, operation: str):
+        if self.role != "writer":
+            raise RuntimeError(f"{operation} must run in the memory writer process")
+
+    def save_snapshot(self) -> None:
+        """Write the index and case metadata to disk if anything changed since the last snapshot.
+
+        The snapshot includes every published delta and unpublished change, and readers
+        reload it in full, so it runs every MEMORY_SNAPSHOT_INTERVAL rather than per write.
+        """
+        with self._publish_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                # Copy under the lock (a fast memcpy); the slow disk write happens outside it
+                index_bytes, vector_ids = self.case_index.serialize()
+                ann = self.case_index.ann_snapshot()
+                metadata = {
+                    "ntotal": self.case_index.ntotal,
+                    "vector_ids": vector_ids,
+                    "metric": self.case_index.metric,
+                    "ann": ann[1] if ann else None,
+                    "cases": {case_id: case.to_dict() for case_id, case in self._medical_cases.items()},
+                    "patient_histories": {pid: history.dict() for pid, history in self._patient_histories.items()},
+                }
+                cases, histories = self._unpublished_cases, self._unpublished_histories
+                self._unpublished_cases, self._unpublished_histories = set(), set()
+                self._dirty = False
+            # The tier is immutable, so it is serialized outside the lock, and only once per build
+            tier = ann[0] if ann else None
+            saved_tier, saved_generation = self._saved_ann
+            try:
+                if tier is not None and tier is saved_tier:
+                    generation = self.snapshots.save(index_bytes, metadata, ann_from=saved_generation)
+                else:
+                    tier_files = tier.serialize() if tier is not None else None
+                    generation = self.snapshots.save(index_bytes, metadata, ann=tier_files)
+            except Exception as e:
+                self.logger.error(f"Error writing memory snapshot: {e}")
+                with self._lock:
+                    self._dirty = True
+                    self._unpublished_cases |= cases
+                    self._unpublished_histories |= histories
+                self._saved_ann = (None, 0)
+                return
+            self._generation = generation
+            self._delta_sequence = 0
+            self._saved_ann = (tier, generation)
+        self.logger.info(f"Wrote memory snapshot {generation} ({metadata['ntotal']} vectors)")
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(self.snapshot_interval):
+            self.save_snapshot()
+            self.embedding_cache.flush()
+
+    def close(self) -> None:
+        """Stop background threads; the writer writes a final snapshot.
+
+        Forwarded writes still in the inbox stay there for the next writer.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        if self.role == "writer":
+            self.save_snapshot()
+            self._writer_lock.release()
+        self.embedder.close()
+        self.embedding_cache.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Index size and embedding throughput/latency counters."""
+        return {
+            "role": self.role,
+            "generation": self._generation,
+            "delta_sequence": self._delta_sequence,
+            "pending_writes": len(self.inbox) if self.role == "writer" else None,
+            "overlay_cases": len(self._overlay) if self._overlay is not None else 0,
+            "cases": len(self._medical_cases),
+            "index": self.case_index.stats(),
+            "embeddings": self.embedder.stats(),
+            "embedding_cache": self.embedding_cache.stats(),
+            "lexical_index": self.lexical_index.stats(),
+            "search": self.search_stats(),
+            "search_cache": self.search_cache.stats()
+        }
+
+    def search_stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-mode search counts and latency percentiles (over the last 1000 searches of each mode)."""
+        stats = {}
+        with self._lock:
+            for mode in SEARCH_MODES:
+                latencies = sorted(self._search_latencies[mode])
+                stats[mode] = {"searches": self._search_counts[mode]}
+                if latencies:
+                    stats[mode]["latency_p50_ms"] = round(latencies[len(latencies) // 2] * 1000, 2)
+                    stats[mode]["latency_p99_ms"] = round(
+                        latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2)
+        return stats
 
     async def store_patient_history(self, patient_id: str, medical_data: Any) -> None:
         """Store patient history (PDF-extracted or structured data) and add to FAISS."""
+        if self.role != "writer":
+            data = medical_data.dict() if isinstance(medical_data, PatientHistory) else dict(medical_data)
+            self.inbox.submit({"op": "store_patient_history", "patient_id": patient_id, "medical_data": data})
+            return
         # Convert to PatientHistory if needed
+        full_text = ""
         if not isinstance(medical_data, PatientHistory):
             # Minimal conversion; expand as needed
+            full_text = medical_data.get("full_text") or ""
             medical_data = PatientHistory(patient_id=patient_id, **medical_data)
-        self._patient_histories[patient_id] = medical_data
+        with self._lock:
+            self._patient_histories[patient_id] = medical_data
+            self._unpublished_histories.add(patient_id)
+            self._dirty = True
         self.logger.info(f"[store_patient_history] Parsed PatientHistory for {patient_id}: {medical_data}")
         # Store as a medical case for vector search
-        await self.store_medical_case_from_history(medical_data)
+        await self.store_medical_case_from_history(medical_data, full_text=full_text)
+
+    async def remove_patient_history(self, patient_id: str) -> bool:
+        """Forget a patient's history and remove its case from the index."""
+        if self.role != "writer":
+            self.inbox.submit({"op": "remove_patient_history", "patient_id": patient_id})
+            return False
+        with self._lock:
+            self._patient_histories.pop(patient_id, None)
+            self._unpublished_histories.add(patient_id)
+            self._dirty = True
+            removed = self.remove_case(f"case_{patient_id}")
+        self.logger.info(f"[remove_patient_history] FAISS index size: {self.case_index.ntotal}")
+        return removed
+
+    def remove_case(self, case_id: str) -> bool:
+        """Remove a medical case and its vector."""
+        self._require_writer("remove_case")
+        with self._lock:
+            self._medical_cases.pop(case_id, None)
+            self.lexical_index.remove(case_id)
+            removed = self.case_index.remove([case_id]) > 0
+            if removed:
+                self._unpublished_cases.add(case_id)
+                self._dirty = True
+        return removed
 
     async def get_patient_history(self, patient_id: str) -> Optional[PatientHistory]:
         """Retrieve patient history by ID"""
@@ -45,27 +457,51 @@ class MedicalMemoryService:
         """Retrieve all image analyses for a patient"""
         return self._image_analyses.get(patient_id, [])
 
-    async def store_medical_case_from_history(self, history: PatientHistory) -> None:
-        """Store a medical case from patient history and add to FAISS."""
+    async def store_medical_case_from_history(self, history: PatientHistory, full_text: str = "") -> None:
+        """Store a medical case from patient history and add to FAISS.
+
+        The history summary and the document's full text are split into overlapping
+        chunks, embedded in one batch and indexed as vectors of the same case.
+        """
+        self._require_writer("store_medical_case_from_history")
         case_id = f"case_{history.patient_id}"
         case_text = self._history_to_text(history)
-        embedding = self._embed_text(case_text)
-        # Add to FAISS
-        self.faiss_index.add(np.array([embedding]).astype('float32'))
-        self.case_id_to_index[self._faiss_next_idx] = case_id
-        self._faiss_next_idx += 1
-        # Store case
-        self._medical_cases[case_id] = MedicalCase(
+        chunks = self.chunking.split(case_text, full_text)
+        embeddings = await self._embed_texts(chunks)
+        record = CaseRecord(
             case_id=case_id,
             symptoms=case_text,
-            diagnosis="",
-            treatment="",
-            outcome="",
             category="patient_history",
-            embedding=embedding.tolist(),
             metadata={"patient_id": history.patient_id}
         )
-        self.logger.info(f"[store_medical_case_from_history] FAISS index size: {self.faiss_index.ntotal}")
+        with self._lock:
+            # Add to FAISS, replacing all of the case's previous chunks
+            self.case_index.upsert([case_id] * len(chunks), embeddings.astype('float32'),
+                                   attributes=[record.filter_attributes()] * len(chunks))
+            self.lexical_index.add(case_id, case_text)
+            # Store case
+            self._medical_cases[case_id] = record
+            self._unpublished_cases.add(case_id)
+            self._dirty = True
+        self.logger.info(f"[store_medical_case_from_history] Indexed {len(chunks)} chunks; "
+                         f"FAISS index size: {self.case_index.ntotal}")
+
+    def add_cases(self, records: List[CaseRecord], vectors: np.ndarray) -> None:
+        """Add pre-embedded cases in one index write (bulk ingest); existing case IDs are replaced."""
+        self._require_writer("add_cases")
+        # The last record wins if a case ID repeats (the index would treat repeats as chunks)
+        latest = {record.case_id: position for position, record in enumerate(records)}
+        if len(latest) < len(records):
+            records = [records[position] for position in latest.values()]
+            vectors = np.asarray(vectors)[list(latest.values())]
+        with self._lock:
+            self.case_index.upsert([record.case_id for record in records], np.asarray(vectors, dtype='float32'),
+                                   attributes=[record.filter_attributes() for record in records])
+            for record in records:
+                self._medical_cases[record.case_id] = record
+                self.lexical_index.add(record.case_id, record.symptoms)
+            self._unpublished_cases.update(record.case_id for record in records)
+            self._dirty = True
 
     def _history_to_text(self, history: PatientHistory) -> str:
         """Convert patient history to a text string for embedding."""
@@ -78,24 +514,117 @@ class MedicalMemoryService:
         ]
         return " | ".join(parts)
 
-    def _embed_text(self, text: str) -> np.ndarray:
+    async def _embed_text(self, text: str) -> np.ndarray:
         """Generate an embedding for the given text."""
-        return self.embedding_model.encode([text])[0]
+        return (await self._embed_texts([text]))[0]
+
+    async def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        """Embed texts, serving cached ones without the model and batching the rest with concurrent requests."""
+        vectors = [self.embedding_cache.get(text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = await self.embedder.embed_many([texts[i] for i in missing])
+            for i, vector in zip(missing, computed):
+                self.embedding_cache.put(texts[i], vector)
+                vectors[i] = vector
+        return np.vstack(vectors)
+
+    async def search_similar_cases(self, query: str, top_k: int = 3, min_score: Optional[float] = None,
+                                   include_embeddings: bool = False, patient_id: Optional[str] = None,
+                                   category: Optional[str] = None, mode: Optional[str] = None) -> List[MedicalCase]:
+        """Search for similar medical cases.
 
-    async def search_similar_cases(self, query: str, top_k: int = 3) -> List[MedicalCase]:
-        """Search for similar medical cases using FAISS."""
-        self.logger.info(f"[search_similar_cases] Query: {query}")
-        if self.faiss_index.ntotal == 0:
+        `mode` (default MEMORY_SEARCH_MODE) is "vector" (FAISS cosine similarity),
+        "lexical" (BM25 over case text) or "hybrid" (both rankings fused with
+        reciprocal rank fusion). Vector and hybrid results carry their cosine
+        similarity in `similarity_score` (a chunked case scores its best chunk).
+        Vector hits below `min_score` (default MEMORY_MIN_SIMILARITY) are dropped;
+        in hybrid mode every BM25 match is still fused in, whatever its cosine
+        similarity. Lexical and hybrid results carry
+        the BM25 or fused score in `retrieval_score`. Embeddings (normalized, read
+        back from the index) are only included when requested; for a chunked case
+        this is the vector of its first chunk, the history summary. `patient_id` and
+        `category` restrict the search to matching cases.
+        """
+        mode = (mode or self.search_mode).lower()
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}; expected one of {', '.join(SEARCH_MODES)}")
+        if min_score is None:
+            min_score = self.min_score
+        self.logger.info(f"[search_similar_cases] Query: {query} ({mode})")
+        if not self._medical_cases:
             self.logger.info("[search_similar_cases] FAISS index is empty.")
             return []
-        query_vec = self._embed_text(query)
-        D, I = self.faiss_index.search(np.array([query_vec]).astype('float32'), top_k)
-        results = []
-        for idx in I[0]:
-            if idx in self.case_id_to_index:
-                case_id = self.case_id_to_index[idx]
-                case = self._medical_cases.get(case_id)
-                if case:
-                    results.append(case)
+        start = time.perf_counter()
+        # Repeated queries are answered from the cache until the corpus changes
+        cache_key = (normalize_text(query), top_k, min_score, mode, patient_id, category)
+        ranked = self.search_cache.get(cache_key, self._index_epoch())
+        if ranked is None:
+            query_vec = await self._embed_text(query) if mode != "lexical" else None
+            with self._lock:
+                epoch = self._index_epoch()
+                ranked = self._rank_cases(query, query_vec, top_k, min_score, mode, patient_id, category)
+            self.search_cache.put(cache_key, epoch, ranked)
+        with self._lock:
+            results = [
+                self._medical_cases[case_id].to_model(
+                    similarity_score=similarity,
+                    retrieval_score=retrieval_score,
+                    embedding=self._case_embedding(case_id) if include_embeddings else None
+                )
+                for case_id, similarity, retrieval_score in ranked
+                if case_id in self._medical_cases
+            ]
+            self._search_counts[mode] += 1
+            self._search_latencies[mode].append(time.perf_counter() - start)
         self.logger.info(f"[search_similar_cases] Results found: {len(results)}")
-        return results 
\ No newline at end of file
+        return results
+
+    def _case_embedding(self, case_id: str) -> Optional[List[float]]:
+        index = self._index_of(case_id)
+        vector = index.vector(case_id) if index is not None else None
+        return vector.tolist() if vector is not None else None
+
+    def _rank_cases(self, query: str, query_vec: Optional[np.ndarray], top_k: int, min_score: float, mode: str,
+                    patient_id: Optional[str], category: Optional[str]) -> List[Tuple[str, Optional[float], Optional[float]]]:
+        """(case_id, cosine similarity, BM25/fused score) for the top cases; call with the lock held."""
+        filters = {field: value for field, value in (("patient_id", patient_id), ("category", category))
+                   if value is not None}
+        # Each ranking goes deeper than top_k so fusion can promote cases only one of them found
+        depth = top_k if mode != "hybrid" else max(4 * top_k, 20)
+        vector_scores, vector_hits, lexical_hits = {}, [], {}
+        if query_vec is not None:
+            hits = self._search_index(query_vec, depth, filters)
+            vector_scores = dict(hits)
+            vector_hits = [case_id for case_id, score in hits if score >= min_score]
+        if mode != "vector":
+            accept = None
+            if filters:
+                def accept(case_id):
+                    record = self._medical_cases.get(case_id)
+                    attributes = record.filter_attributes() if record is not None else {}
+                    return all(attributes.get(field) == value for field, value in filters.items())
+            lexical_hits = dict(self.lexical_index.search(query, depth, accept=accept))
+
+        if mode == "hybrid":
+            candidates = reciprocal_rank_fusion([vector_hits, list(lexical_hits)])
+        elif mode == "vector":
+            candidates = [(case_id, vector_scores[case_id]) for case_id in vector_hits]
+        else:
+            candidates = list(lexical_hits.items())
+        results = []
+        for case_id, score in candidates:
+            similarity = vector_scores.get(case_id)
+            if mode == "hybrid" and similarity is None:
+                # Reported for cases only BM25 found; exact-token matches (drug names, ICD codes)
+                # often embed far from the query, so min_score only gates the vector ranking
+                index = self._index_of(case_id)
+                similarity = index.similarity(case_id, query_vec) if index is not None else None
+            results.append((
+                case_id,
+                round(similarity, 4) if similarity is not None else None,
+                round(score, 4) if mode != "vector" else None
+            ))
+            if len(results) == top_k:
+                break
+        return results
@@ -0,0 +1,185 @@
+import io
+import os
+import re
+import json
+import shutil
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+KEEP_GENERATIONS = 2
+
+
+class MemorySnapshotStore:
+    """Versioned on-disk snapshots of the case index and its metadata.
+
+    Each snapshot is a pair of files, `cases-<generation>.index` (faiss.write_index
+    format) and `cases-<generation>.json` (case metadata without embeddings). The
+    `CURRENT` file names the latest generation and is replaced atomically, so a
+    crash mid-write leaves the previous snapshot in place.
+
+    A snapshot may also carry the approximate (HNSW/IVF-PQ) tier of the index as
+    `cases-<generation>.ann.index` plus `cases-<generation>.ann.npy` (row -> vector
+    ID). The tier only changes when it is rebuilt, so later generations hard-link
+    the same files instead of writing them again.
+
+    Between snapshots, small changes are published as numbered delta files,
+    `cases-<generation>.delta-<sequence>.json`, each holding the cases and
+    histories written since the previous delta of that generation. The next
+    snapshot includes them, so deltas only ever need replaying on top of the
+    generation they name.
+    """
+
+    def __init__(self, directory: str = "data/memory"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, generation: int) -> Tuple[str, str]:
+        base = os.path.join(self.directory, f"cases-{generation:08d}")
+        return base + ".index", base + ".json"
+
+    def _ann_paths(self, generation: int) -> Tuple[str, str]:
+        base = os.path.join(self.directory, f"cases-{generation:08d}.ann")
+        return base + ".index", base + ".npy"
+
+    def current_generation(self) -> int:
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE), 'r') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return 0
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def save(self, index_bytes: np.ndarray, metadata: Dict[str, Any],
+             ann: Optional[Tuple[np.ndarray, np.ndarray]] = None, ann_from: int = 0) -> int:
+        """Write a serialized index (faiss.serialize_index) and its metadata as the next generation.
+
+        `ann` is an approximate tier to save with it (serialized index, row -> vector ID
+        array); `ann_from` instead links the tier of an earlier, still kept generation.
+        """
+        generation = self.current_generation() + 1
+        index_path, meta_path = self._paths(generation)
+        if ann is not None:
+            ann_bytes, ann_ids = ann
+            ids_file = io.BytesIO()
+            np.save(ids_file, np.asarray(ann_ids, dtype='int64'))
+            ann_index_path, ann_ids_path = self._ann_paths(generation)
+            self._write_atomic(ann_index_path, ann_bytes.tobytes())
+            self._write_atomic(ann_ids_path, ids_file.getvalue())
+        elif ann_from:
+            for source, target in zip(self._ann_paths(ann_from), self._ann_paths(generation)):
+                self._link(source, target)
+        self._write_atomic(index_path, index_bytes.tobytes())
+        self._write_atomic(meta_path, json.dumps({**metadata, "generation": generation}, default=str).encode('utf-8'))
+        self._write_atomic(os.path.join(self.directory, CURRENT_FILE), str(generation).encode('ascii'))
+        self._prune(generation)
+        return generation
+
+    @staticmethod
+    def _link(source: str, target: str):
+        """Hard-link an unchanged file into a new generation (copied where links are unsupported)."""
+        if os.path.exists(target):
+            os.remove(target)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+
+    def _delta_path(self, generation: int, sequence: int) -> str:
+        return os.path.join(self.directory, f"cases-{generation:08d}.delta-{sequence:06d}.json")
+
+    def _delta_sequences(self, generation: int) -> List[int]:
+        pattern = re.compile(rf"cases-{generation:08d}\.delta-(\d+)\.json$")
+        matches = (pattern.match(name) for name in os.listdir(self.directory))
+        return sorted(int(match.group(1)) for match in matches if match)
+
+    def save_delta(self, generation: int, sequence: int, delta: Dict[str, Any]) -> None:
+        """Publish the changes made since the previous delta on top of `generation`."""
+        self._write_atomic(self._delta_path(generation, sequence), json.dumps(delta, default=str).encode('utf-8'))
+
+    def load_deltas(self, generation: int, after: int = 0) -> List[Tuple[int, Dict[str, Any]]]:
+        """(sequence, delta) of `generation` published after sequence `after`, in order.
+
+        Raises FileNotFoundError if a delta disappeared mid-read (its generation was pruned).
+        """
+        deltas = []
+        for sequence in self._delta_sequences(generation):
+            if sequence > after:
+                with open(self._delta_path(generation, sequence), 'r') as f:
+                    deltas.append((sequence, json.load(f)))
+        return deltas
+
+    def _prune(self, generation: int):
+        """Remove generations older than the last KEEP_GENERATIONS (mapped files stay valid after unlink)."""
+        for old in range(generation - KEEP_GENERATIONS, -1, -1):
+            removed = False
+            paths = self._paths(old) + self._ann_paths(old)
+            for path in paths + tuple(self._delta_path(old, seq) for seq in self._delta_sequences(old)):
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed = True
+            if not removed and old:
+                break
+
+    def load(self, mmap: bool = True) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        """Load the latest snapshot, or None if there is none.
+
+        With `mmap`, the flat vector codes are mapped from the index file
+        (IO_FLAG_MMAP_IFC) instead of copied onto the heap, so processes loading the
+        same generation share its pages through the page cache. A mapped index is
+        read-only: adding or removing vectors aborts the process, so callers that
+        mutate the index must load it with `mmap=False`. FAISS versions without the
+        flag fall back to a normal read.
+        """
+        generation = self.current_generation()
+        if not generation:
+            return None
+        index_path, meta_path = self._paths(generation)
+        try:
+            with open(meta_path, 'r') as f:
+                metadata = json.load(f)
+            index = self._read_index(index_path, mmap)
+        except Exception as e:
+            logger.error(f"Error loading memory snapshot {generation}: {e}")
+            return None
+        logger.info(f"Loaded memory snapshot {generation} ({index.ntotal} vectors)")
+        return index, metadata
+
+    def load_ann(self, generation: int, mmap: bool = True) -> Optional[Tuple[Any, np.ndarray]]:
+        """The approximate tier saved with `generation` (index, row -> vector ID), or None.
+
+        With `mmap`, both the index (graph or inverted lists included) and the ID
+        array are mapped from disk and shared between processes, like `load`.
+        """
+        index_path, ids_path = self._ann_paths(generation)
+        if not os.path.exists(index_path):
+            return None
+        try:
+            index = self._read_index(index_path, mmap)
+            ids = np.load(ids_path, mmap_mode='r' if mmap else None)
+        except Exception as e:
+            logger.warning(f"Error loading the approximate index of memory snapshot {generation}: {e}")
+            return None
+        return index, ids
+
+    @staticmethod
+    def _read_index(path: str, mmap: bool) -> Any:
+        if mmap:
+            try:
+                return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC)
+            except (AttributeError, RuntimeError) as e:  # AttributeError: FAISS < 1.11
+                logger.warning(f"Memory-mapped load of {path} failed ({e}); reading into memory")
+        return faiss.read_index(path)
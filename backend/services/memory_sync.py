@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import itertools
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, every process is its own writer
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+WRITER_LOCK_FILE = "writer.lock"
+INBOX_DIR = "inbox"
+ROLES = ("auto", "writer", "reader")
+
+
+class WriterLock:
+    """Exclusive flock on `<directory>/writer.lock`, held for the life of the writer process.
+
+    The kernel drops the lock when the process exits, so a crashed writer never
+    leaves a stale lock behind; the next process to start takes over.
+    """
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, WRITER_LOCK_FILE)
+        self._fd: Optional[int] = None
+
+    def try_acquire(self) -> bool:
+        if fcntl is None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode('ascii'))
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+def acquire_role(directory: str, requested: str = "auto") -> Tuple[str, Optional[WriterLock]]:
+    """Resolve MEMORY_ROLE to "writer" (with the held lock) or "reader"."""
+    if requested not in ROLES:
+        raise ValueError(f"Unknown MEMORY_ROLE {requested!r}; expected one of {', '.join(ROLES)}")
+    if requested == "reader":
+        return "reader", None
+    lock = WriterLock(directory)
+    if lock.try_acquire():
+        return "writer", lock
+    if requested == "writer":
+        raise RuntimeError(f"Another process holds {lock.path}; only one memory writer may run")
+    return "reader", None
+
+
+class WriteInbox:
+    """Directory of pending memory writes, handed from reader processes to the writer.
+
+    Each write is one JSON file, created atomically; the writer applies them in
+    submission order and deletes each one once it has been applied.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = os.path.join(directory, INBOX_DIR)
+        os.makedirs(self.directory, exist_ok=True)
+        self._counter = itertools.count()
+
+    def submit(self, operation: Dict[str, Any]) -> None:
+        name = f"{time.time_ns():020d}-{os.getpid()}-{next(self._counter):06d}.json"
+        tmp_path = os.path.join(self.directory, f".{name}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(operation, f, default=str)
+        os.replace(tmp_path, os.path.join(self.directory, name))
+
+    def pending(self, limit: int = 100) -> List[Tuple[str, Dict[str, Any]]]:
+        """Oldest pending writes as (path, operation); unreadable files are set aside."""
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))[:limit]
+        operations = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'r') as f:
+                    operations.append((path, json.load(f)))
+            except (OSError, ValueError) as e:
+                logger.error(f"Unreadable memory write {name} ({e}); moving it aside")
+                self.set_aside(path)
+        return operations
+
+    def done(self, path: str) -> None:
+        os.remove(path)
+
+    def set_aside(self, path: str) -> None:
+        """Keep a write that could not be applied as `<name>.failed` for inspection."""
+        os.replace(path, path + ".failed")
+
+    def __len__(self) -> int:
+        return sum(1 for name in os.listdir(self.directory) if name.endswith(".json"))
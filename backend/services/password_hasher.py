@@ -0,0 +1,84 @@
+import os
+import hmac
+import hashlib
+from typing import Optional, Tuple
+import logging
+
+import bcrypt
+
+from services.io_executor import BoundedIOExecutor
+
+logger = logging.getLogger(__name__)
+
+# bcrypt only uses the first 72 bytes of a password
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
+
+def _is_legacy_hash(hashed: str) -> bool:
+    """Accounts created before bcrypt store an unsalted hex SHA-256 digest."""
+    return len(hashed) == 64 and all(c in "0123456789abcdef" for c in hashed)
+
+
+class PasswordHasher:
+    """Bcrypt password hashing on a bounded worker pool.
+
+    The KDF is deliberately slow (tens of milliseconds per call), so it runs on its
+    own threads and never on the event loop; bcrypt releases the GIL, so the pool
+    scales across cores. Legacy SHA-256 hashes still verify and are reported as
+    needing a rehash, so they are upgraded on the next successful login.
+    """
+
+    def __init__(self, rounds: int = 12, max_workers: int = 4, max_pending: int = 256):
+        self.rounds = rounds
+        self.pool = BoundedIOExecutor(max_workers=max_workers, max_pending=max_pending, name="password-hash")
+
+    @classmethod
+    def from_env(cls) -> "PasswordHasher":
+        return cls(
+            rounds=int(os.getenv("PASSWORD_HASH_ROUNDS", "12")),
+            max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))),
+        )
+
+    @staticmethod
+    def _encode(password: str) -> bytes:
+        return password.encode('utf-8')[:BCRYPT_MAX_PASSWORD_BYTES]
+
+    def _hash_sync(self, password: str) -> str:
+        return bcrypt.hashpw(self._encode(password), bcrypt.gensalt(self.rounds)).decode('ascii')
+
+    def _verify_sync(self, password: str, hashed: str) -> bool:
+        if _is_legacy_hash(hashed):
+            legacy = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(legacy, hashed)
+        try:
+            return bcrypt.checkpw(self._encode(password), hashed.encode('ascii'))
+        except ValueError:
+            logger.warning("Unrecognized password hash format")
+            return False
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True for legacy hashes and bcrypt hashes made with a different work factor."""
+        if _is_legacy_hash(hashed):
+            return True
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    async def hash(self, password: str) -> str:
+        """Hash a password with bcrypt on the worker pool."""
+        return await self.pool.run(self._hash_sync, password)
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password.
+
+        Returns (valid, new_hash); new_hash is set when the stored hash should be
+        replaced (legacy format or outdated work factor).
+        """
+        valid = await self.pool.run(self._verify_sync, password, hashed)
+        if valid and self.needs_rehash(hashed):
+            return True, await self.hash(password)
+        return valid, None
+
+    def shutdown(self) -> None:
+        self.pool.shutdown()
@@ -0,0 +1,85 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class SearchResultCache:
+    """LRU + TTL cache of similar-case search results, invalidated by an index epoch.
+
+    Each entry records the index epoch (see CaseIndex.epoch) it was computed at.
+    Any add or remove bumps the epoch, so entries from before the change are
+    treated as misses and dropped, and a cached ranking never outlives the corpus
+    it was computed on.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (epoch, stored_at, value)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._expired = 0
+        self._evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "SearchResultCache":
+        return cls(
+            max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "2048")),
+            ttl=float(os.getenv("SEARCH_CACHE_TTL", "300")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, key: Hashable, epoch: int) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            entry_epoch, stored_at, value = entry
+            if entry_epoch != epoch or time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                if entry_epoch != epoch:
+                    self._stale += 1
+                else:
+                    self._expired += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key: Hashable, epoch: int, value: Any) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (epoch, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "stale": self._stale,
+                "expired": self._expired,
+                "evictions": self._evictions,
+                "entries": len(self._entries)
+            }
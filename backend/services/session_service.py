@@ -0,0 +1,200 @@
+import os
+import time
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import logging
+
+from services.user_store import UserStore
+
+logger = logging.getLogger(__name__)
+
+
+def _token_hash(token: str) -> str:
+    """Only hashes of tokens are stored, so a leaked sessions file can't be replayed."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class SessionService:
+    """Session tokens served from an in-memory TTL + LRU cache over the user store.
+
+    New and revoked sessions are written through to the store (sessions.json or the
+    SQLite sessions table), so every worker process sees them. Cached tokens are
+    validated without disk access; unknown ones are looked up in the store once and
+    then cached. Expired sessions and failed writes are flushed behind by a
+    background thread. Beyond `max_sessions`, the least recently used session is
+    dropped from memory only.
+    """
+
+    def __init__(self, store: UserStore, ttl: float = 86400.0, max_sessions: int = 10000,
+                 flush_interval: float = 2.0):
+        self.store = store
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.flush_interval = flush_interval
+
+        self._sessions: "OrderedDict[str, dict]" = OrderedDict()  # token hash -> session, LRU order
+        self._dirty: Dict[str, dict] = {}
+        self._removed: set = set()
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+        self._load()
+
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="session-flusher", daemon=True)
+        self._flusher.start()
+
+    @classmethod
+    def from_env(cls, store: UserStore) -> "SessionService":
+        return cls(
+            store,
+            ttl=float(os.getenv("SESSION_TTL", "86400")),
+            max_sessions=int(os.getenv("SESSION_CACHE_SIZE", "10000")),
+            flush_interval=float(os.getenv("SESSION_FLUSH_INTERVAL", "2")),
+        )
+
+    def _load(self):
+        try:
+            sessions = self.store.load_sessions()
+        except Exception as e:
+            logger.error(f"Error loading sessions: {e}")
+            return
+        now = time.time()
+        for token_hash, session in sorted(sessions.items(), key=lambda item: item[1].get('created_at', 0)):
+            if session.get('expires_at', 0) > now:
+                self._sessions[token_hash] = session
+            else:
+                self._removed.add(token_hash)
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used sessions from memory; the store still has them."""
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def _load_session(self, token_hash: str) -> Optional[dict]:
+        try:
+            return self.store.get_session(token_hash)
+        except Exception as e:
+            logger.error(f"Error loading session: {e}")
+            return None
+
+    def create(self, patient_id: str) -> Tuple[str, float]:
+        """Start a session; returns the token and its expiry (epoch seconds).
+
+        Writes to the store, so call it off the event loop.
+        """
+        token = secrets.token_urlsafe(32)
+        now = time.time()
+        session = {"patient_id": patient_id, "created_at": now, "expires_at": now + self.ttl}
+        token_hash = _token_hash(token)
+        with self._lock:
+            self._sessions[token_hash] = session
+            self._removed.discard(token_hash)
+            self._evict()
+        try:
+            self.store.write_sessions({token_hash: session}, [])
+        except Exception as e:
+            # This process still accepts the token; the write-behind flush retries it
+            logger.error(f"Error persisting session: {e}")
+            with self._lock:
+                self._dirty[token_hash] = session
+        return token, session['expires_at']
+
+    def validate(self, token: str, load: bool = True) -> Optional[str]:
+        """Return the session's patient ID, or None if the token is unknown or expired.
+
+        Tokens not cached here (issued by another worker process, or evicted) are
+        looked up in the store and cached. With load=False only memory is checked,
+        so the call never touches disk.
+        """
+        token_hash = _token_hash(token)
+        with self._lock:
+            session = self._sessions.get(token_hash)
+            if session is None and not load:
+                return None
+        cached = session is not None
+        if not cached:
+            session = self._load_session(token_hash)
+
+        with self._lock:
+            if session is None:
+                self._misses += 1
+                return None
+            if session['expires_at'] <= time.time():
+                self._sessions.pop(token_hash, None)
+                self._dirty.pop(token_hash, None)
+                self._removed.add(token_hash)
+                self._misses += 1
+                return None
+            if cached:
+                self._sessions.move_to_end(token_hash)
+                self._hits += 1
+            else:
+                self._sessions[token_hash] = session
+                self._evict()
+                self._misses += 1
+            return session['patient_id']
+
+    def revoke(self, token: str) -> bool:
+        """End a session, including one issued by another worker process.
+
+        Other workers that already cached the token keep accepting it until it expires
+        or is evicted. Writes to the store, so call it off the event loop.
+        """
+        token_hash = _token_hash(token)
+        with self._lock:
+            session = self._sessions.pop(token_hash, None)
+            self._dirty.pop(token_hash, None)
+        if session is None and self._load_session(token_hash) is None:
+            return False
+        try:
+            self.store.write_sessions({}, [token_hash])
+        except Exception as e:
+            logger.error(f"Error persisting session revocation: {e}")
+            with self._lock:
+                self._removed.add(token_hash)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "active_sessions": len(self._sessions),
+                "pending_writes": len(self._dirty) + len(self._removed)
+            }
+
+    def flush(self) -> None:
+        """Write pending session changes to the store."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty and not self._removed:
+                    return
+                upserts, removed = self._dirty, self._removed
+                self._dirty, self._removed = {}, set()
+            try:
+                self.store.write_sessions(upserts, list(removed))
+            except Exception as e:
+                # Put the batch back (newer changes win) so the next pass retries it
+                logger.error(f"Error persisting sessions: {e}")
+                with self._lock:
+                    for token_hash, session in upserts.items():
+                        if token_hash not in self._removed and token_hash not in self._dirty:
+                            self._dirty[token_hash] = session
+                    self._removed |= {h for h in removed if h not in self._sessions}
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        """Stop the background writer and flush outstanding changes."""
+        self._stop.set()
+        self._flusher.join()
+        self.flush()
@@ -99,6 +99,8 @@ class SymptomCheckerService:
             context += "\nSimilar Medical Cases:"
             for case in similar_cases:
                 context += f"\n- Case: {case.symptoms} | Diagnosis: {case.diagnosis} | Outcome: {case.outcome}"
+                if case.similarity_score is not None:
+                    context += f" | Similarity: {case.similarity_score:.2f}"
         context += """
         \nMedical Analysis Task:
         1. Analyze the symptoms provided
@@ -0,0 +1,42 @@
+import os
+from typing import List
+
+
+def chunk_text(text: str, max_words: int = 150, overlap: int = 30) -> List[str]:
+    """Split text into windows of at most `max_words` words, consecutive windows sharing `overlap` words.
+
+    150 words stays under all-MiniLM-L6-v2's 256-token input limit for typical
+    clinical text, so no part of a chunk is truncated away by the model.
+    """
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, max_words - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + max_words]))
+        if start + max_words >= len(words):
+            break
+    return chunks
+
+
+class ChunkingConfig:
+    """How case text is split into separately embedded chunks."""
+
+    def __init__(self, max_words: int = 150, overlap: int = 30, max_chunks: int = 64):
+        self.max_words = max_words
+        self.overlap = overlap
+        self.max_chunks = max_chunks  # bounds index growth for very long documents
+
+    @classmethod
+    def from_env(cls) -> "ChunkingConfig":
+        return cls(
+            max_words=int(os.getenv("MEMORY_CHUNK_WORDS", "150")),
+            overlap=int(os.getenv("MEMORY_CHUNK_OVERLAP", "30")),
+            max_chunks=int(os.getenv("MEMORY_MAX_CHUNKS", "64")),
+        )
+
+    def split(self, *texts: str) -> List[str]:
+        """Chunks of each text in order, capped at max_chunks in total."""
+        chunks = [chunk for text in texts if text for chunk in chunk_text(text, self.max_words, self.overlap)]
+        return chunks[:self.max_chunks]
@@ -1,92 +1,123 @@
 import os
-import json
-import hashlib
+import asyncio
 import uuid
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from fastapi import HTTPException
 import logging
 
-from models.user_models import UserRegistration, UserLogin, UserProfile, UserDocument, UserDashboard, generate_patient_id, generate_document_id
+from models.user_models import UserRegistration, UserLogin, UserProfile, UserSession, UserDocument, UserDashboard, generate_patient_id, generate_document_id
+from services.user_store import UserStore, DocumentCursor, create_user_store, upload_date_key
+from services.io_executor import BoundedIOExecutor
+from services.blob_store import BlobStore
+from services.password_hasher import PasswordHasher
+from services.session_service import SessionService
 
 logger = logging.getLogger(__name__)
 
+MAX_DIAGNOSES_PER_PATIENT = 10
+
+# Document fields stored as a content-addressed blob instead of inline metadata
+DOCUMENT_BODY_FIELDS = ('extracted_data', 'full_text')
+
 class UserService:
     """Service for user management, authentication, and document storage."""
     
-    def __init__(self):
-        self.users_file = "data/users.json"
-        self.documents_file = "data/documents.json"
-        self.sessions_file = "data/sessions.json"
-        self.diagnoses_file = "data/diagnoses.json"  # NEW
-        
+    def __init__(self, store: Optional[UserStore] = None, password_hasher: Optional[PasswordHasher] = None,
+                 memory_service: Optional[Any] = None):
         # Create data directory if it doesn't exist
         os.makedirs("data", exist_ok=True)
         os.makedirs("uploads", exist_ok=True)
         
-        # Initialize data files
-        self._init_data_files()
-        # Initialize diagnoses file if not exists
-        if not os.path.exists(self.diagnoses_file):
-            with open(self.diagnoses_file, 'w') as f:
-                json.dump({}, f)
+        # Pluggable persistence backend (SQLite by default, JSON as fallback)
+        self.store = store or create_user_store("data")
+        
+        # All store calls run on a dedicated I/O pool so disk access never blocks the event loop
+        self.io = BoundedIOExecutor(
+            max_workers=int(os.getenv("USER_IO_WORKERS", "4")),
+            max_pending=int(os.getenv("USER_IO_QUEUE_SIZE", "64")),
+            name="user-io"
+        )
+        
+        # Slow KDF (bcrypt) on its own bounded worker pool
+        self.password_hasher = password_hasher or PasswordHasher.from_env()
+        
+        # Session tokens are validated in memory and written behind to the store
+        self.sessions = SessionService.from_env(self.store)
+        
+        # Document bodies (extracted data and full text) live in content-addressed blobs
+        self.blobs = BlobStore(
+            os.path.join("data", "blobs"),
+            compression=os.getenv("DOCUMENT_BLOB_COMPRESSION", "gzip")
+        )
+        self._externalize_document_bodies()
+        
+        # Similar-case memory (MedicalMemoryService), kept in step with document deletes
+        self.memory_service = memory_service
     
-    def _init_data_files(self):
-        """Initialize JSON data files if they don't exist."""
-        files = [self.users_file, self.documents_file, self.sessions_file]
-        for file_path in files:
-            if not os.path.exists(file_path):
-                with open(file_path, 'w') as f:
-                    json.dump({}, f)
+    def close(self):
+        """Flush and release the storage backend."""
+        self.password_hasher.shutdown()
+        self.sessions.close()
+        self.io.shutdown()
+        self.store.close()
     
-    def _hash_password(self, password: str) -> str:
-        """Hash password using SHA-256."""
-        return hashlib.sha256(password.encode()).hexdigest()
+    def _externalize_document_bodies(self):
+        """One-shot move of inline document bodies from older metadata into the blob store."""
+        marker = os.path.join(self.blobs.root, ".externalized")
+        if os.path.exists(marker):
+            return
+        moved = 0
+        for patient_id in self.store.list_document_patients():
+            for doc in self.store.list_documents(patient_id):
+                if doc.get('body_ref') or not any(field in doc for field in DOCUMENT_BODY_FIELDS):
+                    continue
+                try:
+                    doc['body_ref'] = self.blobs.put(patient_id, {field: doc.get(field) for field in DOCUMENT_BODY_FIELDS})
+                except ValueError as e:
+                    logger.warning(f"Keeping inline body for document {doc.get('document_id')}: {e}")
+                    continue
+                for field in DOCUMENT_BODY_FIELDS:
+                    doc.pop(field, None)
+                self.store.update_document(doc)
+                moved += 1
+        with open(marker, 'w') as f:
+            f.write(datetime.now().isoformat())
+        if moved:
+            logger.info(f"Moved {moved} inline document bodies into {self.blobs.root}")
     
-    def _verify_password(self, password: str, hashed: str) -> bool:
-        """Verify password against hash."""
-        return self._hash_password(password) == hashed
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss counters of the storage backend's in-memory caches."""
+        return {**self.store.cache_stats(), "sessions": self.sessions.stats()}
     
-    def _load_data(self, file_path: str) -> dict:
-        """Load data from JSON file."""
-        try:
-            with open(file_path, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading data from {file_path}: {e}")
-            return {}
-
-    def _load_diagnoses(self):
-        try:
-            with open(self.diagnoses_file, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading diagnoses: {e}")
-            return {}
-
-    def _save_data(self, file_path: str, data: dict):
-        """Save data to JSON file."""
-        try:
-            with open(file_path, 'w') as f:
-                json.dump(data, f, indent=2, default=str)
-        except Exception as e:
-            logger.error(f"Error saving data to {file_path}: {e}")
-
-    def _save_diagnoses(self, data):
-        try:
-            with open(self.diagnoses_file, 'w') as f:
-                json.dump(data, f, indent=2, default=str)
-        except Exception as e:
-            logger.error(f"Error saving diagnoses: {e}")
+    async def start_session(self, user_profile: UserProfile) -> UserSession:
+        """Issue a session token for an authenticated user."""
+        token, expires_at = await self.io.run(self.sessions.create, user_profile.patient_id)
+        return UserSession(
+            **user_profile.dict(),
+            session_token=token,
+            session_expires_at=datetime.fromtimestamp(expires_at)
+        )
+    
+    async def validate_session(self, token: str) -> Optional[str]:
+        """Return the patient ID for a valid session token.
+        
+        Cached tokens are checked in memory; tokens issued by another worker process
+        are looked up in the store on the I/O pool.
+        """
+        patient_id = self.sessions.validate(token, load=False)
+        if patient_id is None:
+            patient_id = await self.io.run(self.sessions.validate, token)
+        return patient_id
+    
+    async def end_session(self, token: str) -> bool:
+        return await self.io.run(self.sessions.revoke, token)
     
     async def register_user(self, user_data: UserRegistration) -> UserProfile:
         """Register a new user with auto-generated patient ID."""
-        users = self._load_data(self.users_file)
-        
         # Check if email already exists
-        for user in users.values():
-            if user.get('email') == user_data.email:
-                raise HTTPException(status_code=400, detail="Email already registered")
+        if await self.io.run(self.store.find_user_by_email, user_data.email):
+            raise HTTPException(status_code=400, detail="Email already registered")
         
         # Generate patient ID
         patient_id = generate_patient_id()
@@ -105,53 +136,50 @@ class UserService:
             last_login=None
         )
         
-        # Store user data
-        users[patient_id] = {
+        # Store user data; the store re-checks the email atomically for concurrent registrations
+        password_hash = await self.password_hasher.hash(user_data.password)
+        created = await self.io.run(self.store.create_user, {
             **user_profile.dict(),
-            'password_hash': self._hash_password(user_data.password)
-        }
-        
-        self._save_data(self.users_file, users)
+            'password_hash': password_hash
+        })
+        if not created:
+            raise HTTPException(status_code=400, detail="Email already registered")
         
         # Create user upload directory
         user_upload_dir = f"uploads/{patient_id}"
-        os.makedirs(user_upload_dir, exist_ok=True)
+        await self.io.run(os.makedirs, user_upload_dir, exist_ok=True)
         
         logger.info(f"User registered: {patient_id}")
         return user_profile
     
     async def login_user(self, login_data: UserLogin) -> UserProfile:
         """Authenticate user and return profile."""
-        users = self._load_data(self.users_file)
-        
         # Find user by email
-        user_data = None
-        patient_id = None
-        for pid, user in users.items():
-            if user.get('email') == login_data.email:
-                user_data = user
-                patient_id = pid
-                break
+        user_data = await self.io.run(self.store.find_user_by_email, login_data.email)
         
         if not user_data:
             raise HTTPException(status_code=401, detail="Invalid email or password")
         
         # Verify password
-        if not self._verify_password(login_data.password, user_data['password_hash']):
+        valid, new_hash = await self.password_hasher.verify(login_data.password, user_data['password_hash'])
+        if not valid:
             raise HTTPException(status_code=401, detail="Invalid email or password")
         
+        # Upgrade legacy or outdated hashes now that we know the plaintext
+        if new_hash:
+            user_data['password_hash'] = new_hash
+            logger.info(f"Rehashed password for {user_data['patient_id']}")
+        
         # Update last login
         user_data['last_login'] = datetime.now().isoformat()
-        users[patient_id] = user_data
-        self._save_data(self.users_file, users)
+        await self.io.run(self.store.update_user, user_data)
         
         # Return user profile (without password)
         return UserProfile(**{k: v for k, v in user_data.items() if k != 'password_hash'})
     
     async def get_user_profile(self, patient_id: str) -> Optional[UserProfile]:
         """Get user profile by patient ID."""
-        users = self._load_data(self.users_file)
-        user_data = users.get(patient_id)
+        user_data = await self.io.run(self.store.get_user, patient_id)
         
         if not user_data:
             return None
@@ -161,8 +189,6 @@ class UserService:
     async def save_document(self, patient_id: str, filename: str, file_type: str, 
                            file_size: int, extracted_data: dict, full_text: str) -> UserDocument:
         """Save uploaded document information."""
-        documents = self._load_data(self.documents_file)
-        
         document_id = generate_document_id()
         
         document = UserDocument(
@@ -177,54 +203,83 @@ class UserService:
             confidence_score=extracted_data.get('extraction_confidence', 0.0)
         )
         
-        # Store document data
-        if patient_id not in documents:
-            documents[patient_id] = []
-        
-        documents[patient_id].append(document.dict())
-        self._save_data(self.documents_file, documents)
+        # Store the body as a (deduplicated) blob and keep only its reference in the metadata
+        document.body_ref = await self.io.run(
+            self.blobs.put, patient_id, {'extracted_data': extracted_data, 'full_text': full_text}
+        )
+        await self.io.run(self.store.add_document, document.dict(exclude=set(DOCUMENT_BODY_FIELDS)))
         
         logger.info(f"Document saved: {document_id} for patient {patient_id}")
         return document
     
-    async def get_user_documents(self, patient_id: str, limit: int = 10) -> List[UserDocument]:
-        """Get user's uploaded documents."""
-        documents = self._load_data(self.documents_file)
-        user_docs = documents.get(patient_id, [])
+    async def get_user_documents(self, patient_id: str, limit: int = 10, after: Optional[str] = None,
+                                 include_body: bool = False) -> List[UserDocument]:
+        """Get user's uploaded documents, newest first, starting after an optional page cursor.
         
-        # Sort by upload date (newest first) and limit
-        sorted_docs = sorted(user_docs, key=lambda x: x.get('upload_date', ''), reverse=True)[:limit]
+        Extracted data and full text are only loaded when `include_body` is set.
+        """
+        cursor = self.parse_document_cursor(after) if after else None
         
-        return [UserDocument(**doc) for doc in sorted_docs]
+        # The store keeps documents sorted by upload date, so this is a keyset slice
+        user_docs = await self.io.run(self.store.list_documents, patient_id, limit, cursor)
+        if include_body:
+            user_docs = await asyncio.gather(*(self._load_document_body(patient_id, doc) for doc in user_docs))
+        
+        return [UserDocument(**doc) for doc in user_docs]
+    
+    async def get_user_document(self, patient_id: str, document_id: str) -> UserDocument:
+        """Get a single document including its extracted data and full text."""
+        doc = await self.io.run(self.store.get_document, patient_id, document_id)
+        if not doc:
+            raise HTTPException(status_code=404, detail="Document not found")
+        return UserDocument(**await self._load_document_body(patient_id, doc))
+    
+    async def _load_document_body(self, patient_id: str, doc: dict) -> dict:
+        """Merge a document's blob body into its metadata record."""
+        if doc.get('body_ref'):
+            body = await self.io.run(self.blobs.get, patient_id, doc['body_ref'])
+            if body:
+                return {**doc, **body}
+        return doc
+    
+    @staticmethod
+    def document_cursor(document: UserDocument) -> str:
+        """Build the `after` cursor that continues a listing after this document."""
+        return f"{upload_date_key(document.upload_date)},{document.document_id}"
+    
+    @staticmethod
+    def parse_document_cursor(cursor: str) -> DocumentCursor:
+        """Parse an `<upload_date>,<document_id>` cursor."""
+        upload_date, sep, document_id = cursor.rpartition(',')
+        if not sep or not upload_date or not document_id:
+            raise HTTPException(status_code=400, detail="Invalid cursor, expected '<upload_date>,<document_id>'")
+        return (upload_date_key(upload_date), document_id)
     
     async def get_dashboard_data(self, patient_id: str) -> UserDashboard:
         """Get comprehensive dashboard data for user."""
-        # Get user profile
-        user_profile = await self.get_user_profile(patient_id)
+        # Profile, recent documents, summary counters and recent diagnoses are independent reads
+        user_profile, recent_documents, summary, recent_diagnoses = await asyncio.gather(
+            self.get_user_profile(patient_id),
+            self.get_user_documents(patient_id, limit=5),
+            self.io.run(self.store.get_summary, patient_id),
+            self.get_user_diagnoses(patient_id, limit=5)
+        )
         if not user_profile:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Get recent documents
-        recent_documents = await self.get_user_documents(patient_id, limit=5)
-        
-        # Get total document count
-        documents = self._load_data(self.documents_file)
-        total_documents = len(documents.get(patient_id, []))
-        
-        # Get recent diagnoses
-        recent_diagnoses = await self.get_user_diagnoses(patient_id, limit=5)
-        
-        # Create health summary (placeholder for now)
+        # Counters are maintained by the store on every save/delete, so this is O(1)
         health_summary = {
-            "total_uploads": total_documents,
-            "last_upload": recent_documents[0].upload_date if recent_documents else None,
-            "extraction_confidence_avg": sum(doc.confidence_score for doc in recent_documents) / len(recent_documents) if recent_documents else 0
+            "total_uploads": summary["total_uploads"],
+            "last_upload": summary["last_upload"],
+            "extraction_confidence_avg": summary["confidence_sum"] / summary["confidence_count"] if summary["confidence_count"] else 0,
+            "total_diagnoses": summary["total_diagnoses"],
+            "diagnoses_by_severity": summary["diagnoses_by_severity"]
         }
         
         return UserDashboard(
             patient_id=patient_id,
             user_info=user_profile,
-            total_documents=total_documents,
+            total_documents=summary["total_uploads"],
             recent_documents=recent_documents,
             recent_diagnoses=recent_diagnoses,  # Now real data
             health_summary=health_summary
@@ -232,8 +287,7 @@ class UserService:
     
     async def update_user_profile(self, patient_id: str, profile_data: dict) -> UserProfile:
         """Update user profile information."""
-        users = self._load_data(self.users_file)
-        user_data = users.get(patient_id)
+        user_data = await self.io.run(self.store.get_user, patient_id)
         
         if not user_data:
             raise HTTPException(status_code=404, detail="User not found")
@@ -244,21 +298,45 @@ class UserService:
             if field in profile_data:
                 user_data[field] = profile_data[field]
         
-        users[patient_id] = user_data
-        self._save_data(self.users_file, users)
+        await self.io.run(self.store.update_user, user_data)
         
         return UserProfile(**{k: v for k, v in user_data.items() if k != 'password_hash'})
     
     async def delete_user_document(self, patient_id: str, document_id: str) -> bool:
         """Delete a user's document by document_id."""
-        documents = self._load_data(self.documents_file)
-        user_docs = documents.get(patient_id, [])
-        new_docs = [doc for doc in user_docs if doc.get('document_id') != document_id]
-        if len(new_docs) == len(user_docs):
+        deleted = await self.io.run(self.store.delete_document, patient_id, document_id)
+        if not deleted:
             raise HTTPException(status_code=404, detail="Document not found")
-        documents[patient_id] = new_docs
-        self._save_data(self.documents_file, documents)
+        if deleted.get('body_ref'):
+            await self.io.run(self._release_blob, patient_id, deleted['body_ref'])
         # Optionally, delete the file from uploads directory
+        await self.io.run(self._remove_upload_files, patient_id, document_id)
+        await self._sync_patient_memory(patient_id)
+        logger.info(f"Deleted document {document_id} for patient {patient_id}")
+        return True 
+
+    async def _sync_patient_memory(self, patient_id: str):
+        """Point the patient's similar-case vector at their newest remaining document, or remove it."""
+        if self.memory_service is None:
+            return
+        try:
+            remaining = await self.io.run(self.store.list_documents, patient_id, 1)
+            body = await self._load_document_body(patient_id, remaining[0]) if remaining else None
+            if body and body.get('extracted_data'):
+                await self.memory_service.store_patient_history(patient_id, body['extracted_data'])
+            else:
+                await self.memory_service.remove_patient_history(patient_id)
+        except Exception as e:
+            logger.warning(f"Failed to update case memory for {patient_id}: {e}")
+
+    def _release_blob(self, patient_id: str, body_ref: str):
+        """Delete a body blob once no remaining document of the patient references it."""
+        if any(doc.get('body_ref') == body_ref for doc in self.store.list_documents(patient_id)):
+            return
+        self.blobs.delete(patient_id, body_ref)
+
+    def _remove_upload_files(self, patient_id: str, document_id: str):
+        """Delete a document's uploaded file(s) from the uploads directory."""
         user_upload_dir = f"uploads/{patient_id}"
         for ext in ['.pdf', '.jpg', '.jpeg', '.png']:
             file_path = os.path.join(user_upload_dir, f"{document_id}{ext}")
@@ -267,12 +345,9 @@ class UserService:
                     os.remove(file_path)
                 except Exception as e:
                     logger.warning(f"Failed to delete file {file_path}: {e}")
-        logger.info(f"Deleted document {document_id} for patient {patient_id}")
-        return True 
 
     async def save_user_diagnosis(self, patient_id: str, symptoms: str, result: dict, source: str = "symptom_checker") -> dict:
         """Save a user's diagnosis (symptom check) result."""
-        diagnoses = self._load_diagnoses()
         diagnosis_id = str(uuid.uuid4())[:8].upper()
         entry = {
             "diagnosis_id": diagnosis_id,
@@ -281,16 +356,11 @@ class UserService:
             "result": result,
             "source": source
         }
-        if patient_id not in diagnoses:
-            diagnoses[patient_id] = []
-        diagnoses[patient_id].insert(0, entry)  # Most recent first
-        # Limit to last 10
-        diagnoses[patient_id] = diagnoses[patient_id][:10]
-        self._save_diagnoses(diagnoses)
+        # Most recent first, limited to the last MAX_DIAGNOSES_PER_PATIENT
+        await self.io.run(self.store.add_diagnosis, patient_id, entry, keep=MAX_DIAGNOSES_PER_PATIENT)
         logger.info(f"Diagnosis saved: {diagnosis_id} for patient {patient_id}")
         return entry
 
     async def get_user_diagnoses(self, patient_id: str, limit: int = 5) -> list:
         """Get user's recent diagnoses."""
-        diagnoses = self._load_diagnoses()
-        return diagnoses.get(patient_id, [])[:limit] 
\ No newline at end of file
+        return await self.io.run(self.store.list_diagnoses, patient_id, limit) 
\ No newline at end of file
@@ -0,0 +1,844 @@
+import os
+import re
+import json
+import bisect
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+from services.diagnosis_journal import DiagnosisJournal, load_diagnoses
+
+logger = logging.getLogger(__name__)
+
+# (upload_date key, document_id): documents are ordered and paginated by this pair
+DocumentCursor = Tuple[str, str]
+
+_SAFE_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def upload_date_key(value: Any) -> str:
+    """Normalize an upload date (datetime or string) to a sortable, fixed-width string."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='microseconds')
+    return str(value)
+
+
+def document_sort_key(record: dict) -> DocumentCursor:
+    return (upload_date_key(record.get('upload_date', '')), record.get('document_id', ''))
+
+
+def empty_summary() -> dict:
+    """Per-patient dashboard counters, maintained incrementally by the stores."""
+    return {
+        "total_uploads": 0,
+        "last_upload": None,
+        "confidence_sum": 0.0,
+        "confidence_count": 0,
+        "total_diagnoses": 0,
+        "diagnoses_by_severity": {}
+    }
+
+
+def diagnosis_severity(entry: dict) -> str:
+    result = entry.get('result') or {}
+    return str(result.get('severity_assessment') or 'unknown').lower()
+
+
+def summary_add_document(summary: dict, record: dict):
+    summary["total_uploads"] += 1
+    last_upload = summary["last_upload"]
+    if last_upload is None or upload_date_key(record.get('upload_date')) > upload_date_key(last_upload):
+        summary["last_upload"] = record.get('upload_date')
+    summary["confidence_sum"] += float(record.get('confidence_score') or 0.0)
+    summary["confidence_count"] += 1
+
+
+def summary_remove_document(summary: dict, record: dict, newest_remaining: Optional[dict]):
+    summary["total_uploads"] = max(0, summary["total_uploads"] - 1)
+    summary["last_upload"] = newest_remaining.get('upload_date') if newest_remaining else None
+    summary["confidence_count"] = max(0, summary["confidence_count"] - 1)
+    # Reset rather than subtract down to zero so float error can't accumulate
+    if summary["confidence_count"]:
+        summary["confidence_sum"] -= float(record.get('confidence_score') or 0.0)
+    else:
+        summary["confidence_sum"] = 0.0
+
+
+def summary_add_diagnosis(summary: dict, entry: dict):
+    severity = diagnosis_severity(entry)
+    summary["total_diagnoses"] += 1
+    summary["diagnoses_by_severity"][severity] = summary["diagnoses_by_severity"].get(severity, 0) + 1
+
+
+def build_summary(documents: List[dict], diagnoses: List[dict]) -> dict:
+    """Compute a summary from scratch, used once at startup for patients that predate summaries."""
+    summary = empty_summary()
+    for record in documents:
+        summary_add_document(summary, record)
+    for entry in diagnoses:
+        summary_add_diagnosis(summary, entry)
+    return summary
+
+
+def _load_json(file_path: str) -> Any:
+    try:
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading data from {file_path}: {e}")
+        return None
+
+
+def load_legacy_documents(data_dir: str) -> Dict[str, List[dict]]:
+    """Read documents from documents.json and any per-patient shards (shards win)."""
+    documents: Dict[str, List[dict]] = {}
+    legacy_file = os.path.join(data_dir, "documents.json")
+    if os.path.exists(legacy_file):
+        documents.update(_load_json(legacy_file) or {})
+    shard_dir = os.path.join(data_dir, "documents")
+    if os.path.isdir(shard_dir):
+        for name in os.listdir(shard_dir):
+            if name.endswith(".json"):
+                documents[name[:-len(".json")]] = _load_json(os.path.join(shard_dir, name)) or []
+    return documents
+
+
+class UserStore:
+    """Storage backend interface used by UserService.
+
+    Records are plain dicts shaped like the existing JSON files, so backends are
+    interchangeable and UserService never touches the persistence format directly.
+    """
+
+    def get_user(self, patient_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def find_user_by_email(self, email: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def create_user(self, record: dict) -> bool:
+        """Insert a new user. Returns False if the email is already registered."""
+        raise NotImplementedError
+
+    def update_user(self, record: dict) -> None:
+        raise NotImplementedError
+
+    def list_documents(self, patient_id: str, limit: Optional[int] = None,
+                       after: Optional[DocumentCursor] = None) -> List[dict]:
+        """Return the patient's documents newest first.
+
+        `after` is a keyset cursor: only documents strictly older than that
+        (upload_date key, document_id) pair are returned.
+        """
+        raise NotImplementedError
+
+    def add_document(self, record: dict) -> None:
+        raise NotImplementedError
+
+    def get_document(self, patient_id: str, document_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def update_document(self, record: dict) -> None:
+        """Replace an existing document record (same patient_id, document_id and upload_date)."""
+        raise NotImplementedError
+
+    def delete_document(self, patient_id: str, document_id: str) -> Optional[dict]:
+        """Delete a document and return its record, or None if it does not exist."""
+        raise NotImplementedError
+
+    def list_document_patients(self) -> List[str]:
+        """Return the IDs of all patients that have documents."""
+        raise NotImplementedError
+
+    def get_summary(self, patient_id: str) -> dict:
+        """Return the patient's incrementally maintained dashboard counters (see empty_summary)."""
+        raise NotImplementedError
+
+    def add_diagnosis(self, patient_id: str, entry: dict, keep: int) -> None:
+        raise NotImplementedError
+
+    def list_diagnoses(self, patient_id: str, limit: int) -> List[dict]:
+        """Return the patient's diagnoses, most recent first."""
+        raise NotImplementedError
+
+    def load_sessions(self) -> Dict[str, dict]:
+        """Return all persisted sessions, keyed by token hash."""
+        raise NotImplementedError
+
+    def get_session(self, token_hash: str) -> Optional[dict]:
+        """Return one persisted session, e.g. one issued by another worker process."""
+        raise NotImplementedError
+
+    def write_sessions(self, upserts: Dict[str, dict], removed: List[str]) -> None:
+        """Persist a batch of created/refreshed sessions and drop revoked or expired ones."""
+        raise NotImplementedError
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss counters for any in-memory caching the backend does."""
+        return {}
+
+    def close(self) -> None:
+        pass
+
+
+class _CachedJSONFile:
+    """A parsed JSON file kept in memory with write-through updates.
+
+    The cached object is revalidated against the file's (mtime, size) signature on
+    every access, so edits made by another process are still picked up. Only the
+    JSON backend uses it; SQLite (the default) serves indexed row lookups instead.
+    """
+
+    def __init__(self, file_path: str, load: Callable[[str], Any], save: Callable[[str, Any], None],
+                 on_reload: Optional[Callable[[Any], None]] = None, stats: Optional[Dict[str, int]] = None):
+        self.file_path = file_path
+        self._load = load
+        self._save = save
+        self._on_reload = on_reload
+        self._data: Any = None
+        self._signature: Optional[tuple] = None
+        # Counters may be shared between several cached files (e.g. all document shards)
+        self._stats = stats if stats is not None else {"hits": 0, "misses": 0}
+
+    def _file_signature(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self) -> Any:
+        signature = self._file_signature()
+        if self._data is None or signature != self._signature:
+            self._stats["misses"] += 1
+            self._data = self._load(self.file_path)
+            self._signature = signature
+            if self._on_reload:
+                self._on_reload(self._data)
+        else:
+            self._stats["hits"] += 1
+        return self._data
+
+    def put(self, data: Any):
+        self._save(self.file_path, data)
+        self._data = data
+        self._signature = self._file_signature()
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+
+class JSONUserStore(UserStore):
+    """JSON file storage, kept as a fallback backend.
+
+    Parsed files are cached in memory and written through on mutation. Document
+    metadata is sharded into one file per patient (data/documents/<patient_id>.json),
+    kept sorted by upload date so pages are sliced without loading other patients.
+    Dashboard counters live in small per-patient files (data/summaries/<patient_id>.json).
+    """
+
+    def __init__(self, data_dir: str = "data", max_cached_shards: int = 1024):
+        self.users_file = os.path.join(data_dir, "users.json")
+        self.documents_file = os.path.join(data_dir, "documents.json")  # legacy, pre-sharding
+        self.documents_dir = os.path.join(data_dir, "documents")
+        self.summaries_dir = os.path.join(data_dir, "summaries")
+        self.sessions_file = os.path.join(data_dir, "sessions.json")
+        self.diagnoses_file = os.path.join(data_dir, "diagnoses.json")
+        # Serializes read-modify-write cycles so concurrent requests don't lose updates
+        self._lock = threading.RLock()
+
+        # email -> patient_id, rebuilt whenever users.json is (re)loaded from disk
+        self._email_index: Dict[str, str] = {}
+        self._users = _CachedJSONFile(self.users_file, self._load_data, self._save_data,
+                                      on_reload=self._rebuild_email_index)
+        # Re-read only when another process writes to it, so session lookups stay cheap
+        self._sessions = _CachedJSONFile(self.sessions_file, self._load_data, self._save_data)
+        # Most recently used document shards; counters are shared across shards
+        self.max_cached_shards = max_cached_shards
+        self._shards: "OrderedDict[str, _CachedJSONFile]" = OrderedDict()
+        self._shard_stats = {"hits": 0, "misses": 0}
+        self._summaries: "OrderedDict[str, _CachedJSONFile]" = OrderedDict()
+        self._summary_stats = {"hits": 0, "misses": 0}
+
+        os.makedirs(data_dir, exist_ok=True)
+        self._init_data_files()
+        self._shard_legacy_documents()
+        with self._lock:
+            self._users.get()
+
+        # Diagnoses are appended to an NDJSON journal and served from memory
+        self.diagnoses_journal = DiagnosisJournal(
+            self.diagnoses_file,
+            compact_interval=float(os.getenv("DIAGNOSIS_COMPACT_INTERVAL", "300"))
+        )
+        self._build_summaries()
+
+    def _init_data_files(self):
+        """Initialize JSON data files if they don't exist."""
+        files = [self.users_file, self.documents_file, self.sessions_file, self.diagnoses_file]
+        for file_path in files:
+            if not os.path.exists(file_path):
+                with open(file_path, 'w') as f:
+                    json.dump({}, f)
+
+    def _load_data(self, file_path: str) -> dict:
+        """Load data from JSON file."""
+        try:
+            with open(file_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading data from {file_path}: {e}")
+            return {}
+
+    def _save_data(self, file_path: str, data: dict):
+        """Save data to JSON file (atomically, so other readers never see a partial write)."""
+        tmp_path = file_path + ".tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=2, default=str)
+            os.replace(tmp_path, file_path)
+        except Exception as e:
+            logger.error(f"Error saving data to {file_path}: {e}")
+
+    @staticmethod
+    def _normalize(record: dict) -> dict:
+        """Round-trip a record through JSON so cached values match what a reload would return."""
+        return json.loads(json.dumps(record, default=str))
+
+    def _shard_legacy_documents(self):
+        """One-shot split of the legacy documents.json into per-patient shards."""
+        if os.path.isdir(self.documents_dir):
+            return
+        staging_dir = self.documents_dir + ".migrating"
+        os.makedirs(staging_dir, exist_ok=True)
+        documents = self._load_data(self.documents_file)
+        for patient_id, docs in documents.items():
+            if _SAFE_ID.match(patient_id):
+                self._save_data(os.path.join(staging_dir, f"{patient_id}.json"),
+                                sorted(docs, key=document_sort_key))
+            else:
+                logger.warning(f"Skipping documents for unsafe patient id {patient_id!r}")
+        # Publishing the directory with a rename makes the migration all-or-nothing
+        os.replace(staging_dir, self.documents_dir)
+        logger.info(f"Sharded documents for {len(documents)} patients into {self.documents_dir}")
+
+    def _build_summaries(self):
+        """One-shot build of the summary files for patients whose data predates summaries."""
+        if os.path.isdir(self.summaries_dir):
+            return
+        staging_dir = self.summaries_dir + ".building"
+        os.makedirs(staging_dir, exist_ok=True)
+        patient_ids = {name[:-len(".json")] for name in os.listdir(self.documents_dir) if name.endswith(".json")}
+        patient_ids.update(self.diagnoses_journal.patients())
+        for patient_id in patient_ids:
+            if not _SAFE_ID.match(patient_id):
+                continue
+            documents = self._load_shard(os.path.join(self.documents_dir, f"{patient_id}.json"))
+            diagnoses = self.diagnoses_journal.recent(patient_id, limit=10**6)
+            self._save_data(os.path.join(staging_dir, f"{patient_id}.json"), build_summary(documents, diagnoses))
+        os.replace(staging_dir, self.summaries_dir)
+        logger.info(f"Built dashboard summaries for {len(patient_ids)} patients in {self.summaries_dir}")
+
+    def _load_shard(self, file_path: str) -> List[dict]:
+        if not os.path.exists(file_path):
+            return []
+        docs = self._load_data(file_path) or []
+        # Files edited by hand may be out of order; shards are kept oldest -> newest
+        docs.sort(key=document_sort_key)
+        return docs
+
+    def _patient_file(self, cache: "OrderedDict[str, _CachedJSONFile]", directory: str, patient_id: str,
+                      load: Callable[[str], Any], stats: Dict[str, int]) -> Optional[_CachedJSONFile]:
+        """Return a cached per-patient file, or None for ids that are not safe file names."""
+        if not _SAFE_ID.match(patient_id):
+            return None
+        cached = cache.get(patient_id)
+        if cached is None:
+            cached = _CachedJSONFile(os.path.join(directory, f"{patient_id}.json"), load, self._save_data, stats=stats)
+            cache[patient_id] = cached
+            if len(cache) > self.max_cached_shards:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(patient_id)
+        return cached
+
+    def _shard(self, patient_id: str) -> Optional[_CachedJSONFile]:
+        return self._patient_file(self._shards, self.documents_dir, patient_id, self._load_shard, self._shard_stats)
+
+    def _load_summary(self, file_path: str) -> Optional[dict]:
+        return self._load_data(file_path) if os.path.exists(file_path) else None
+
+    def _summary(self, patient_id: str) -> Optional[_CachedJSONFile]:
+        return self._patient_file(self._summaries, self.summaries_dir, patient_id,
+                                  self._load_summary, self._summary_stats)
+
+    @staticmethod
+    def _read_summary(summary_file: _CachedJSONFile) -> dict:
+        """The stored summary; patients without a file have no documents or diagnoses yet."""
+        summary = summary_file.get()
+        return summary if summary is not None else empty_summary()
+
+    def _rebuild_email_index(self, users: Dict[str, dict]):
+        self._email_index = {user['email']: pid for pid, user in users.items() if user.get('email')}
+
+    def get_user(self, patient_id: str) -> Optional[dict]:
+        with self._lock:
+            user = self._users.get().get(patient_id)
+        return dict(user) if user else None
+
+    def find_user_by_email(self, email: str) -> Optional[dict]:
+        with self._lock:
+            users = self._users.get()
+            patient_id = self._email_index.get(email)
+            user = users.get(patient_id) if patient_id else None
+        return dict(user) if user else None
+
+    def create_user(self, record: dict) -> bool:
+        record = self._normalize(record)
+        with self._lock:
+            users = self._users.get()
+            if record['email'] in self._email_index:
+                return False
+            users[record['patient_id']] = record
+            self._email_index[record['email']] = record['patient_id']
+            self._users.put(users)
+            return True
+
+    def update_user(self, record: dict) -> None:
+        record = self._normalize(record)
+        with self._lock:
+            users = self._users.get()
+            previous = users.get(record['patient_id'])
+            if previous and previous.get('email') != record.get('email'):
+                self._email_index.pop(previous.get('email'), None)
+            users[record['patient_id']] = record
+            if record.get('email'):
+                self._email_index[record['email']] = record['patient_id']
+            self._users.put(users)
+
+    def list_documents(self, patient_id: str, limit: Optional[int] = None,
+                       after: Optional[DocumentCursor] = None) -> List[dict]:
+        with self._lock:
+            shard = self._shard(patient_id)
+            docs = shard.get() if shard else []
+            # Binary search for the cursor, then slice: cost is independent of shard size
+            end = bisect.bisect_left(docs, after, key=document_sort_key) if after else len(docs)
+            start = max(0, end - limit) if limit is not None else 0
+            return [dict(doc) for doc in docs[start:end][::-1]]
+
+    def add_document(self, record: dict) -> None:
+        record = self._normalize(record)
+        with self._lock:
+            shard = self._shard(record['patient_id'])
+            if shard is None:
+                raise ValueError(f"Invalid patient id: {record['patient_id']!r}")
+            summary_file = self._summary(record['patient_id'])
+            summary = self._read_summary(summary_file)
+            docs = shard.get()
+            bisect.insort(docs, record, key=document_sort_key)
+            shard.put(docs)
+            summary_add_document(summary, record)
+            summary_file.put(summary)
+
+    def get_document(self, patient_id: str, document_id: str) -> Optional[dict]:
+        with self._lock:
+            shard = self._shard(patient_id)
+            for doc in (shard.get() if shard else []):
+                if doc.get('document_id') == document_id:
+                    return dict(doc)
+        return None
+
+    def update_document(self, record: dict) -> None:
+        record = self._normalize(record)
+        with self._lock:
+            shard = self._shard(record['patient_id'])
+            docs = shard.get() if shard else []
+            for i, doc in enumerate(docs):
+                if doc.get('document_id') == record['document_id']:
+                    docs[i] = record
+                    shard.put(docs)
+                    return
+
+    def delete_document(self, patient_id: str, document_id: str) -> Optional[dict]:
+        with self._lock:
+            shard = self._shard(patient_id)
+            docs = shard.get() if shard else []
+            for i, doc in enumerate(docs):
+                if doc.get('document_id') == document_id:
+                    summary_file = self._summary(patient_id)
+                    summary = self._read_summary(summary_file)
+                    remaining = docs[:i] + docs[i + 1:]
+                    shard.put(remaining)
+                    summary_remove_document(summary, doc, remaining[-1] if remaining else None)
+                    summary_file.put(summary)
+                    return doc
+        return None
+
+    def list_document_patients(self) -> List[str]:
+        return [name[:-len(".json")] for name in os.listdir(self.documents_dir) if name.endswith(".json")]
+
+    def add_diagnosis(self, patient_id: str, entry: dict, keep: int) -> None:
+        with self._lock:
+            summary_file = self._summary(patient_id)
+            summary = self._read_summary(summary_file) if summary_file else None
+            self.diagnoses_journal.append(patient_id, entry, keep=keep)
+            if summary is not None:
+                summary_add_diagnosis(summary, entry)
+                summary_file.put(summary)
+
+    def get_summary(self, patient_id: str) -> dict:
+        with self._lock:
+            summary_file = self._summary(patient_id)
+            return dict(self._read_summary(summary_file)) if summary_file else empty_summary()
+
+    def list_diagnoses(self, patient_id: str, limit: int) -> List[dict]:
+        return self.diagnoses_journal.recent(patient_id, limit)
+
+    def load_sessions(self) -> Dict[str, dict]:
+        with self._lock:
+            return dict(self._sessions.get())
+
+    def get_session(self, token_hash: str) -> Optional[dict]:
+        with self._lock:
+            session = self._sessions.get().get(token_hash)
+        return dict(session) if session else None
+
+    def write_sessions(self, upserts: Dict[str, dict], removed: List[str]) -> None:
+        with self._lock:
+            sessions = dict(self._sessions.get())
+            sessions.update(self._normalize(upserts))
+            for token_hash in removed:
+                sessions.pop(token_hash, None)
+            self._sessions.put(sessions)
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                "users": self._users.stats(),
+                "documents": dict(self._shard_stats),
+                "summaries": dict(self._summary_stats),
+                "diagnoses": self.diagnoses_journal.stats()
+            }
+
+    def close(self) -> None:
+        self.diagnoses_journal.close()
+
+
+class SQLiteUserStore(UserStore):
+    """Embedded SQLite storage (WAL mode) with per-row writes and indexed lookups."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            patient_id TEXT PRIMARY KEY,
+            email TEXT NOT NULL UNIQUE,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS documents (
+            document_id TEXT PRIMARY KEY,
+            patient_id TEXT NOT NULL,
+            upload_date TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_documents_patient_keyset ON documents(patient_id, upload_date, document_id);
+        CREATE TABLE IF NOT EXISTS diagnoses (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            diagnosis_id TEXT NOT NULL,
+            patient_id TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_diagnoses_patient ON diagnoses(patient_id, seq);
+        CREATE TABLE IF NOT EXISTS patient_summaries (
+            patient_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS sessions (
+            token_hash TEXT PRIMARY KEY,
+            patient_id TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: str = "data/smart_health.db", data_dir: str = "data"):
+        self.db_path = db_path
+        self.data_dir = data_dir
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+        # One shared connection; the lock keeps it safe across executor threads
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(self.SCHEMA)
+        self._migrate_from_json()
+        self._migrate_document_keys()
+        self._build_summaries()
+
+    @staticmethod
+    def _dumps(record: dict) -> str:
+        return json.dumps(record, default=str)
+
+    def _migrate_from_json(self):
+        """One-shot import of the legacy data/*.json files into SQLite."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+            if row:
+                return
+
+            def load(name: str) -> dict:
+                path = os.path.join(self.data_dir, name)
+                if not os.path.exists(path):
+                    return {}
+                try:
+                    with open(path, 'r') as f:
+                        return json.load(f)
+                except Exception as e:
+                    logger.error(f"Error loading {path} for migration: {e}")
+                    return {}
+
+            users = load("users.json")
+            documents = load_legacy_documents(self.data_dir)
+            # Includes entries still sitting in the JSON backend's diagnosis journal
+            diagnoses = load_diagnoses(os.path.join(self.data_dir, "diagnoses.json"))
+
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO users (patient_id, email, data) VALUES (?, ?, ?)",
+                    [(pid, user.get('email', ''), self._dumps(user)) for pid, user in users.items()]
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO documents (document_id, patient_id, upload_date, data) VALUES (?, ?, ?, ?)",
+                    [
+                        (doc['document_id'], pid, upload_date_key(doc.get('upload_date', '')), self._dumps(doc))
+                        for pid, docs in documents.items() for doc in docs
+                    ]
+                )
+                # Legacy lists are newest first; insert oldest first so seq order matches
+                self._conn.executemany(
+                    "INSERT INTO diagnoses (diagnosis_id, patient_id, timestamp, data) VALUES (?, ?, ?, ?)",
+                    [
+                        (entry.get('diagnosis_id', ''), pid, str(entry.get('timestamp', '')), self._dumps(entry))
+                        for pid, entries in diagnoses.items() for entry in reversed(entries)
+                    ]
+                )
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', '1')")
+
+            logger.info(
+                f"Migrated {len(users)} users, {sum(len(d) for d in documents.values())} documents "
+                f"and {sum(len(d) for d in diagnoses.values())} diagnoses from JSON into {self.db_path}"
+            )
+
+    def _migrate_document_keys(self):
+        """Normalize upload_date columns written before keyset pagination existed."""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'document_keys_normalized'").fetchone():
+                return
+            rows = self._conn.execute("SELECT document_id, upload_date FROM documents").fetchall()
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE documents SET upload_date = ? WHERE document_id = ?",
+                    [(upload_date_key(upload_date), document_id) for document_id, upload_date in rows]
+                )
+                self._conn.execute("DROP INDEX IF EXISTS idx_documents_patient")
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('document_keys_normalized', '1')")
+
+    def _build_summaries(self):
+        """One-shot build of patient_summaries for patients whose rows predate summaries."""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'summaries_built'").fetchone():
+                return
+            patient_ids = [row[0] for row in self._conn.execute(
+                "SELECT patient_id FROM documents UNION SELECT patient_id FROM diagnoses "
+                "EXCEPT SELECT patient_id FROM patient_summaries"
+            ).fetchall()]
+            with self._conn:
+                for patient_id in patient_ids:
+                    documents = self._conn.execute("SELECT data FROM documents WHERE patient_id = ?", (patient_id,)).fetchall()
+                    diagnoses = self._conn.execute("SELECT data FROM diagnoses WHERE patient_id = ?", (patient_id,)).fetchall()
+                    summary = build_summary([json.loads(r[0]) for r in documents], [json.loads(r[0]) for r in diagnoses])
+                    self._write_summary(patient_id, summary)
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('summaries_built', '1')")
+            if patient_ids:
+                logger.info(f"Built dashboard summaries for {len(patient_ids)} patients")
+
+    def get_user(self, patient_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM users WHERE patient_id = ?", (patient_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_user_by_email(self, email: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM users WHERE email = ?", (email,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def create_user(self, record: dict) -> bool:
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT INTO users (patient_id, email, data) VALUES (?, ?, ?)",
+                    (record['patient_id'], record['email'], self._dumps(record))
+                )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def update_user(self, record: dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE users SET email = ?, data = ? WHERE patient_id = ?",
+                (record['email'], self._dumps(record), record['patient_id'])
+            )
+
+    def list_documents(self, patient_id: str, limit: Optional[int] = None,
+                       after: Optional[DocumentCursor] = None) -> List[dict]:
+        query = "SELECT data FROM documents WHERE patient_id = ?"
+        params: list = [patient_id]
+        if after:
+            # Row-value comparison lets SQLite seek straight to the cursor in the keyset index
+            query += " AND (upload_date, document_id) < (?, ?)"
+            params.extend(after)
+        query += " ORDER BY upload_date DESC, document_id DESC LIMIT ?"
+        params.append(limit if limit is not None else -1)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _read_summary(self, patient_id: str) -> dict:
+        """Load a patient's summary (built at startup for older rows). Caller holds the lock."""
+        row = self._conn.execute("SELECT data FROM patient_summaries WHERE patient_id = ?", (patient_id,)).fetchone()
+        return json.loads(row[0]) if row else empty_summary()
+
+    def _write_summary(self, patient_id: str, summary: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO patient_summaries (patient_id, data) VALUES (?, ?)",
+            (patient_id, self._dumps(summary))
+        )
+
+    def add_document(self, record: dict) -> None:
+        # The summary is updated in the same transaction as the document row
+        with self._lock, self._conn:
+            summary = self._read_summary(record['patient_id'])
+            self._conn.execute(
+                "INSERT INTO documents (document_id, patient_id, upload_date, data) VALUES (?, ?, ?, ?)",
+                (record['document_id'], record['patient_id'], upload_date_key(record['upload_date']), self._dumps(record))
+            )
+            summary_add_document(summary, json.loads(self._dumps(record)))
+            self._write_summary(record['patient_id'], summary)
+
+    def get_document(self, patient_id: str, document_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM documents WHERE patient_id = ? AND document_id = ?", (patient_id, document_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update_document(self, record: dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE documents SET data = ? WHERE patient_id = ? AND document_id = ?",
+                (self._dumps(record), record['patient_id'], record['document_id'])
+            )
+
+    def delete_document(self, patient_id: str, document_id: str) -> Optional[dict]:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT data FROM documents WHERE patient_id = ? AND document_id = ?", (patient_id, document_id)
+            ).fetchone()
+            if not row:
+                return None
+            summary = self._read_summary(patient_id)
+            self._conn.execute(
+                "DELETE FROM documents WHERE patient_id = ? AND document_id = ?", (patient_id, document_id)
+            )
+            newest = self._conn.execute(
+                "SELECT data FROM documents WHERE patient_id = ? ORDER BY upload_date DESC, document_id DESC LIMIT 1",
+                (patient_id,)
+            ).fetchone()
+            record = json.loads(row[0])
+            summary_remove_document(summary, record, json.loads(newest[0]) if newest else None)
+            self._write_summary(patient_id, summary)
+        return record
+
+    def list_document_patients(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT patient_id FROM documents").fetchall()
+        return [row[0] for row in rows]
+
+    def add_diagnosis(self, patient_id: str, entry: dict, keep: int) -> None:
+        with self._lock, self._conn:
+            summary = self._read_summary(patient_id)
+            summary_add_diagnosis(summary, entry)
+            self._write_summary(patient_id, summary)
+            self._conn.execute(
+                "INSERT INTO diagnoses (diagnosis_id, patient_id, timestamp, data) VALUES (?, ?, ?, ?)",
+                (entry['diagnosis_id'], patient_id, str(entry['timestamp']), self._dumps(entry))
+            )
+            # Trim to the most recent `keep` entries; the index keeps this local to the patient
+            self._conn.execute(
+                """
+                DELETE FROM diagnoses WHERE patient_id = ? AND seq <= (
+                    SELECT seq FROM diagnoses WHERE patient_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?
+                )
+                """,
+                (patient_id, patient_id, keep)
+            )
+
+    def list_diagnoses(self, patient_id: str, limit: int) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM diagnoses WHERE patient_id = ? ORDER BY seq DESC LIMIT ?", (patient_id, limit)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_summary(self, patient_id: str) -> dict:
+        with self._lock:
+            return self._read_summary(patient_id)
+
+    def load_sessions(self) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT token_hash, data FROM sessions").fetchall()
+        return {row[0]: json.loads(row[1]) for row in rows}
+
+    def get_session(self, token_hash: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM sessions WHERE token_hash = ?", (token_hash,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def write_sessions(self, upserts: Dict[str, dict], removed: List[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sessions (token_hash, patient_id, data) VALUES (?, ?, ?)",
+                [(token_hash, session['patient_id'], self._dumps(session)) for token_hash, session in upserts.items()]
+            )
+            self._conn.executemany("DELETE FROM sessions WHERE token_hash = ?", [(h,) for h in removed])
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_user_store(data_dir: str = "data") -> UserStore:
+    """Create the storage backend selected by USER_STORAGE_BACKEND (sqlite or json)."""
+    backend = os.getenv("USER_STORAGE_BACKEND", "sqlite").lower()
+    if backend == "sqlite":
+        db_path = os.getenv("USER_STORAGE_DB", os.path.join(data_dir, "smart_health.db"))
+        try:
+            return SQLiteUserStore(db_path=db_path, data_dir=data_dir)
+        except sqlite3.Error as e:
+            logger.error(f"SQLite storage unavailable ({e}); falling back to JSON storage")
+    elif backend != "json":
+        logger.warning(f"Unknown USER_STORAGE_BACKEND '{backend}'; using JSON storage")
+    return JSONUserStore(data_dir=data_dir)
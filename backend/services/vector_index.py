@@ -0,0 +1,598 @@
+import os
+import math
+import time
+import hashlib
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ANN_KINDS = ("flat", "hnsw", "ivfpq")
+
+# Case attributes that searches can filter on
+FILTER_FIELDS = ("patient_id", "category")
+# Distinct filters whose candidate selectors are kept between writes
+FILTER_CACHE_SIZE = 256
+
+
+def case_vector_id(case_id: str) -> int:
+    """Stable 63-bit FAISS ID for a case ID (identical across restarts and processes)."""
+    digest = hashlib.blake2b(case_id.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') & 0x7FFFFFFFFFFFFFFF
+
+
+def chunk_vector_id(case_id: str, chunk: int) -> int:
+    """FAISS ID of a case's chunk; chunk 0 shares the case's own ID (single-vector cases)."""
+    return case_vector_id(case_id if chunk == 0 else f"{case_id}#{chunk}")
+
+
+def _as_matrix(vectors) -> np.ndarray:
+    return np.ascontiguousarray(np.atleast_2d(np.asarray(vectors, dtype='float32')))
+
+
+def normalize(vectors) -> np.ndarray:
+    """L2-normalized float32 copy, so inner product equals cosine similarity."""
+    vectors = _as_matrix(vectors).copy()
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _flat_store(dim: int) -> faiss.Index:
+    return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+
+class _Candidates:
+    """Vector IDs matching a search filter, with the FAISS selectors derived from them.
+
+    CaseIndex caches these per filter until its next write, so repeated filtered
+    searches don't rebuild the ID array and selectors in Python on every query.
+    """
+
+    def __init__(self, ids: np.ndarray):
+        self.ids = ids
+        self._selector = None
+        self._ann_selector = (None, None, None)  # (tier, bitmap, selector)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def selector(self) -> faiss.IDSelector:
+        """IDSelector over vector IDs, for the ID-keyed flat stores (IDSelectorBatch copies the IDs)."""
+        if self._selector is None:
+            self._selector = faiss.IDSelectorBatch(len(self.ids), faiss.swig_ptr(self.ids))
+        return self._selector
+
+    def ann_selector(self, tier: "_AnnTier") -> faiss.IDSelector:
+        """Bitmap selector over the live rows of an approximate tier."""
+        cached_tier, _, selector = self._ann_selector
+        if cached_tier is not tier:
+            bitmap = tier.bitmap(self.ids)  # IDSelectorBitmap doesn't copy; keep the bitmap alive with it
+            selector = faiss.IDSelectorBitmap(len(tier.ids), faiss.swig_ptr(bitmap))
+            self._ann_selector = (tier, bitmap, selector)
+        return selector
+
+
+class IndexConfig:
+    """Approximate-index settings; `kind="flat"` keeps exact brute-force search."""
+
+    def __init__(self, kind: str = "flat", promote_at: int = 50000, rebuild_fraction: float = 0.2,
+                 hnsw_m: int = 32, ef_construction: int = 80, ef_search: int = 64,
+                 nlist: int = 0, nprobe: int = 16, pq_m: int = 48, pq_bits: int = 8, refine: int = 4,
+                 exact_filter_limit: int = 20000):
+        if kind not in ANN_KINDS:
+            raise ValueError(f"Unsupported index type: {kind}")
+        self.kind = kind
+        self.promote_at = promote_at
+        self.rebuild_fraction = rebuild_fraction
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.nlist = nlist  # 0 = derived from the corpus size
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_bits = pq_bits
+        self.refine = refine  # IVF-PQ: re-rank k * refine candidates with exact scores
+        # Filters matching at most this many cases scan the exact store instead of the ANN tier,
+        # whose graph/list traversal degrades when few vectors pass the filter
+        self.exact_filter_limit = exact_filter_limit
+
+    @classmethod
+    def from_env(cls) -> "IndexConfig":
+        return cls(
+            kind=os.getenv("MEMORY_INDEX_TYPE", "flat").lower(),
+            promote_at=int(os.getenv("MEMORY_INDEX_PROMOTE_AT", "50000")),
+            hnsw_m=int(os.getenv("MEMORY_HNSW_M", "32")),
+            ef_search=int(os.getenv("MEMORY_HNSW_EF_SEARCH", "64")),
+            nlist=int(os.getenv("MEMORY_IVF_NLIST", "0")),
+            nprobe=int(os.getenv("MEMORY_IVF_NPROBE", "16")),
+            pq_m=int(os.getenv("MEMORY_PQ_M", "48")),
+            refine=int(os.getenv("MEMORY_IVF_REFINE", "4")),
+            exact_filter_limit=int(os.getenv("MEMORY_FILTER_EXACT_LIMIT", "20000")),
+        )
+
+    def ivf_nlist(self, n: int) -> int:
+        """Requested nlist, or ~4*sqrt(n), capped so each list gets enough training points."""
+        nlist = self.nlist or int(4 * math.sqrt(n))
+        return max(1, min(nlist, n // 39))
+
+
+def build_ann_index(config: IndexConfig, vectors: np.ndarray) -> faiss.Index:
+    """Build (and train, for IVF-PQ) an inner-product index over `vectors`; labels are row positions."""
+    dim = vectors.shape[1]
+    if config.kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, config.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = config.ef_construction
+    elif config.kind == "ivfpq":
+        pq_m = config.pq_m if dim % config.pq_m == 0 else dim // 8
+        index = faiss.IndexIVFPQ(faiss.IndexFlatIP(dim), dim, config.ivf_nlist(len(vectors)), pq_m, config.pq_bits,
+                                 faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+    else:
+        raise ValueError(f"Not an approximate index type: {config.kind}")
+    index.add(vectors)
+    return index
+
+
+class _AnnTier:
+    """An immutable approximate index over a snapshot of the flat store.
+
+    Vectors replaced or removed after the build are masked out at search time
+    through an ID selector, so they are skipped inside the index scan. Since the
+    index itself never changes, it can be saved once and memory-mapped by readers.
+    """
+
+    def __init__(self, index: faiss.Index, ids: np.ndarray, dead: Iterable[int] = ()):
+        self.index = index
+        self.ids = ids  # row position -> vector ID (may be a memory-mapped array)
+        self._order = np.argsort(ids)
+        self._sorted_ids = ids[self._order]
+        self.dead: set = set(dead)
+        self._selector = None
+        self._selector_size = 0
+
+    def serialize(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Serialized index and row -> vector ID array, as saved by MemorySnapshotStore.save."""
+        return faiss.serialize_index(self.index), np.asarray(self.ids)
+
+    def kill(self, vector_id: int):
+        index = np.searchsorted(self._sorted_ids, vector_id)
+        if index < len(self._sorted_ids) and self._sorted_ids[index] == vector_id:
+            self.dead.add(int(self._order[index]))
+
+    def selector(self):
+        """IDSelector excluding dead rows (rebuilt only when rows died since the last search)."""
+        if not self.dead:
+            return None
+        if self._selector_size != len(self.dead):
+            self._dead_array = np.array(sorted(self.dead), dtype='int64')
+            self._batch = faiss.IDSelectorBatch(len(self._dead_array), faiss.swig_ptr(self._dead_array))
+            self._selector = faiss.IDSelectorNot(self._batch)
+            self._selector_size = len(self.dead)
+        return self._selector
+
+    def bitmap(self, vector_ids: np.ndarray) -> np.ndarray:
+        """Packed bitmap (IDSelectorBitmap layout) of the live rows holding `vector_ids`."""
+        index = np.minimum(np.searchsorted(self._sorted_ids, vector_ids), len(self.ids) - 1)
+        mask = np.zeros(len(self.ids), dtype=bool)
+        mask[self._order[index[self._sorted_ids[index] == vector_ids]]] = True
+        if self.dead:
+            mask[list(self.dead)] = False
+        return np.packbits(mask, bitorder='little')
+
+    def search(self, queries: np.ndarray, k: int, config: IndexConfig, candidates: Optional[_Candidates] = None):
+        """Search live rows; with `candidates`, only those vectors are considered inside the scan."""
+        if isinstance(self.index, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW()
+            params.efSearch = max(config.ef_search, k)
+            if candidates is not None:
+                # Only ~len(candidates)/len(ids) of the visited nodes can be returned; widen the beam to match
+                params.efSearch = min(len(self.ids), max(params.efSearch, k * len(self.ids) // len(candidates)))
+        else:
+            params = faiss.SearchParametersIVF()
+            params.nprobe = config.nprobe
+        if candidates is not None:
+            selector = candidates.ann_selector(self)
+        else:
+            selector = self.selector()
+        if selector is not None:
+            params.sel = selector
+        D, I = self.index.search(queries, k, params=params)
+        return D, np.where(I >= 0, self.ids[np.clip(I, 0, None)], -1)
+
+
+class CaseIndex:
+    """FAISS cosine-similarity index keyed by case ID, with replace and remove.
+
+    Vectors are L2-normalized and stored in an inner-product IndexIDMap2 under
+    `case_vector_id(case_id)`, so search scores are cosine similarities (higher
+    is closer). Re-adding a case replaces its vector instead of leaving a stale
+    duplicate, and the index size tracks the number of live cases.
+
+    A case may have several vectors (chunks of a long history, see
+    `chunk_vector_id`). Searches rank cases by their best-matching chunk (max-sim)
+    and return each case at most once.
+
+    `epoch` is bumped by every write (upsert, remove, tag), so callers can tell
+    whether results computed earlier may have changed.
+
+    With an approximate `config.kind`, once the store reaches `promote_at`
+    vectors an HNSW or IVF-PQ tier is built from a snapshot in a background
+    thread while searches keep using the exact store. After the swap, searches
+    merge the approximate tier with a small exact delta index holding vectors
+    written since the build; the tier is rebuilt once the delta and masked rows
+    exceed `rebuild_fraction` of it.
+
+    A `read_only` index wraps a memory-mapped store (see MemorySnapshotStore.load)
+    and refuses writes, which FAISS cannot apply to mapped vectors. It never builds
+    an approximate tier of its own; it uses the one saved with the snapshot, if any.
+    """
+
+    metric = "cosine"
+
+    def __init__(self, dim: int, index: Optional[faiss.Index] = None, case_ids: Optional[Dict[int, str]] = None,
+                 config: Optional[IndexConfig] = None, read_only: bool = False,
+                 ann: Optional[_AnnTier] = None, delta_ids: Sequence[int] = ()):
+        self.dim = dim
+        self.index = index if index is not None else _flat_store(dim)
+        self.read_only = read_only
+        self._case_ids: Dict[int, str] = case_ids or {}  # vector ID -> case ID
+        self._vectors: Dict[str, List[int]] = {}  # case ID -> its vector IDs
+        for vector_id, case_id in self._case_ids.items():
+            self._vectors.setdefault(case_id, []).append(vector_id)
+        self.config = config or IndexConfig()
+        # (field, value) -> vector IDs, for filtered search
+        self._postings: Dict[Tuple[str, str], set] = {}
+        self._attributes: Dict[str, Dict[str, str]] = {}
+        # Filter -> matching candidates (None: every vector matches), valid until the next write
+        self._filter_cache: Dict[tuple, Optional[_Candidates]] = {}
+        self._filter_cache_epoch = 0
+        self._lock = threading.RLock()
+        self.epoch = 0
+
+        self._ann = ann
+        self._delta = _flat_store(dim)
+        if ann is not None and len(delta_ids):
+            # Vectors written after the tier was built; they are in the exact store as well
+            delta = np.array(delta_ids, dtype='int64')
+            self._delta.add_with_ids(np.vstack([self.index.reconstruct(int(vector_id)) for vector_id in delta]), delta)
+        self._building = False
+        self._changed_during_build: set = set()
+        self._builds = 0
+        self._last_build_seconds = 0.0
+        self._maybe_promote()
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def __contains__(self, case_id: str) -> bool:
+        return case_id in self._vectors
+
+    def upsert(self, case_ids: List[str], vectors, attributes: Optional[List[Dict[str, Optional[str]]]] = None) -> None:
+        """Insert or replace the vectors of the given cases, optionally with filterable attributes.
+
+        All vectors given for the same case ID in one call become that case's chunks,
+        replacing every vector it had before. Cases keep their attributes unless new
+        ones are given.
+        """
+        self._check_writable()
+        vectors = normalize(vectors)
+        chunks = Counter()
+        ids = []
+        for case_id in case_ids:
+            ids.append(chunk_vector_id(case_id, chunks[case_id]))
+            chunks[case_id] += 1
+        new_attributes = dict(zip(case_ids, attributes)) if attributes is not None else {}
+        with self._lock:
+            kept_attributes = {case_id: self._attributes.get(case_id) for case_id in chunks}
+            stale = []
+            for case_id in chunks:
+                self._untag(case_id)
+                stale.extend(self._vectors.pop(case_id, ()))
+            if stale:
+                self.index.remove_ids(np.array(stale, dtype='int64'))
+                for vector_id in stale:
+                    del self._case_ids[vector_id]
+            self.index.add_with_ids(vectors, np.array(ids, dtype='int64'))
+            for vector_id, case_id in zip(ids, case_ids):
+                self._case_ids[vector_id] = case_id
+                self._vectors.setdefault(case_id, []).append(vector_id)
+            for case_id in chunks:
+                case_attributes = new_attributes.get(case_id) or kept_attributes[case_id]
+                if case_attributes is not None:
+                    self._tag(case_id, case_attributes)
+            self.epoch += 1
+            dropped = set(stale).difference(ids)
+            if dropped:
+                self._track_changes(list(dropped), None)
+            self._track_changes(ids, vectors)
+        self._maybe_promote()
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError("The case index is a read-only memory-mapped snapshot")
+
+    def tag(self, case_id: str, attributes: Dict[str, Optional[str]]) -> None:
+        """Set the filterable attributes (see FILTER_FIELDS) of a case."""
+        with self._lock:
+            self._untag(case_id)
+            self._tag(case_id, attributes)
+            self.epoch += 1
+
+    def _tag(self, case_id: str, attributes: Dict[str, Optional[str]]):
+        attributes = {field: str(value) for field, value in attributes.items()
+                      if field in FILTER_FIELDS and value is not None}
+        self._attributes[case_id] = attributes
+        for posting in attributes.items():
+            self._postings.setdefault(posting, set()).update(self._vectors.get(case_id, ()))
+
+    def _untag(self, case_id: str):
+        for posting in self._attributes.pop(case_id, {}).items():
+            vector_ids = self._postings.get(posting)
+            if vector_ids is not None:
+                vector_ids.difference_update(self._vectors.get(case_id, ()))
+                if not vector_ids:
+                    del self._postings[posting]
+
+    def _matching(self, filters: Dict[str, str]) -> Optional[_Candidates]:
+        """Vectors whose attributes match every filter, or None if that is every vector (no selector needed).
+
+        Cached per filter until the next write; call with the lock held.
+        """
+        if self._filter_cache_epoch != self.epoch:
+            self._filter_cache.clear()
+            self._filter_cache_epoch = self.epoch
+        key = tuple(sorted((field, str(value)) for field, value in filters.items()))
+        if key in self._filter_cache:
+            return self._filter_cache[key]
+        postings = sorted((self._postings.get(posting, set()) for posting in key), key=len)
+        matches = postings[0].intersection(*postings[1:]) if len(postings) > 1 else postings[0]
+        candidates = None if len(matches) == self.index.ntotal else _Candidates(np.fromiter(matches, dtype='int64'))
+        if len(self._filter_cache) >= FILTER_CACHE_SIZE:
+            self._filter_cache.pop(next(iter(self._filter_cache)))
+        self._filter_cache[key] = candidates
+        return candidates
+
+    def remove(self, case_ids: Iterable[str]) -> int:
+        """Remove cases (all their chunks) from the index; returns the number of vectors removed."""
+        self._check_writable()
+        with self._lock:
+            ids = []
+            for case_id in case_ids:
+                self._untag(case_id)
+                ids.extend(self._vectors.pop(case_id, ()))
+            if not ids:
+                return 0
+            for vector_id in ids:
+                del self._case_ids[vector_id]
+            removed = self.index.remove_ids(np.array(ids, dtype='int64'))
+            self.epoch += 1
+            self._track_changes(ids, None)
+        self._maybe_promote()
+        return removed
+
+    def _track_changes(self, ids: List[int], vectors: Optional[np.ndarray]):
+        """Mirror a write into the approximate tier's mask and delta index."""
+        if self._building:
+            self._changed_during_build.update(ids)
+        if self._ann is None:
+            return
+        id_array = np.array(ids, dtype='int64')
+        self._delta.remove_ids(id_array)
+        for vector_id in ids:
+            self._ann.kill(vector_id)
+        if vectors is not None:
+            self._delta.add_with_ids(vectors, id_array)
+
+    def _maybe_promote(self):
+        """Start a background (re)build of the approximate tier when it is due."""
+        config = self.config
+        with self._lock:
+            if config.kind == "flat" or self.read_only or self._building or self.index.ntotal < config.promote_at:
+                return
+            if self._ann is not None:
+                stale = self._delta.ntotal + len(self._ann.dead)
+                if stale <= config.rebuild_fraction * len(self._ann.ids):
+                    return
+            self._building = True
+            self._changed_during_build = set()
+            # Copy the exact store so the slow build runs without holding the lock
+            ids = faiss.vector_to_array(self.index.id_map).copy()
+            vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+        threading.Thread(target=self._build, args=(ids, vectors), name="case-index-build", daemon=True).start()
+
+    def _build(self, ids: np.ndarray, vectors: np.ndarray):
+        start = time.perf_counter()
+        try:
+            ann = _AnnTier(build_ann_index(self.config, vectors), ids)
+        except Exception as e:
+            logger.error(f"Building {self.config.kind} index failed: {e}")
+            with self._lock:
+                self._building = False
+            return
+        with self._lock:
+            # Writes that landed during the build go to a fresh delta and are masked in the new tier
+            delta = _flat_store(self.dim)
+            live = [vector_id for vector_id in self._changed_during_build if vector_id in self._case_ids]
+            if live:
+                live_ids = np.array(live, dtype='int64')
+                delta.add_with_ids(np.vstack([self.index.reconstruct(vector_id) for vector_id in live]), live_ids)
+            for vector_id in self._changed_during_build:
+                ann.kill(vector_id)
+            self._ann, self._delta = ann, delta
+            self._building = False
+            self._changed_during_build = set()
+            self._builds += 1
+            self._last_build_seconds = time.perf_counter() - start
+        logger.info(f"Built {self.config.kind} index over {len(ids)} vectors in {self._last_build_seconds:.1f}s")
+
+    def wait_for_build(self, timeout: float = 60.0) -> bool:
+        """Block until no background build is running (used by tools and tests)."""
+        deadline = time.perf_counter() + timeout
+        while self._building and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        return not self._building
+
+    def search(self, vectors, k: int, filters: Optional[Dict[str, str]] = None) -> List[List[Tuple[str, float]]]:
+        """Return up to k (case_id, cosine similarity) pairs, most similar first, for each query vector.
+
+        A case scores its best chunk's similarity. `filters` (e.g. {"patient_id": "P1"})
+        restricts results to cases tagged with all of the given attribute values.
+        Filtering happens inside the FAISS scan via an ID selector, so k matching
+        cases come back even when most of the index doesn't match.
+        """
+        queries = normalize(vectors)
+        with self._lock:
+            if self.index.ntotal == 0:
+                return [[] for _ in range(len(queries))]
+            candidates = self._matching(filters) if filters else None
+            if candidates is not None and not len(candidates):
+                return [[] for _ in range(len(queries))]
+            available = self.index.ntotal if candidates is None else len(candidates)
+            # Fetch enough chunks for k distinct cases on average; widen if chunks of the same cases crowd the top
+            chunks_per_case = math.ceil(self.index.ntotal / max(1, len(self._vectors)))
+            fetch = min(available, k * chunks_per_case)
+            while True:
+                D, I = self._search_vectors(queries, fetch, candidates)
+                results = [self._best_per_case(row_ids, row_scores, k) for row_ids, row_scores in zip(I, D)]
+                if fetch >= available or all(len(hits) >= k for hits in results):
+                    return results
+                fetch = min(available, 2 * fetch)
+
+    def _best_per_case(self, vector_ids: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        """First (= best-scoring) hit of each case, in score order."""
+        hits, seen = [], set()
+        for vector_id, score in zip(vector_ids.tolist(), scores.tolist()):
+            case_id = self._case_ids.get(vector_id)
+            if case_id is None or case_id in seen:
+                continue
+            seen.add(case_id)
+            hits.append((case_id, float(score)))
+            if len(hits) == k:
+                break
+        return hits
+
+    def _search_vectors(self, queries: np.ndarray, k: int,
+                        candidates: Optional[_Candidates]) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k vectors (scores, vector IDs) across the exact store or the approximate tier plus delta."""
+        if self._ann is None or (candidates is not None and len(candidates) <= self.config.exact_filter_limit):
+            return self._search_exact(self.index, queries, k, candidates)
+        if self.config.kind == "ivfpq" and self.config.refine > 1:
+            D, I = self._ann.search(queries, k * self.config.refine, self.config, candidates)
+            D, I = self._rerank(queries, I, k)
+        else:
+            D, I = self._ann.search(queries, k, self.config, candidates)
+        if self._delta.ntotal:
+            delta_D, delta_I = self._search_exact(self._delta, queries, min(k, self._delta.ntotal), candidates)
+            D, I = np.hstack([D, delta_D]), np.hstack([I, delta_I])
+            order = np.argsort(-D, axis=1, kind='stable')[:, :k]
+            D, I = np.take_along_axis(D, order, 1), np.take_along_axis(I, order, 1)
+        return D, I
+
+    @staticmethod
+    def _search_exact(store: faiss.Index, queries: np.ndarray, k: int, candidates: Optional[_Candidates]):
+        """Search an ID-keyed flat store, optionally only over the candidate vector IDs."""
+        if candidates is None:
+            return store.search(queries, k)
+        return store.search(queries, k, params=faiss.SearchParameters(sel=candidates.selector()))
+
+    def vector(self, case_id: str) -> Optional[np.ndarray]:
+        """The stored (normalized) vector of a case's first chunk, or None if it isn't indexed."""
+        vector_id = case_vector_id(case_id)
+        with self._lock:
+            if vector_id not in self._case_ids:
+                return None
+            return self.index.reconstruct(vector_id)
+
+    def vectors(self, case_id: str) -> Optional[np.ndarray]:
+        """The stored (normalized) vectors of all of a case's chunks in chunk order, or None."""
+        with self._lock:
+            vector_ids = self._vectors.get(case_id)
+            if not vector_ids:
+                return None
+            return np.vstack([self.index.reconstruct(vector_id) for vector_id in vector_ids])
+
+    def similarity(self, case_id: str, query) -> Optional[float]:
+        """Cosine similarity of a query to a case's best chunk (max-sim, as in search), or None."""
+        vectors = self.vectors(case_id)
+        if vectors is None:
+            return None
+        return float(np.max(vectors @ normalize(query)[0]))
+
+    def _rerank(self, queries: np.ndarray, candidates: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact scores for approximate candidates, using vectors from the exact store."""
+        D = np.full((len(queries), k), -np.inf, dtype='float32')
+        I = np.full((len(queries), k), -1, dtype='int64')
+        for row, (query, row_ids) in enumerate(zip(queries, candidates)):
+            row_ids = [vector_id for vector_id in row_ids.tolist() if vector_id in self._case_ids]
+            if not row_ids:
+                continue
+            exact = np.vstack([self.index.reconstruct(vector_id) for vector_id in row_ids])
+            scores = exact @ query
+            order = np.argsort(-scores)[:k]
+            D[row, :len(order)] = scores[order]
+            I[row, :len(order)] = np.array(row_ids, dtype='int64')[order]
+        return D, I
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "type": self.config.kind if self._ann is not None else "flat",
+                "cases": len(self._vectors),
+                "epoch": self.epoch,
+                "vectors": self.index.ntotal,
+                "approximate_vectors": len(self._ann.ids) if self._ann is not None else 0,
+                "delta_vectors": self._delta.ntotal,
+                "masked_vectors": len(self._ann.dead) if self._ann is not None else 0,
+                "building": self._building,
+                "builds": self._builds,
+                "last_build_seconds": round(self._last_build_seconds, 3)
+            }
+
+    def serialize(self) -> Tuple[np.ndarray, Dict[str, str]]:
+        """Serialized exact store (faiss.serialize_index) and the vector ID -> case ID mapping."""
+        with self._lock:
+            return faiss.serialize_index(self.index), {str(vector_id): case_id for vector_id, case_id in self._case_ids.items()}
+
+    def ann_snapshot(self) -> Optional[Tuple[_AnnTier, Dict[str, Any]]]:
+        """The approximate tier and the state to restore it with (see from_snapshot), or None.
+
+        The tier never changes after its build, so callers can serialize it
+        (`tier.serialize()`) without holding any lock.
+        """
+        with self._lock:
+            if self._ann is None:
+                return None
+            return self._ann, {
+                "kind": self.config.kind,
+                "dead": sorted(self._ann.dead),
+                "delta_ids": faiss.vector_to_array(self._delta.id_map).tolist(),
+            }
+
+    @classmethod
+    def from_snapshot(cls, dim: int, index: faiss.Index, metadata: dict, config: Optional[IndexConfig] = None,
+                      read_only: bool = False, ann: Optional[Tuple[faiss.Index, np.ndarray]] = None) -> "CaseIndex":
+        """Rebuild from a loaded snapshot; `read_only` marks a memory-mapped `index`.
+
+        `ann` is the approximate tier saved with it (index, row -> vector ID), restored
+        with the mask and delta recorded in `metadata["ann"]` if it matches `config.kind`.
+        Raises ValueError for anything but an ID-keyed inner-product (cosine) index.
+        """
+        if not isinstance(index, faiss.IndexIDMap2) or index.metric_type != faiss.METRIC_INNER_PRODUCT \
+                or metadata.get("metric") != cls.metric or "vector_ids" not in metadata:
+            raise ValueError(f"Unsupported case index snapshot ({type(index).__name__}, metric "
+                             f"{metadata.get('metric')!r}); expected IndexIDMap2 with {cls.metric} vectors")
+        case_ids = {int(vector_id): case_id for vector_id, case_id in metadata["vector_ids"].items()}
+        state = metadata.get("ann") or {}
+        if ann is not None and state.get("kind") == (config or IndexConfig()).kind and ann[0].ntotal == len(ann[1]):
+            tier = _AnnTier(ann[0], ann[1], dead=state["dead"])
+            return cls(dim, index, case_ids, config=config, read_only=read_only, ann=tier, delta_ids=state["delta_ids"])
+        return cls(dim, index, case_ids, config=config, read_only=read_only)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for content-addressed document body storage.
+"""
+
+import asyncio
+import json
+import os
+
+import pytest
+
+from services.blob_store import BlobStore
+from services.user_service import UserService
+from services.user_store import JSONUserStore
+
+
+@pytest.mark.parametrize("compression", ["gzip", "none"])
+def test_put_dedupes_identical_bodies(tmp_path, compression):
+    blobs = BlobStore(str(tmp_path), compression=compression)
+    body = {"extracted_data": {"medications": ["metformin"]}, "full_text": "Metformin 500mg"}
+    ref = blobs.put("P1", body)
+    assert ref.startswith("sha256:")
+    assert blobs.put("P1", dict(reversed(list(body.items())))) == ref
+    assert blobs.get("P1", ref) == body
+
+    blobs.delete("P1", ref)
+    assert blobs.get("P1", ref) is None
+    with pytest.raises(ValueError):
+        blobs.put("../P1", body)
+
+
+def test_document_bodies_load_lazily(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = JSONUserStore(data_dir="data")
+    user_service = UserService(store=store)
+
+    async def run():
+        first = await user_service.save_document("P1", "a.pdf", "PDF", 10, {"extraction_confidence": 0.9}, "text")
+        second = await user_service.save_document("P1", "b.pdf", "PDF", 10, {"extraction_confidence": 0.9}, "text")
+        assert first.body_ref == second.body_ref
+
+        # Metadata only references the body
+        stored = store.get_document("P1", first.document_id)
+        assert "full_text" not in stored and "extracted_data" not in stored
+
+        listed = await user_service.get_user_documents("P1")
+        assert [d.full_text for d in listed] == ["", ""]
+        listed = await user_service.get_user_documents("P1", include_body=True)
+        assert [d.full_text for d in listed] == ["text", "text"]
+
+        # Loading bodies must not write them back into the cached metadata or the shard file
+        assert [d.full_text for d in await user_service.get_user_documents("P1")] == ["", ""]
+        await user_service.save_document("P1", "c.pdf", "PDF", 10, {"extraction_confidence": 0.9}, "other")
+        with open(os.path.join("data", "documents", "P1.json")) as f:
+            shard = json.load(f)
+        assert not any("full_text" in doc or "extracted_data" in doc for doc in shard)
+
+        # The shared blob survives until its last document is deleted
+        await user_service.delete_user_document("P1", first.document_id)
+        assert (await user_service.get_user_document("P1", second.document_id)).full_text == "text"
+        await user_service.delete_user_document("P1", second.document_id)
+        assert user_service.blobs.get("P1", second.body_ref) is None
+
+    try:
+        asyncio.run(run())
+    finally:
+        user_service.close()
+
+
+def test_inline_bodies_are_externalized_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = JSONUserStore(data_dir="data")
+    store.add_document({"document_id": "D1", "patient_id": "P1", "upload_date": "2025-01-01 10:00:00",
+                        "extracted_data": {"allergies": ["penicillin"]}, "full_text": "legacy"})
+    user_service = UserService(store=store)
+    try:
+        stored = store.get_document("P1", "D1")
+        assert "full_text" not in stored
+        assert user_service.blobs.get("P1", stored["body_ref"])["full_text"] == "legacy"
+        assert os.path.exists(os.path.join("data", "blobs", ".externalized"))
+    finally:
+        user_service.close()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests for streaming bulk ingest of reference cases.
+"""
+
+import json
+
+import pytest
+
+from services.case_ingest import CaseIngester, read_cases
+
+
+def write_cases(path, n):
+    with open(path, "w") as f:
+        for i in range(n):
+            f.write(json.dumps({"case_id": f"ref_{i}", "symptoms": f"symptom pattern {i}",
+                                "category": "dermatology" if i % 2 else "cardiology"}) + "\n")
+            if i == 4:
+                f.write("{not json\n")
+
+
+def test_csv_columns_become_metadata(tmp_path):
+    path = tmp_path / "cases.csv"
+    path.write_text("case_id,symptoms,category,patient_id\nc1,rash,dermatology,P1\nc2,,dermatology,P2\n")
+    first, second = list(read_cases(str(path)))
+    assert first.case_id == "c1" and first.metadata == {"patient_id": "P1"}
+    assert second is None  # no symptoms
+
+
+def test_ingest_resumes_after_interruption(tmp_path, open_memory, fake_encode):
+    path = tmp_path / "cases.jsonl"
+    write_cases(path, 10)
+
+    calls = []
+
+    def failing_encode(texts):
+        calls.append(texts)
+        if len(calls) == 3:
+            raise RuntimeError("killed")
+        return fake_encode(texts)
+
+    interrupted = open_memory(failing_encode)
+    with pytest.raises(RuntimeError):
+        CaseIngester(interrupted, batch_size=3, workers=1, checkpoint_every=3).run(str(path))
+    interrupted.close()  # releases the writer lock, like the process exiting
+
+    service = open_memory()
+    assert 0 < len(service._medical_cases) < 10
+    result = CaseIngester(service, batch_size=3, workers=1, checkpoint_every=3).run(str(path))
+    assert result["resumed_after"] > 0
+    assert result["total_ingested"] == 10 and result["invalid"] == 1
+    assert service.case_index.ntotal == 10 and len(service._medical_cases) == 10
+
+    hits = service.case_index.search(fake_encode(["symptom pattern 3"]), 10, filters={"category": "dermatology"})[0]
+    assert hits[0] == ("ref_3", pytest.approx(1.0)) and len(hits) == 5
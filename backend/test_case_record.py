@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Tests for compact case records.
+"""
+
+from datetime import datetime
+
+from services.case_record import CaseRecord
+
+
+def test_roundtrip_without_embedding():
+    legacy = {
+        "case_id": "case_P1", "symptoms": "Conditions: asthma", "diagnosis": "", "treatment": "", "outcome": "",
+        "category": "patient_history", "embedding": [0.1, 0.2], "metadata": {"patient_id": "P1"},
+        "created_at": "2024-05-01T10:00:00"
+    }
+    record = CaseRecord.from_dict(legacy)
+    assert not hasattr(record, "__dict__")
+    assert record.created_at == datetime(2024, 5, 1, 10, 0)
+    assert CaseRecord.from_dict(record.to_dict()).to_dict() == record.to_dict()
+
+    case = record.to_model(similarity_score=0.9)
+    assert case.embedding is None and case.similarity_score == 0.9
+    assert case.metadata == {"patient_id": "P1"}
+    assert record.to_model(embedding=[1.0]).embedding == [1.0]
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Tests for the append-only diagnosis journal.
+"""
+
+import json
+import os
+
+from services.diagnosis_journal import DiagnosisJournal, load_diagnoses
+
+
+def entry(i: int) -> dict:
+    return {"diagnosis_id": f"G{i}", "timestamp": f"t{i}", "symptoms": "cough"}
+
+
+def test_appends_are_served_from_ring_buffer(tmp_path):
+    journal = DiagnosisJournal(str(tmp_path / "diagnoses.json"), keep=3, compact_interval=3600)
+    for i in range(5):
+        journal.append("P1", entry(i))
+    assert [e["diagnosis_id"] for e in journal.recent("P1", limit=10)] == ["G4", "G3", "G2"]
+    assert journal.recent("P1", limit=1)[0]["diagnosis_id"] == "G4"
+    assert journal.recent("P2", limit=5) == []
+    # Nothing has been folded into the snapshot yet, only appended
+    with open(journal.journal_path) as f:
+        assert len(f.readlines()) == 5
+    journal.close()
+
+
+def test_compaction_writes_legacy_snapshot(tmp_path):
+    snapshot = str(tmp_path / "diagnoses.json")
+    journal = DiagnosisJournal(snapshot, keep=10, compact_interval=3600)
+    journal.append("P1", entry(1))
+    journal.append("P1", entry(2))
+    journal.compact()
+    with open(snapshot) as f:
+        assert [e["diagnosis_id"] for e in json.load(f)["P1"]] == ["G2", "G1"]
+    assert os.path.getsize(journal.journal_path) == 0
+    journal.close()
+
+
+def test_replays_journal_after_crash(tmp_path):
+    snapshot = str(tmp_path / "diagnoses.json")
+    journal = DiagnosisJournal(snapshot, keep=10, compact_interval=3600)
+    journal.append("P1", entry(1))
+    journal.compact()
+    journal.append("P1", entry(2))
+    # Simulate a crash: no close(), plus a torn trailing write and an unfinished compaction
+    with open(journal.journal_path, "a") as f:
+        f.write('{"patient_id": "P1", "ent')
+    with open(journal.journal_path + ".compacting", "w") as f:
+        f.write(json.dumps({"patient_id": "P1", "entry": entry(1)}) + "\n")
+
+    assert [e["diagnosis_id"] for e in load_diagnoses(snapshot)["P1"]] == ["G2", "G1"]
+    reopened = DiagnosisJournal(snapshot, keep=10, compact_interval=3600)
+    assert [e["diagnosis_id"] for e in reopened.recent("P1", limit=10)] == ["G2", "G1"]
+    assert not os.path.exists(journal.journal_path + ".compacting")
+    reopened.close()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tests for the two-tier (LRU + memory-mapped disk) embedding cache.
+"""
+
+import numpy as np
+
+from services.embedding_cache import EmbeddingCache, embedding_cache_key
+
+DIM = 4
+
+
+def vec(value):
+    return np.full(DIM, value, dtype=np.float32)
+
+
+def test_keys_normalize_text_and_include_model():
+    assert embedding_cache_key("Headache  and Fever ", "m") == embedding_cache_key("headache and fever", "m")
+    assert embedding_cache_key("headache", "m1") != embedding_cache_key("headache", "m2")
+
+
+def test_lru_eviction_and_hit_rate():
+    cache = EmbeddingCache("m", DIM, max_entries=2)
+    cache.put("a", vec(1))
+    cache.put("b", vec(2))
+    assert cache.get("a") is not None  # b becomes least recently used
+    cache.put("c", vec(3))
+    assert cache.get("b") is None
+    assert cache.get("A ")[0] == 1.0
+
+    stats = cache.stats()
+    assert stats["memory_hits"] == 2 and stats["misses"] == 1
+    assert stats["hit_rate"] == round(2 / 3, 4)
+
+
+def test_disk_tier_survives_restart_and_wraps(tmp_path):
+    cache = EmbeddingCache("m", DIM, max_entries=1, disk_dir=str(tmp_path), disk_capacity=3)
+    for i in range(5):
+        cache.put(f"text {i}", vec(i))
+    cache.close()
+
+    cache = EmbeddingCache("m", DIM, max_entries=1, disk_dir=str(tmp_path), disk_capacity=3)
+    # The ring keeps the last three entries
+    assert cache.get("text 0") is None and cache.get("text 1") is None
+    assert [cache.get(f"text {i}")[0] for i in (2, 3, 4)] == [2.0, 3.0, 4.0]
+    assert cache.stats()["disk_hits"] == 3
+
+    # A vector that doesn't match its recorded checksum is treated as a miss
+    slot = cache.disk.slots[cache.key("text 4")][0]
+    cache.disk.vectors[slot] = vec(99)
+    cache._entries.clear()
+    assert cache.get("text 4") is None
+    cache.close()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for cross-request embedding micro-batching.
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from services.embedding_service import EmbeddingBatcher, encoder_name, load_onnx_encoder, mean_pool
+
+
+class RecordingEncoder:
+    """Deterministic encoder that records the batch sizes it was called with."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(len(texts))
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_concurrent_requests_share_batches():
+    encoder = RecordingEncoder()
+    batcher = EmbeddingBatcher(encoder, max_batch_size=8, max_wait_ms=50)
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.embed("x" * n) for n in range(1, 21)))
+
+    vectors = asyncio.run(scenario())
+    batcher.close()
+
+    # Each caller gets its own row back
+    assert [int(v[0]) for v in vectors] == list(range(1, 21))
+    assert sum(encoder.batches) == 20
+    assert max(encoder.batches) <= 8 and len(encoder.batches) < 20
+
+    stats = batcher.stats()
+    assert stats["requests"] == 20 and stats["batches"] == len(encoder.batches)
+    assert "latency_p99_ms" in stats
+
+
+def test_encode_errors_reach_every_caller():
+    def failing(texts):
+        raise RuntimeError("model unavailable")
+
+    batcher = EmbeddingBatcher(failing, max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        batcher.submit(["a"]).result(timeout=5)
+    batcher.close()
+
+
+def test_mean_pool_ignores_padding_and_normalizes():
+    hidden = np.array([[[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]],
+                       [[0.0, 2.0], [0.0, 0.0], [0.0, 0.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0], [1, 0, 0]])
+    np.testing.assert_allclose(mean_pool(hidden, mask), [[1.0, 0.0], [0.0, 1.0]])
+
+
+def test_onnx_backend_gets_its_own_cache_identity(monkeypatch):
+    assert encoder_name("m") == "m"
+    monkeypatch.setenv("EMBED_BACKEND", "onnx")
+    monkeypatch.setenv("EMBED_ONNX_MODEL", "models/m/onnx/model_int8.onnx")
+    assert encoder_name("m") == "m:onnx:model_int8"
+
+
+def export_tiny_model(directory, words, dim=16):
+    """A word-level tokenizer and an ONNX 'transformer' (embedding lookup + projection), fp32 and int8."""
+    onnx = pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    tokenizers = pytest.importorskip("tokenizers")
+    from onnx import TensorProto, helper, numpy_helper
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    vocab = {"[PAD]": 0, "[UNK]": 1, **{word: i + 2 for i, word in enumerate(words)}}
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    tokenizer.save(str(directory / "tokenizer.json"))
+    tokenizer.enable_padding()
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((len(vocab), dim)).astype(np.float32)
+    projection = rng.standard_normal((dim, 2 * dim)).astype(np.float32)
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["embeddings", "input_ids"], ["tokens"]),
+         helper.make_node("MatMul", ["tokens", "projection"], ["last_hidden_state"])],
+        "tiny",
+        [helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "sequence"])],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "sequence", 2 * dim])],
+        initializer=[numpy_helper.from_array(embeddings, "embeddings"),
+                     numpy_helper.from_array(projection, "projection")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)])
+    model.ir_version = 8
+    onnx.save(model, str(directory / "model.onnx"))
+    quantize_dynamic(str(directory / "model.onnx"), str(directory / "model_int8.onnx"),
+                     weight_type=QuantType.QInt8, per_channel=True)
+
+    def reference(texts):
+        encodings = tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings])
+        return mean_pool(embeddings[ids] @ projection, np.array([e.attention_mask for e in encodings]))
+    return reference
+
+
+def test_onnx_encoder_matches_the_model_it_runs(tmp_path):
+    words = "fever cough headache metformin insulin asthma rash nausea".split()
+    reference = export_tiny_model(tmp_path, words)
+    texts = ["fever and cough", "metformin insulin", "asthma", "rash nausea headache fever cough"]
+
+    expected = reference(texts)
+    for name, min_cosine in (("model.onnx", 0.9999), ("model_int8.onnx", 0.99)):
+        vectors = load_onnx_encoder(str(tmp_path / name), threads=1)(texts)
+        assert vectors.shape == (len(texts), expected.shape[1]) and vectors.dtype == np.float32
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+        assert np.min(np.sum(vectors * expected, axis=1)) > min_cosine
+
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for BM25 lexical search and hybrid retrieval of similar cases.
+"""
+
+import asyncio
+
+import pytest
+
+from services.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+
+def test_tokens_keep_codes_and_doses():
+    assert tokenize("Dx: E11.9, HbA1c 7.2%; Percocet 5/325") == ["dx", "e11.9", "hba1c", "7.2", "percocet", "5/325"]
+
+
+def test_bm25_ranks_rare_terms_and_tracks_replacements():
+    index = LexicalIndex()
+    index.add("a", "Conditions: asthma | Medications: albuterol")
+    index.add("b", "Conditions: diabetes | Medications: metformin")
+    index.add("c", "Conditions: diabetes, asthma | Medications: metformin, metformin")
+    assert [case_id for case_id, _ in index.search("metformin", 5)] == ["c", "b"]
+    assert index.search("conditions", 5)[0][1] < index.search("albuterol", 5)[0][1]
+    assert [case_id for case_id, _ in index.search("metformin", 5, accept=lambda case_id: case_id != "c")] == ["b"]
+
+    index.add("c", "Conditions: migraine")  # re-upload replaces the old text
+    index.remove("b")
+    assert index.search("metformin", 5) == []
+    assert index.stats()["documents"] == 2
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]])
+    assert [case_id for case_id, _ in fused] == ["b", "a", "d", "c"]
+
+
+def test_search_modes(memory):
+    for i in range(20):
+        asyncio.run(memory.store_patient_history(f"P{i}", {"medications": [f"drug{i}"], "notes": "routine visit"}))
+
+    lexical = asyncio.run(memory.search_similar_cases("drug7", top_k=3, mode="lexical"))
+    assert [case.case_id for case in lexical] == ["case_P7"]
+    assert lexical[0].similarity_score is None and lexical[0].retrieval_score > 0
+
+    # Random embeddings don't find the token; hybrid still ranks the exact match first
+    hybrid = asyncio.run(memory.search_similar_cases("drug7", top_k=3, min_score=-1.0, mode="hybrid"))
+    assert hybrid[0].case_id == "case_P7" and hybrid[0].similarity_score is not None
+    assert asyncio.run(memory.search_similar_cases("drug7", top_k=3, mode="lexical", patient_id="P8")) == []
+
+    vector = asyncio.run(memory.search_similar_cases("drug7", top_k=3, min_score=-1.0, mode="vector"))
+    assert len(vector) == 3 and all(case.retrieval_score is None for case in vector)
+    with pytest.raises(ValueError):
+        asyncio.run(memory.search_similar_cases("drug7", mode="fuzzy"))
+
+    stats = memory.search_stats()
+    assert {mode: stats[mode]["searches"] for mode in stats} == {"vector": 1, "lexical": 2, "hybrid": 1}
+    assert "latency_p99_ms" in stats["hybrid"]
+
+
+def test_hybrid_keeps_keyword_matches_below_min_score(memory):
+    for i in range(5):
+        asyncio.run(memory.store_patient_history(f"P{i}", {"allergies": ["penicillin"], "notes": f"visit {i}"}))
+    asyncio.run(memory.store_patient_history("P9", {"medical_conditions": ["E11.9 type 2 diabetes"]}))
+    # Template labels match every case, so they are not indexed
+    assert memory.lexical_index.search("notes about allergies", 5) == []
+
+    # Unrelated random embeddings: vector search finds nothing above the default min_score...
+    assert asyncio.run(memory.search_similar_cases("E11.9", mode="vector")) == []
+    # ...but hybrid keeps the exact ICD-code match
+    hits = asyncio.run(memory.search_similar_cases("E11.9", mode="hybrid"))
+    assert [case.case_id for case in hits] == ["case_P9"]
+    assert hits[0].similarity_score < memory.min_score and hits[0].retrieval_score > 0
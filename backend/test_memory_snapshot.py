@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for versioned, memory-mapped snapshots of the case index.
+"""
+
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from services.memory_snapshot import MemorySnapshotStore
+from services.vector_index import CaseIndex
+
+
+def make_index(n, dim=8, seed=0):
+    index = faiss.IndexFlatL2(dim)
+    index.add(np.random.default_rng(seed).random((n, dim), dtype=np.float32))
+    return index
+
+
+def test_roundtrip_and_generations(tmp_path):
+    store = MemorySnapshotStore(str(tmp_path))
+    assert store.load() is None
+
+    for n in (3, 4, 5):
+        generation = store.save(faiss.serialize_index(make_index(n)), {"ntotal": n})
+    assert generation == 3
+
+    index, metadata = store.load(mmap=True)
+    assert index.ntotal == 5 and metadata == {"ntotal": 5, "generation": 3}
+
+    # Only the last two generations are kept
+    assert sorted(os.listdir(tmp_path)) == [
+        "CURRENT", "cases-00000002.index", "cases-00000002.json", "cases-00000003.index", "cases-00000003.json"
+    ]
+
+
+def mapped_files():
+    with open("/proc/self/maps") as f:
+        return {line.split()[-1] for line in f if len(line.split()) >= 6}
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/maps"), reason="needs /proc/self/maps")
+def test_index_vectors_are_memory_mapped(tmp_path):
+    store = MemorySnapshotStore(str(tmp_path))
+    source = make_index(1000)
+    store.save(faiss.serialize_index(source), {"ntotal": 1000})
+    index_path = str(tmp_path / "cases-00000001.index")
+
+    heap_index, _ = store.load(mmap=False)
+    assert index_path not in mapped_files()
+
+    index, _ = store.load(mmap=True)
+    assert index_path in mapped_files()
+    query = np.random.default_rng(1).random((1, 8), dtype=np.float32)
+    assert np.array_equal(index.search(query, 5)[1], source.search(query, 5)[1])
+
+    # Writes to mapped vectors would abort the process, so the case index refuses them
+    case_index = CaseIndex(8, read_only=True)
+    with pytest.raises(RuntimeError):
+        case_index.remove(["case_1"])
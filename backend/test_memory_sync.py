@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for the single-writer, multi-reader memory mode.
+"""
+
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def processes(open_memory, tmp_path, monkeypatch):
+    """Services sharing one data directory, standing in for uvicorn worker processes."""
+    monkeypatch.setenv("EMBED_CACHE_DIR", str(tmp_path / "embedding_cache"))
+    monkeypatch.setenv("MEMORY_SYNC_INTERVAL", "3600")  # the test drives syncing
+    return open_memory
+
+
+def search(service, query, mode="lexical"):
+    hits = asyncio.run(service.search_similar_cases(query, top_k=5, min_score=-1.0, mode=mode, include_embeddings=True))
+    return [case.case_id for case in hits]
+
+
+def test_one_writer_and_readers_follow_its_deltas_and_snapshots(processes):
+    writer, reader = processes(), processes()
+    assert (writer.role, reader.role) == ("writer", "reader")
+    assert reader.embedding_cache.disk is None
+
+    asyncio.run(writer.store_patient_history("P1", {"medications": ["metformin"]}))
+    assert reader.reload() is False  # nothing published yet
+    assert writer.publish() is True and writer.publish() is False
+    assert reader.reload() is True
+    assert search(reader, "metformin") == search(reader, "metformin", mode="vector") == ["case_P1"]
+
+    # A snapshot folds the deltas in; readers map it and drop their overlay
+    writer.save_snapshot()
+    assert reader.reload() is True
+    assert reader.case_index.read_only and reader.stats()["overlay_cases"] == 0
+    assert search(reader, "metformin", mode="vector") == ["case_P1"]
+
+    # A reader's writes go through the writer and come back as a delta
+    asyncio.run(reader.store_patient_history("P2", {"medications": ["metformin", "insulin"]}))
+    asyncio.run(reader.remove_patient_history("P1"))
+    assert "case_P2" not in reader._medical_cases
+    with pytest.raises(RuntimeError):
+        reader.add_cases([], np.zeros((0, 384), dtype=np.float32))
+    assert writer.apply_inbox() == 2 and writer.publish() is True
+    assert reader.reload() is True
+    assert search(reader, "metformin") == search(reader, "metformin", mode="vector") == ["case_P2"]
+    assert reader.stats()["overlay_cases"] == 1
+    assert asyncio.run(reader.get_patient_history("P1")) is None
+    assert reader.stats()["generation"] == writer.stats()["generation"] == 1
+    assert reader.stats()["delta_sequence"] == writer.stats()["delta_sequence"] == 1
+
+    # A process starting now replays the deltas on top of the snapshot
+    assert search(processes(), "metformin", mode="vector") == ["case_P2"]
+
+
+def test_writer_role_passes_to_the_next_process(processes):
+    first = processes()
+    first.close()
+    assert processes().role == "writer"
+
+
+def test_readers_map_the_writers_approximate_index(processes, tmp_path, monkeypatch):
+    monkeypatch.setenv("MEMORY_INDEX_TYPE", "hnsw")
+    monkeypatch.setenv("MEMORY_INDEX_PROMOTE_AT", "30")
+    writer = processes()
+    for i in range(40):
+        asyncio.run(writer.store_patient_history(f"P{i}", {"medications": [f"drug{i}"]}))
+    assert writer.case_index.wait_for_build()
+    writer.save_snapshot()
+
+    reader = processes()
+    stats = reader.case_index.stats()
+    assert (stats["type"], stats["builds"], stats["building"]) == ("hnsw", 0, False)
+    assert search(reader, "Conditions: | Medications: drug7 | Allergies: | Surgeries: | Notes:", mode="vector")[0] == "case_P7"
+    ann_file = tmp_path / "memory" / "cases-00000001.ann.index"
+    if os.path.exists("/proc/self/maps"):
+        with open("/proc/self/maps") as f:
+            assert any(line.rstrip().endswith(str(ann_file)) for line in f)
+
+    # Until the writer rebuilds its tier, later snapshots link the same files
+    asyncio.run(writer.store_patient_history("P0", {"medications": ["insulin"]}))
+    writer.save_snapshot()
+    assert os.stat(ann_file).st_ino == os.stat(tmp_path / "memory" / "cases-00000002.ann.index").st_ino
+    assert reader.reload() is True and reader.case_index.stats()["masked_vectors"] == 1
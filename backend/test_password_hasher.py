@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for bcrypt password hashing and the legacy SHA-256 upgrade path.
+"""
+
+import asyncio
+import hashlib
+
+import pytest
+from fastapi import HTTPException
+
+from models.user_models import UserLogin
+from services.password_hasher import PasswordHasher
+from services.user_service import UserService
+from services.user_store import JSONUserStore
+
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(rounds=4, max_workers=2)
+
+    async def scenario():
+        hashed = await hasher.hash("s3cret")
+        assert hashed.startswith("$2b$04$")
+        assert await hasher.verify("s3cret", hashed) == (True, None)
+        assert await hasher.verify("wrong", hashed) == (False, None)
+
+        # A changed work factor is upgraded on the next successful verify
+        stronger = PasswordHasher(rounds=5, max_workers=1)
+        valid, new_hash = await stronger.verify("s3cret", hashed)
+        stronger.shutdown()
+        assert valid and new_hash.startswith("$2b$05$")
+
+    asyncio.run(scenario())
+    hasher.shutdown()
+
+
+def test_legacy_hash_rehashed_on_login(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = JSONUserStore(data_dir=str(tmp_path))
+    legacy = hashlib.sha256(b"s3cret").hexdigest()
+    store.create_user({"patient_id": "P1", "email": "a@example.com", "first_name": "A", "last_name": "B",
+                       "password_hash": legacy})
+    service = UserService(store=store, password_hasher=PasswordHasher(rounds=4, max_workers=1))
+
+    async def scenario():
+        with pytest.raises(HTTPException):
+            await service.login_user(UserLogin(email="a@example.com", password="wrong"))
+        assert store.get_user("P1")["password_hash"] == legacy
+
+        await service.login_user(UserLogin(email="a@example.com", password="s3cret"))
+        upgraded = store.get_user("P1")["password_hash"]
+        assert upgraded.startswith("$2b$04$")
+
+        # The upgraded hash keeps working
+        await service.login_user(UserLogin(email="a@example.com", password="s3cret"))
+        assert store.get_user("P1")["password_hash"] == upgraded
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        service.close()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for the epoch-invalidated similar-case result cache.
+"""
+
+import asyncio
+
+from services.search_cache import SearchResultCache
+
+
+def test_lru_ttl_and_epoch_invalidation(monkeypatch):
+    cache = SearchResultCache(max_entries=2, ttl=60)
+    cache.put("a", 1, ["case_a"])
+    cache.put("b", 1, ["case_b"])
+    assert cache.get("a", 1) == ["case_a"]  # b becomes least recently used
+    cache.put("c", 1, ["case_c"])
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 2) is None  # the index changed since it was cached
+    assert cache.get("a", 2) is None
+
+    now = [1000.0]
+    monkeypatch.setattr("services.search_cache.time.monotonic", lambda: now[0])
+    cache.put("d", 2, ["case_d"])
+    now[0] += 61
+    assert cache.get("d", 2) is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stale"], stats["expired"], stats["evictions"]) == (1, 4, 1, 1, 1)
+    assert stats["hit_rate"] == 0.2
+    assert SearchResultCache(max_entries=0).get("a", 1) is None
+
+
+def test_repeated_queries_skip_the_model_until_cases_change(open_memory, fake_encode):
+    encoded = []
+
+    def encode(texts):
+        encoded.extend(texts)
+        return fake_encode(texts)
+
+    memory = open_memory(encode)
+    memory.embedding_cache.max_entries = 0  # isolate the result cache
+    asyncio.run(memory.store_patient_history("P1", {"medications": ["metformin"]}))
+    first = asyncio.run(memory.search_similar_cases("Metformin ", top_k=3, min_score=-1.0))
+    calls = len(encoded)
+    second = asyncio.run(memory.search_similar_cases("metformin", top_k=3, min_score=-1.0))
+    assert len(encoded) == calls and [case.case_id for case in second] == [case.case_id for case in first]
+    assert memory.search_cache.stats()["hits"] == 1
+
+    asyncio.run(memory.store_patient_history("P2", {"medications": ["metformin", "insulin"]}))
+    third = asyncio.run(memory.search_similar_cases("metformin", top_k=3, min_score=-1.0))
+    assert len(third) == 2 and memory.search_cache.stats()["stale"] == 1
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory session cache and its write-behind persistence.
+"""
+
+import time
+
+import pytest
+
+from services.session_service import SessionService
+from services.user_store import JSONUserStore, SQLiteUserStore
+
+
+def make_store(backend, tmp_path):
+    if backend == "sqlite":
+        return SQLiteUserStore(db_path=str(tmp_path / "test.db"), data_dir=str(tmp_path))
+    return JSONUserStore(data_dir=str(tmp_path))
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "json"])
+def test_sessions_survive_restart(backend, tmp_path):
+    store = make_store(backend, tmp_path)
+    sessions = SessionService(store, flush_interval=60)
+    token, _ = sessions.create("P1")
+    revoked, _ = sessions.create("P2")
+    assert sessions.validate(token) == "P1"
+    assert sessions.revoke(revoked)
+    assert sessions.validate(revoked) is None
+    sessions.close()
+
+    # Only token hashes are persisted
+    persisted = store.load_sessions()
+    assert len(persisted) == 1 and token not in persisted
+    store.close()
+
+    store = make_store(backend, tmp_path)
+    sessions = SessionService(store, flush_interval=60)
+    assert sessions.validate(token) == "P1"
+    assert sessions.validate(revoked) is None
+    sessions.close()
+    store.close()
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "json"])
+def test_workers_accept_each_others_sessions(backend, tmp_path):
+    # Two worker processes: separate stores over the same data directory
+    store_a, store_b = make_store(backend, tmp_path), make_store(backend, tmp_path)
+    worker_a = SessionService(store_a, flush_interval=60)
+    worker_b = SessionService(store_b, flush_interval=60)
+
+    token, _ = worker_a.create("P1")
+    assert worker_b.validate(token, load=False) is None  # not cached yet
+    assert worker_b.validate(token) == "P1"
+    assert worker_b.validate(token, load=False) == "P1"  # cached by the lookup
+    assert worker_b.validate("unknown-token") is None
+    assert worker_b.stats()["misses"] == 2
+
+    # Logging out on a worker that never saw the token still ends it everywhere it isn't cached
+    assert worker_b.revoke(token)
+    assert not worker_b.revoke(token)
+    worker_c = SessionService(store_a, flush_interval=60)
+    assert worker_c.validate(token) is None
+    for service in (worker_a, worker_b, worker_c):
+        service.close()
+    store_a.close()
+    store_b.close()
+
+
+def test_expiry_and_lru_eviction(tmp_path):
+    store = JSONUserStore(data_dir=str(tmp_path))
+    sessions = SessionService(store, ttl=0.05, max_sessions=2, flush_interval=60)
+    first, _ = sessions.create("P1")
+    second, _ = sessions.create("P2")
+    assert sessions.validate(first) == "P1"  # P2 is now least recently used
+    third, _ = sessions.create("P3")
+    assert sessions.stats()["active_sessions"] == 2
+    assert sessions.validate(second, load=False) is None  # evicted from memory...
+    assert sessions.validate(second) == "P2"  # ...but not logged out
+
+    time.sleep(0.06)
+    assert sessions.validate(third) is None
+    stats = sessions.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2
+    sessions.close()
+    assert len(store.load_sessions()) == 2  # the expired `third` was removed
+    store.close()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Tests for splitting long case text into overlapping chunks.
+"""
+
+import asyncio
+
+import numpy as np
+
+from services.text_chunker import ChunkingConfig, chunk_text
+
+
+def test_windows_overlap_and_cover_the_text():
+    words = [f"w{i}" for i in range(25)]
+    chunks = chunk_text(" ".join(words), max_words=10, overlap=3)
+    assert [chunk.split()[0] for chunk in chunks] == ["w0", "w7", "w14", "w21"]
+    assert chunks[-1].split()[-1] == "w24"
+    assert chunk_text("short text", max_words=10, overlap=3) == ["short text"]
+    assert chunk_text("   ") == []
+    assert len(ChunkingConfig(max_words=10, overlap=3, max_chunks=2).split(" ".join(words), "more")) == 2
+
+
+def test_full_text_is_searchable_through_chunks(open_memory, monkeypatch):
+    monkeypatch.setenv("MEMORY_CHUNK_WORDS", "20")
+    monkeypatch.setenv("MEMORY_CHUNK_OVERLAP", "5")
+    batches = []
+
+    def encode(texts):
+        batches.append(len(texts))
+        # One axis per keyword, so a chunk matches the query only if it contains the word
+        return np.array([[float("warfarin" in text), float("asthma" in text), 1e-3] + [0.0] * 381
+                         for text in texts], dtype=np.float32)
+
+    memory = open_memory(encode)
+    full_text = " ".join(["filler"] * 100 + ["warfarin"] + ["filler"] * 100)
+    asyncio.run(memory.store_patient_history("P1", {"medical_conditions": ["asthma"], "full_text": full_text}))
+    assert memory.case_index.ntotal > 10 and len(memory.case_index) == 1
+    assert batches == [memory.case_index.ntotal]  # all chunks embedded in one batch
+
+    hits = asyncio.run(memory.search_similar_cases("warfarin", top_k=3, mode="vector"))
+    assert [case.case_id for case in hits] == ["case_P1"] and hits[0].similarity_score > 0.99
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Latency test: a slow disk behind UserService must not stall unrelated requests.
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from services.io_executor import BoundedIOExecutor
+from services.user_service import UserService
+from services.user_store import JSONUserStore
+
+DISK_DELAY = 0.5
+
+
+class SlowDiskStore(JSONUserStore):
+    """JSON store whose reads take DISK_DELAY seconds, like a saturated or network disk."""
+
+    def get_user(self, patient_id):
+        time.sleep(DISK_DELAY)
+        return super().get_user(patient_id)
+
+
+async def measure(app):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        start = time.perf_counter()
+        slow_request = asyncio.create_task(client.get("/api/dashboard/P1"))
+        await asyncio.sleep(0.05)  # let the dashboard request reach the disk
+
+        health_start = time.perf_counter()
+        health = await client.get("/")
+        health_latency = time.perf_counter() - health_start
+
+        dashboard = await slow_request
+        dashboard_latency = time.perf_counter() - start
+    return health, health_latency, dashboard, dashboard_latency
+
+
+def test_slow_disk_does_not_stall_event_loop(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # main.py's services create data/ and uploads/ in the working directory
+    main = pytest.importorskip("main")
+    store = SlowDiskStore(data_dir=str(tmp_path))
+    store.create_user({"patient_id": "P1", "email": "a@example.com", "first_name": "A",
+                       "last_name": "B", "password_hash": "x"})
+    user_service = UserService(store=store)
+    monkeypatch.setattr(main, "user_service", user_service)  # the routes look it up at request time
+    try:
+        health, health_latency, dashboard, dashboard_latency = asyncio.run(measure(main.app))
+    finally:
+        user_service.close()
+
+    assert dashboard.status_code == 200
+    assert dashboard_latency >= DISK_DELAY
+    assert health.status_code == 200
+    # Had the disk read run on the event loop, "/" would wait for the rest of DISK_DELAY
+    assert health_latency < DISK_DELAY / 5
+
+
+def test_executor_queue_is_bounded():
+    executor = BoundedIOExecutor(max_workers=4, max_pending=2)
+
+    async def run():
+        start = time.perf_counter()
+        await asyncio.gather(*(executor.run(time.sleep, 0.1) for _ in range(4)))
+        return time.perf_counter() - start
+
+    try:
+        # Four 100ms calls through two slots take two rounds, even with four workers
+        assert asyncio.run(run()) >= 0.2
+    finally:
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    from pathlib import Path
+
+    import pytest
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        test_slow_disk_does_not_stall_event_loop(Path(tmp), pytest.MonkeyPatch())
+    print("✓ Slow disk I/O does not block unrelated requests")
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Tests for the UserService storage backends (SQLite and JSON fallback).
+"""
+
+import json
+import os
+
+import pytest
+
+from services.user_store import JSONUserStore, SQLiteUserStore, document_sort_key
+
+
+def make_store(kind: str, data_dir: str):
+    if kind == "sqlite":
+        return SQLiteUserStore(db_path=os.path.join(data_dir, "test.db"), data_dir=data_dir)
+    return JSONUserStore(data_dir=data_dir)
+
+
+def user_record(patient_id: str, email: str) -> dict:
+    return {"patient_id": patient_id, "email": email, "first_name": "A", "last_name": "B", "password_hash": "x"}
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "json"])
+def test_users_roundtrip(tmp_path, kind):
+    store = make_store(kind, str(tmp_path))
+    assert store.create_user(user_record("P1", "a@example.com"))
+    assert not store.create_user(user_record("P2", "a@example.com"))
+    assert store.find_user_by_email("a@example.com")["patient_id"] == "P1"
+
+    record = store.get_user("P1")
+    record["first_name"] = "Changed"
+    store.update_user(record)
+    assert store.get_user("P1")["first_name"] == "Changed"
+    assert store.get_user("missing") is None
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "json"])
+def test_documents_and_diagnoses(tmp_path, kind):
+    store = make_store(kind, str(tmp_path))
+    for i in range(3):
+        store.add_document({"document_id": f"D{i}", "patient_id": "P1", "upload_date": f"2025-01-0{i + 1} 10:00:00"})
+    assert len(store.list_documents("P1")) == 3
+    assert store.delete_document("P1", "D1")
+    assert not store.delete_document("P1", "D1")
+    assert {d["document_id"] for d in store.list_documents("P1")} == {"D0", "D2"}
+
+    for i in range(12):
+        store.add_diagnosis("P1", {"diagnosis_id": f"G{i}", "timestamp": f"t{i}"}, keep=10)
+    recent = store.list_diagnoses("P1", limit=20)
+    assert [d["diagnosis_id"] for d in recent] == [f"G{i}" for i in range(11, 1, -1)]
+
+
+def test_sqlite_migrates_legacy_json_once(tmp_path):
+    data_dir = str(tmp_path)
+    with open(os.path.join(data_dir, "users.json"), "w") as f:
+        json.dump({"P1": user_record("P1", "a@example.com")}, f)
+    with open(os.path.join(data_dir, "documents.json"), "w") as f:
+        json.dump({"P1": [{"document_id": "D1", "patient_id": "P1", "upload_date": "2025-01-01 10:00:00"}]}, f)
+    with open(os.path.join(data_dir, "diagnoses.json"), "w") as f:
+        json.dump({"P1": [{"diagnosis_id": "new", "timestamp": "2"}, {"diagnosis_id": "old", "timestamp": "1"}]}, f)
+
+    store = make_store("sqlite", data_dir)
+    assert store.get_user("P1")["email"] == "a@example.com"
+    assert len(store.list_documents("P1")) == 1
+    assert [d["diagnosis_id"] for d in store.list_diagnoses("P1", limit=5)] == ["new", "old"]
+    # Patients that predate summaries get one backfilled from their rows
+    assert store.get_summary("P1")["total_uploads"] == 1
+    assert store.get_summary("P1")["total_diagnoses"] == 2
+    store.close()
+
+    # Re-opening must not import the JSON files a second time
+    store = make_store("sqlite", data_dir)
+    assert len(store.list_diagnoses("P1", limit=5)) == 2
+
+
+def test_json_email_index_follows_external_edits(tmp_path):
+    store = make_store("json", str(tmp_path))
+    assert store.create_user(user_record("P1", "a@example.com"))
+    assert store.find_user_by_email("a@example.com")["patient_id"] == "P1"
+
+    # Another process rewrites users.json: the index must be rebuilt, not served stale
+    with open(store.users_file, "w") as f:
+        json.dump({"P2": user_record("P2", "b@example.com"), "P3": user_record("P3", "c@example.com")}, f)
+    os.utime(store.users_file, ns=(0, 1))
+    assert store.find_user_by_email("a@example.com") is None
+    assert store.find_user_by_email("b@example.com")["patient_id"] == "P2"
+    assert store.create_user(user_record("P4", "a@example.com"))
+
+
+def test_json_cache_writes_through_and_revalidates(tmp_path):
+    store = make_store("json", str(tmp_path))
+    store.create_user(user_record("P1", "a@example.com"))
+    store.add_document({"document_id": "D1", "patient_id": "P1", "upload_date": "2025-01-01 10:00:00"})
+
+    before = store.cache_stats()
+    assert store.get_user("P1")["email"] == "a@example.com"
+    assert len(store.list_documents("P1")) == 1
+    after = store.cache_stats()
+    assert after["users"]["hits"] == before["users"]["hits"] + 1
+    assert after["users"]["misses"] == before["users"]["misses"]
+    assert after["documents"]["misses"] == before["documents"]["misses"]
+
+    shard_file = os.path.join(store.documents_dir, "P1.json")
+    with open(shard_file, "w") as f:
+        json.dump([], f)
+    os.utime(shard_file, ns=(0, 1))
+    assert len(store.list_documents("P1")) == 0
+    assert store.cache_stats()["documents"]["misses"] == after["documents"]["misses"] + 1
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "json"])
+def test_document_keyset_pagination(tmp_path, kind):
+    store = make_store(kind, str(tmp_path))
+    # Inserted out of order, with two documents sharing a timestamp
+    for i in [3, 0, 4, 1, 2]:
+        store.add_document({"document_id": f"D{i}", "patient_id": "P1", "upload_date": f"2025-01-0{i + 1} 10:00:00"})
+    store.add_document({"document_id": "D5", "patient_id": "P1", "upload_date": "2025-01-05T10:00:00"})
+    store.add_document({"document_id": "X1", "patient_id": "P2", "upload_date": "2025-02-01 10:00:00"})
+
+    pages, after = [], None
+    while True:
+        page = store.list_documents("P1", limit=2, after=after)
+        if not page:
+            break
+        pages.append([d["document_id"] for d in page])
+        after = document_sort_key(page[-1])
+    assert pages == [["D5", "D4"], ["D3", "D2"], ["D1", "D0"]]
+    assert [d["document_id"] for d in store.list_documents("P1")][:2] == ["D5", "D4"]
+
+
+def test_json_shards_legacy_documents(tmp_path):
+    with open(os.path.join(str(tmp_path), "documents.json"), "w") as f:
+        json.dump({
+            "P1": [{"document_id": "D2", "patient_id": "P1", "upload_date": "2025-01-02 10:00:00"},
+                   {"document_id": "D1", "patient_id": "P1", "upload_date": "2025-01-01 10:00:00"}],
+            "P2": [{"document_id": "D3", "patient_id": "P2", "upload_date": "2025-01-03 10:00:00"}]
+        }, f)
+    store = make_store("json", str(tmp_path))
+    assert sorted(os.listdir(store.documents_dir)) == ["P1.json", "P2.json"]
+    assert [d["document_id"] for d in store.list_documents("P1")] == ["D2", "D1"]
+    assert len(store.list_documents("P2")) == 1
+    assert store.list_documents("../P1") == []
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "json"])
+def test_summary_is_maintained_incrementally(tmp_path, kind):
+    store = make_store(kind, str(tmp_path))
+    store.add_document({"document_id": "D1", "patient_id": "P1", "upload_date": "2025-01-01 10:00:00", "confidence_score": 0.5})
+    store.add_document({"document_id": "D2", "patient_id": "P1", "upload_date": "2025-01-02 10:00:00", "confidence_score": 1.0})
+    for severity in ["low", "high", "low"]:
+        store.add_diagnosis("P1", {"diagnosis_id": severity, "timestamp": "t", "result": {"severity_assessment": severity}}, keep=10)
+
+    summary = store.get_summary("P1")
+    assert summary["total_uploads"] == 2
+    assert summary["last_upload"].startswith("2025-01-02")
+    assert summary["confidence_sum"] / summary["confidence_count"] == pytest.approx(0.75)
+    assert summary["diagnoses_by_severity"] == {"low": 2, "high": 1}
+
+    store.delete_document("P1", "D2")
+    summary = store.get_summary("P1")
+    assert summary["total_uploads"] == 1
+    assert summary["last_upload"].startswith("2025-01-01")
+    assert summary["confidence_sum"] == pytest.approx(0.5)
+    assert store.get_summary("P2")["total_uploads"] == 0
+
+
+def test_legacy_summaries_are_built_once_at_startup(tmp_path):
+    data_dir = str(tmp_path)
+    with open(os.path.join(data_dir, "documents.json"), "w") as f:
+        json.dump({"P1": [{"document_id": "D1", "patient_id": "P1", "upload_date": "2025-01-01 10:00:00"}]}, f)
+    with open(os.path.join(data_dir, "diagnoses.json"), "w") as f:
+        json.dump({"P2": [{"diagnosis_id": "G1", "timestamp": "1"}]}, f)
+
+    store = make_store("json", data_dir)
+    assert sorted(os.listdir(store.summaries_dir)) == ["P1.json", "P2.json"]
+    assert store.get_summary("P1")["total_uploads"] == 1
+    assert store.get_summary("P2")["total_diagnoses"] == 1
+    # Reads never write: patients without a summary have no data yet
+    assert store.get_summary("nobody1")["total_uploads"] == 0
+    assert not os.path.exists(os.path.join(store.summaries_dir, "nobody1.json"))
+
+    store = make_store("sqlite", os.path.join(data_dir, "migrated"))
+    store.add_document({"document_id": "D1", "patient_id": "P1", "upload_date": "2025-01-01 10:00:00"})
+    with store._conn:
+        store._conn.execute("DELETE FROM patient_summaries")
+        store._conn.execute("DELETE FROM meta WHERE key = 'summaries_built'")
+    store.close()
+    store = make_store("sqlite", os.path.join(data_dir, "migrated"))
+    assert store._conn.execute("SELECT COUNT(*) FROM patient_summaries").fetchone()[0] == 1
+    assert store.get_summary("P1")["total_uploads"] == 1
+    store.close()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Tests for the case-ID keyed FAISS index.
+"""
+
+import faiss
+import numpy as np
+import pytest
+
+from services.vector_index import CaseIndex, IndexConfig, case_vector_id
+
+DIM = 8
+
+
+def vec(axis, scale=3.0):
+    """Unnormalized vector along one axis; scale must not affect cosine scores."""
+    vector = np.zeros((1, DIM), dtype=np.float32)
+    vector[0, axis] = scale
+    return vector
+
+
+def test_stable_ids():
+    assert case_vector_id("case_P1") == case_vector_id("case_P1")
+    assert case_vector_id("case_P1") != case_vector_id("case_P2")
+    assert 0 <= case_vector_id("case_P1") < 2 ** 63
+
+
+def test_upsert_replaces_and_remove_shrinks():
+    index = CaseIndex(DIM)
+    index.upsert(["case_P1"], vec(0))
+    index.upsert(["case_P2"], vec(1) + vec(2))
+    index.upsert(["case_P1"], vec(2, scale=10.0))  # re-upload
+    assert index.ntotal == 2 and len(index) == 2
+
+    hits = index.search(vec(2), 5)[0]
+    assert [case_id for case_id, _ in hits] == ["case_P1", "case_P2"]
+    assert hits[0][1] == pytest.approx(1.0)
+    assert hits[1][1] == pytest.approx(np.sqrt(0.5))
+
+    assert index.remove(["case_P1", "case_missing"]) == 1
+    assert index.ntotal == 1 and "case_P1" not in index
+    assert [case_id for case_id, _ in index.search(vec(2), 5)[0]] == ["case_P2"]
+
+
+def test_snapshot_roundtrip_rejects_other_formats():
+    index = CaseIndex(DIM)
+    index.upsert(["case_P3"], vec(3, scale=7.0))
+    index_bytes, vector_ids = index.serialize()
+    metadata = {"vector_ids": vector_ids, "metric": CaseIndex.metric}
+    restored = CaseIndex.from_snapshot(DIM, faiss.deserialize_index(index_bytes), metadata)
+    assert restored.search(vec(3), 1)[0] == [("case_P3", pytest.approx(1.0))]
+
+    l2 = faiss.IndexIDMap2(faiss.IndexFlatL2(DIM))
+    with pytest.raises(ValueError, match="IndexIDMap2"):
+        CaseIndex.from_snapshot(DIM, l2, metadata)
+    with pytest.raises(ValueError, match="IndexIDMap2"):
+        CaseIndex.from_snapshot(DIM, faiss.IndexFlatIP(DIM), {"case_id_to_index": {}})
+
+
+@pytest.mark.parametrize("kind", ["hnsw", "ivfpq"])
+def test_promotes_to_approximate_tier(kind):
+    rng = np.random.default_rng(0)
+    vectors = rng.random((400, DIM), dtype=np.float32)
+    config = IndexConfig(kind=kind, promote_at=300, ef_search=64, nprobe=64, pq_m=4)
+    index = CaseIndex(DIM, config=config)
+    index.upsert([f"case_{i}" for i in range(200)], vectors[:200])
+    assert index.stats()["type"] == "flat"
+
+    index.upsert([f"case_{i}" for i in range(200, 400)], vectors[200:])
+    assert index.wait_for_build()
+    assert index.stats()["type"] == kind
+
+    # Writes after the build are served from the delta and mask the old rows
+    index.upsert(["case_0"], -np.ones((1, DIM), dtype=np.float32))
+    index.remove(["case_1"])
+    assert index.search(-np.ones((1, DIM), dtype=np.float32), 1)[0][0][0] == "case_0"
+    assert all(case_id != "case_1" for case_id, _ in index.search(vectors[1:2], 10)[0])
+    stats = index.stats()
+    assert stats["delta_vectors"] == 1 and stats["masked_vectors"] == 2
+
+    # Nearest neighbours of stored vectors are (almost always) themselves
+    hits = [index.search(vectors[i:i + 1], 1)[0][0][0] == f"case_{i}" for i in range(2, 100)]
+    assert sum(hits) >= 90
+
+    # A snapshot restores the tier with its mask and delta; a read-only copy never builds its own
+    index_bytes, vector_ids = index.serialize()
+    tier, state = index.ann_snapshot()
+    ann_bytes, ann_ids = tier.serialize()
+    metadata = {"vector_ids": vector_ids, "metric": CaseIndex.metric, "ann": state}
+    restored = CaseIndex.from_snapshot(DIM, faiss.deserialize_index(index_bytes), metadata, config=config,
+                                       read_only=True, ann=(faiss.deserialize_index(ann_bytes), ann_ids))
+    restored_stats = restored.stats()
+    assert (restored_stats["type"], restored_stats["delta_vectors"], restored_stats["masked_vectors"]) == (kind, 1, 2)
+    assert restored_stats["builds"] == 0 and not restored_stats["building"]
+    assert restored.search(vectors[:50], 5) == index.search(vectors[:50], 5)
+
+
+def test_vector_reads_back_normalized():
+    index = CaseIndex(DIM)
+    index.upsert(["case_P1"], vec(4, scale=5.0))
+    assert index.vector("case_P1")[4] == pytest.approx(1.0)
+    assert index.vector("case_missing") is None
+
+
+@pytest.mark.parametrize("kind", ["flat", "hnsw", "ivfpq"])
+def test_filtered_search_returns_k_matching_cases(kind):
+    rng = np.random.default_rng(1)
+    vectors = rng.random((400, DIM), dtype=np.float32)
+    # exact_filter_limit=0 forces filtered searches through the approximate tier
+    config = IndexConfig(kind=kind, promote_at=300, ef_search=64, nprobe=64, pq_m=4, exact_filter_limit=0)
+    index = CaseIndex(DIM, config=config)
+    case_ids = [f"case_{i}" for i in range(400)]
+    attributes = [{"patient_id": f"P{i % 40}", "category": "lab" if i % 2 else "history"} for i in range(400)]
+    index.upsert(case_ids, vectors, attributes=attributes)
+    assert index.wait_for_build()
+
+    hits = index.search(vectors[:1], 5, filters={"patient_id": "P3"})[0]
+    assert len(hits) == 5
+    assert {case_id for case_id, _ in hits} <= {f"case_{i}" for i in range(3, 400, 40)}
+    hits = index.search(vectors[:1], 20, filters={"patient_id": "P3", "category": "lab"})[0]
+    assert sorted(case_id for case_id, _ in hits) == sorted(f"case_{i}" for i in range(3, 400, 40))
+    assert index.search(vectors[:1], 5, filters={"patient_id": "P4", "category": "lab"})[0] == []
+
+    # Re-tagged and removed cases leave their old postings; writes after the build are filtered too
+    index.upsert(["case_3"], vectors[3:4], attributes=[{"patient_id": "P99", "category": "lab"}])
+    index.remove(["case_43"])
+    hits = index.search(vectors[3:4], 20, filters={"patient_id": "P3"})[0]
+    assert {"case_3", "case_43"}.isdisjoint(case_id for case_id, _ in hits) and len(hits) == 8
+    assert index.search(vectors[3:4], 5, filters={"patient_id": "P99"})[0][0][0] == "case_3"
+
+
+def test_filter_selections_are_cached_until_a_write():
+    index = CaseIndex(DIM)
+    index.upsert(["case_1", "case_2"], np.vstack([vec(1), vec(2)]),
+                 attributes=[{"patient_id": "P1", "category": "lab"}, {"patient_id": "P2", "category": "lab"}])
+    # A filter matching every vector searches without a selector
+    assert index._matching({"category": "lab"}) is None
+    selection = index._matching({"patient_id": "P1"})
+    assert index._matching({"patient_id": "P1"}) is selection
+
+    index.upsert(["case_3"], vec(3), attributes=[{"patient_id": "P1", "category": "note"}])
+    assert len(index._matching({"patient_id": "P1"})) == 2
+    assert [case_id for case_id, _ in index.search(vec(3), 5, filters={"patient_id": "P1"})[0]] == ["case_3", "case_1"]
+    assert [case_id for case_id, _ in index.search(vec(1), 5, filters={"category": "lab"})[0]] == ["case_1", "case_2"]
+
+
+def test_chunked_cases_rank_by_best_chunk():
+    index = CaseIndex(DIM)
+    index.upsert(["case_P1", "case_P1", "case_P1"], np.vstack([vec(0), vec(1), vec(2)]),
+                 attributes=[{"patient_id": "P1"}] * 3)
+    index.upsert(["case_P2"], vec(0) + vec(2), attributes=[{"patient_id": "P2"}])
+    assert len(index) == 2 and index.ntotal == 4
+
+    # Each case appears once, scored by its best chunk
+    hits = index.search(vec(2), 5)[0]
+    assert hits == [("case_P1", pytest.approx(1.0)), ("case_P2", pytest.approx(np.sqrt(0.5)))]
+    assert [case_id for case_id, _ in index.search(vec(1), 1, filters={"patient_id": "P2"})[0]] == ["case_P2"]
+
+    # Scoring a single case (hybrid search) uses the same max-sim over its chunks
+    assert index.vectors("case_P1").shape == (3, DIM)
+    assert index.similarity("case_P1", vec(2)) == pytest.approx(1.0)
+    assert index.similarity("case_missing", vec(2)) is None
+
+    # Re-uploading with fewer chunks drops the old ones but keeps the case's attributes
+    index.upsert(["case_P1"], vec(3))
+    assert index.ntotal == 2
+    assert index.search(vec(2), 5, filters={"patient_id": "P1"})[0] == [("case_P1", pytest.approx(0.0))]
+    assert index.remove(["case_P1"]) == 1 and len(index) == 1